@@ -1,10 +1,18 @@
+# =====================================================
+# ASYNC RUNTIME (must run before anything imports socket/threading)
+# =====================================================
+from async_runtime import setup_async_runtime, check_async_runtime
+
+ASYNC_MODE = setup_async_runtime()
+
 import logging
 import os
 import sys
+import time
 import traceback
 from datetime import datetime
 
-from flask import Flask, redirect, jsonify, render_template, request, url_for
+from flask import Flask, Response, g, redirect, jsonify, render_template, request, url_for
 from flask_login import LoginManager, current_user
 from flask_socketio import SocketIO
 from dotenv import load_dotenv
@@ -18,10 +26,14 @@ load_dotenv()
 # =====================================================
 # LOGGING
 # =====================================================
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s] %(levelname)s: %(message)s",
-    handlers=[logging.StreamHandler(sys.stdout)]
+# Records are queued and written by a background thread as JSON lines
+from config import config, config_name
+from structured_logging import log_event, setup_logging
+
+setup_logging(
+    level=config.LOG_LEVEL,
+    json_format=config.LOG_FORMAT == "json",
+    sample_rates=config.LOG_SAMPLE_RATES,
 )
 
 logger = logging.getLogger("openworld")
@@ -29,13 +41,14 @@ logger = logging.getLogger("openworld")
 logger.info("=================================================")
 logger.info("OPENWORLD STARTING")
 logger.info("=================================================")
+logger.info(f"Using config: {config_name}")
 
 # =====================================================
 # IMPORT CONFIG + MODELS
 # =====================================================
 try:
     from config import config
-    from models.models import db, User
+    from models.models import db
 except Exception as e:
     logger.error("Failed loading config/models")
     traceback.print_exc()
@@ -76,9 +89,20 @@ db.init_app(app)
 # =====================================================
 # SOCKET.IO - PRODUCTION SETTINGS
 # =====================================================
-# ✅ CRITICAL FIX: Changed async_mode from "eventlet" to "threading"
-# Reason: eventlet 0.36.1 has compatibility issues with Flask-SocketIO 5.3.4
-# threading mode is more stable and reliable
+# Cross-process fan-out: emits and room joins reach sockets held by other
+# workers/hosts when SOCKETIO_MESSAGE_QUEUE is configured
+from fanout import create_client_manager
+
+socketio_options = {}
+client_manager = create_client_manager(
+    app.config.get("SOCKETIO_MESSAGE_QUEUE"),
+    batch_window=app.config.get("SOCKETIO_FANOUT_WINDOW_MS", 5) / 1000.0
+)
+if client_manager is not None:
+    socketio_options["client_manager"] = client_manager
+
+# async_mode comes from SOCKETIO_ASYNC_MODE, or from the gunicorn worker
+# class (GeventWebSocketWorker patches for gevent); threading otherwise
 socketio = SocketIO(
     app,
     cors_allowed_origins=[
@@ -87,28 +111,42 @@ socketio = SocketIO(
         "https://www.theopenworld.in",
         "http://www.theopenworld.in",
     ],
-    async_mode="threading",   # ✅ FIXED: Changed from "eventlet"
+    async_mode=ASYNC_MODE,
     ping_timeout=120,
     ping_interval=25,
     max_http_buffer_size=1e6,
-    logger=True,
-    engineio_logger=True
+    # Per-packet Socket.IO / Engine.IO logs, for debugging only
+    logger=config.SOCKETIO_LOGGER,
+    engineio_logger=config.SOCKETIO_LOGGER,
+    **socketio_options
 )
 
-logger.info("✅ SocketIO initialized with production settings (threading mode)")
+# Fail fast if the worker class and async mode disagree
+check_async_runtime(socketio.async_mode)
+
+logger.info(f"✅ SocketIO initialized with production settings ({socketio.async_mode} mode)")
 
 # =====================================================
 # LOGIN MANAGER
 # =====================================================
+from user_cache import init_user_cache
+
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
 login_manager.init_app(app)
 
+# current_user is loaded for every request and socket event: serve it
+# from an LRU of recently seen users instead of the users table
+user_cache = init_user_cache(
+    max_size=app.config.get("USER_CACHE_SIZE", 10000),
+    ttl=app.config.get("USER_CACHE_TTL_SECONDS", 30),
+)
+
 
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        return User.query.get(int(user_id))
+        return user_cache.load(int(user_id))
     except Exception as e:
         logger.error(f"User load error: {e}")
         return None
@@ -140,6 +178,74 @@ except Exception:
     logger.error("❌ Blueprint loading failed")
     traceback.print_exc()
 
+# =====================================================
+# CLI COMMANDS
+# =====================================================
+from conversations import init_conversation_commands
+from migrations import init_migration_commands
+
+init_conversation_commands(app)
+init_migration_commands(app)
+
+# =====================================================
+# SHARED STATE (matchmaking + presence)
+# =====================================================
+from state_store import init_state_store
+
+init_state_store(app.config.get("STATE_STORE_URL"))
+
+# =====================================================
+# TIMERS (queue timeouts, reconnect grace, reaping)
+# =====================================================
+from timers import init_timers
+
+timers = init_timers(app)
+
+# =====================================================
+# SOCIAL GRAPH (friend / block sets cached in memory)
+# =====================================================
+from social_graph import init_social_graph
+
+init_social_graph(ttl=app.config.get("SOCIAL_GRAPH_TTL_SECONDS", 60))
+
+# =====================================================
+# PRESENCE (sessions in memory, is_online flushed in batches)
+# =====================================================
+from presence import init_presence
+from state_store import get_state_store
+
+init_presence(
+    get_state_store(), timers,
+    flush_seconds=app.config.get("PRESENCE_FLUSH_SECONDS", 5),
+    socketio=socketio,
+    fanout_seconds=app.config.get("PRESENCE_FANOUT_SECONDS", 1),
+)
+
+# =====================================================
+# MESSAGE WRITER (group-commit chat message inserts)
+# =====================================================
+from message_writer import init_message_writer
+
+message_writer = init_message_writer(
+    app, get_state_store(),
+    journal_path=app.config.get("MESSAGE_JOURNAL_PATH"),
+    fsync=app.config.get("MESSAGE_JOURNAL_FSYNC", False),
+    batch_window=app.config.get("MESSAGE_BATCH_WINDOW_MS", 5) / 1000,
+    max_batch=app.config.get("MESSAGE_BATCH_SIZE", 500),
+)
+# Replay anything a crashed process journaled without waiting for a message
+timers.schedule(1, message_writer.start)
+
+# =====================================================
+# METRICS (per-handler latency histograms, /metrics)
+# =====================================================
+# Must wrap socketio.on before the event modules register their handlers
+from metrics import init_metrics, instrument_socketio
+
+metrics = init_metrics(socketio.async_mode)
+if app.config.get("METRICS_ENABLED", True):
+    instrument_socketio(socketio, metrics)
+
 # =====================================================
 # SOCKET EVENTS
 # =====================================================
@@ -198,45 +304,58 @@ def home():
 # =====================================================
 # HEALTH CHECKS
 # =====================================================
+from health import check_database, collect_stats, stats_authorized
+from metrics import flatten_gauges, instrument_app
+
 
 @app.route("/health")
+@app.route("/api/health")
 def health():
-    try:
-        # ✅ IMPROVED: Test database connection
-        user_count = User.query.count()
-        return jsonify({
-            "status": "ok",
-            "service": "openworld",
-            "database": "connected",
-            "timestamp": datetime.utcnow().isoformat()
-        })
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return jsonify({
-            "status": "error",
-            "service": "openworld",
-            "database": "disconnected",
-            "error": str(e)
-        }), 503
+    """Liveness: answered from memory, never touches the database"""
+    return jsonify({
+        "status": "ok",
+        "service": "openworld",
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+
+@app.route("/health/ready")
+def ready():
+    """Readiness: the database answers SELECT 1 within the probe timeout"""
+    ok, error = check_database(app, timeout=app.config.get("HEALTH_DB_TIMEOUT_MS", 1000) / 1000)
+    if ok:
+        return jsonify({"status": "ok", "service": "openworld", "database": "connected"})
+    logger.error(f"Readiness check failed: {error}")
+    return jsonify({
+        "status": "error",
+        "service": "openworld",
+        "database": "disconnected",
+        "error": error
+    }), 503
 
 
-@app.route("/api/health")
-def api_health():
-    try:
-        user_count = User.query.count()
-        return jsonify({
-            "status": "ok",
-            "timestamp": datetime.utcnow().isoformat(),
-            "service": "openworld",
-            "database": "connected"
-        })
-    except Exception as e:
-        return jsonify({
-            "status": "error",
-            "error": str(e)
-        }), 503
+@app.route("/stats")
+def stats():
+    if not stats_authorized(request, app.config.get("STATS_TOKEN")):
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(collect_stats(socketio))
 
 
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus text format: handler histograms plus the /stats numbers as gauges"""
+    if not stats_authorized(request, app.config.get("STATS_TOKEN")):
+        return jsonify({"error": "Forbidden"}), 403
+    gauges = flatten_gauges(collect_stats(socketio))
+    gauges["openworld_messages_per_second"] = round(
+        metrics.messages_per_second(gauges.get("openworld_message_writer_submitted", 0)), 3)
+    return Response(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+# Every view is registered by now (blueprints included)
+if app.config.get("METRICS_ENABLED", True):
+    instrument_app(app, metrics)
+
 logger.info("✅ Routes initialized")
 
 # =====================================================
@@ -267,10 +386,20 @@ def server_error(e):
 
 @app.before_request
 def before_request():
-    """
-    ✅ IMPROVED: Log all requests for debugging
-    """
-    logger.info(f"{request.method} {request.path}")
+    g.request_started = time.perf_counter()
+
+
+@app.teardown_request
+def log_request(exc=None):
+    """One sampled `http_request` record per request, with its duration"""
+    started = g.pop("request_started", None)
+    if started is not None:
+        log_event(
+            logger, "http_request", "%s %s", request.method, request.path,
+            method=request.method, path=request.path,
+            ms=round((time.perf_counter() - started) * 1000, 2),
+            error=repr(exc) if exc else None,
+        )
 
 
 @app.after_request
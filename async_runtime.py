@@ -0,0 +1,113 @@
+"""
+ASYNC RUNTIME - Cooperative (gevent / eventlet) or threading worker mode
+
+Import and call setup_async_runtime() before anything else so monkey
+patching happens ahead of socket, threading, SQLAlchemy and psycopg2.
+
+  threading - one OS thread per connection (Werkzeug / gunicorn gthread)
+  gevent    - greenlets; use with GeventWebSocketWorker (see Procfile)
+  eventlet  - greenlets; use with gunicorn's eventlet worker
+
+In the cooperative modes psycopg2 gets a wait callback so queries yield
+to the event loop instead of blocking the whole worker, and
+check_async_runtime() refuses to start when the configured mode does not
+match what the worker class actually patched.
+"""
+
+import os
+import sys
+
+COOPERATIVE_MODES = ('gevent', 'eventlet')
+ASYNC_MODES = ('threading',) + COOPERATIVE_MODES
+
+
+def patched_runtime():
+    """Which green library (if any) has monkey patched the socket module"""
+    # Only look at libraries already loaded; importing one here would
+    # pull in ssl/threading before the real patching happens
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('socket'):
+        return 'gevent'
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    if eventlet_patcher is not None and eventlet_patcher.is_monkey_patched('socket'):
+        return 'eventlet'
+    return None
+
+
+def configured_mode():
+    """SOCKETIO_ASYNC_MODE, or whatever the worker already patched"""
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    mode = os.getenv('SOCKETIO_ASYNC_MODE', '').strip().lower()
+    return mode or patched_runtime() or 'threading'
+
+
+def setup_async_runtime():
+    """Monkey patch for the configured mode (idempotent), returns the mode"""
+    mode = configured_mode()
+    if mode not in ASYNC_MODES:
+        raise RuntimeError(
+            f"SOCKETIO_ASYNC_MODE={mode!r} is not one of {', '.join(ASYNC_MODES)}"
+        )
+
+    if mode == 'gevent' and patched_runtime() is None:
+        from gevent import monkey
+        monkey.patch_all()
+    elif mode == 'eventlet' and patched_runtime() is None:
+        import eventlet
+        eventlet.monkey_patch()
+
+    if mode in COOPERATIVE_MODES:
+        _make_psycopg2_green(mode)
+    return mode
+
+
+def check_async_runtime(socketio_async_mode):
+    """Fail fast when Socket.IO's mode and the worker's patching disagree"""
+    runtime = patched_runtime()
+    expected = None if socketio_async_mode == 'threading' else socketio_async_mode
+
+    if runtime != expected:
+        worker = f"a {runtime}-patched worker" if runtime else "an unpatched (sync/thread) worker"
+        raise RuntimeError(
+            f"Socket.IO async_mode is {socketio_async_mode!r} but the app runs in {worker}. "
+            f"Set SOCKETIO_ASYNC_MODE to match the gunicorn worker class "
+            f"(GeventWebSocketWorker -> gevent, eventlet -> eventlet, sync/gthread -> threading)."
+        )
+
+
+def _make_psycopg2_green(mode):
+    """Install a psycopg2 wait callback that yields to the green hub"""
+    try:
+        import psycopg2
+        from psycopg2 import extensions
+    except ImportError:
+        return
+
+    if mode == 'gevent':
+        from gevent.socket import wait_read, wait_write
+    else:
+        from eventlet.hubs import trampoline
+
+        def wait_read(fd, timeout=None):
+            trampoline(fd, read=True, timeout=timeout)
+
+        def wait_write(fd, timeout=None):
+            trampoline(fd, write=True, timeout=timeout)
+
+    def wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno(), timeout=timeout)
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno(), timeout=timeout)
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+    extensions.set_wait_callback(wait_callback)
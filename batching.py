@@ -0,0 +1,67 @@
+"""
+BATCHING - Background flusher that coalesces bursts of work
+
+Used by the Socket.IO fan-out (publishes), the signaling relay (ICE
+candidates) and the message writer (INSERTs). Producers add to their own
+buffer under `cond` and notify it; one thread per flusher waits for
+work, sleeps `window` seconds so the rest of the burst can arrive
+(unless the buffer is already full) and then calls flush().
+
+    self._cond = threading.Condition()
+    self._flusher = BatchFlusher("socketio-fanout", self._cond, self.batch_window,
+                                 pending=lambda: self._pending,
+                                 full=lambda: len(self._pending) >= self.max_batch,
+                                 flush=self.flush)
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchFlusher:
+    """One daemon thread: wait for pending work, let the burst gather, flush
+
+    pending() and full() are called with cond held; flush() without it,
+    and takes whatever it sends out of the buffer itself.
+    """
+
+    def __init__(self, name, cond, window, pending, full, flush):
+        self.name = name
+        self.cond = cond
+        self.window = window
+        self.pending = pending
+        self.full = full
+        self.flush = flush
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    def start(self):
+        """Start the thread (once; safe to call from every producer)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending():
+                    self.cond.wait()
+                full = self.full()
+            if not full:
+                # Let the rest of the burst arrive
+                time.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception(f"{self.name} flush failed")
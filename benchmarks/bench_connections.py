@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK - Idle WebSocket connections per GB of RAM, per async mode
+
+Starts the app in each Socket.IO async mode, opens N idle engine.io
+WebSocket connections to it and reports the server's resident memory
+growth, i.e. what one connected-but-quiet client costs.
+
+Usage:
+    python benchmarks/bench_connections.py --connections 5000
+    python benchmarks/bench_connections.py --modes gevent eventlet
+"""
+
+import argparse
+import base64
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER = """
+import app
+options = {{"allow_unsafe_werkzeug": True}} if app.ASYNC_MODE == "threading" else {{}}
+app.socketio.run(app.app, host="127.0.0.1", port={port}, debug=False,
+                 use_reloader=False, log_output=False, **options)
+"""
+
+
+def proc_status(pid):
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            fields[key] = value.strip()
+    return int(fields['VmRSS'].split()[0]) * 1024, int(fields['Threads'])
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def open_websocket(port):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((
+        "GET /socket.io/?EIO=4&transport=websocket HTTP/1.1\r\n"
+        f"Host: 127.0.0.1:{port}\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\n"
+        "Sec-WebSocket-Version: 13\r\n\r\n"
+    ).encode())
+    response = b""
+    while b"\r\n\r\n" not in response:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise RuntimeError("connection closed during handshake")
+        response += chunk
+    if b" 101 " not in response.split(b"\r\n", 1)[0]:
+        raise RuntimeError(response.split(b"\r\n", 1)[0].decode())
+    return sock
+
+
+def run_mode(mode, connections, port):
+    env = dict(os.environ)
+    env.update({
+        "SOCKETIO_ASYNC_MODE": mode,
+        "FLASK_ENV": "testing",
+        "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.gettempdir(), f"bench_{mode}.db"),
+    })
+    server = subprocess.Popen(
+        [sys.executable, "-c", SERVER.format(port=port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    sockets = []
+    try:
+        wait_for_server(port)
+        # Warm up code paths so the baseline includes them
+        for _ in range(10):
+            open_websocket(port).close()
+        time.sleep(1)
+        base_rss, base_threads = proc_status(server.pid)
+
+        started = time.time()
+        for _ in range(connections):
+            sockets.append(open_websocket(port))
+        elapsed = time.time() - started
+        time.sleep(2)
+
+        rss, threads = proc_status(server.pid)
+        per_conn = max(rss - base_rss, 1) / connections
+        return {
+            "mode": mode,
+            "connections": connections,
+            "rss_mb": rss / 2**20,
+            "kb_per_conn": per_conn / 1024,
+            "conns_per_gb": int(2**30 / per_conn),
+            "threads": threads - base_threads,
+            "connect_rate": connections / elapsed,
+        }
+    finally:
+        for sock in sockets:
+            sock.close()
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--modes", nargs="+", default=["threading", "gevent", "eventlet"])
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=5901)
+    args = parser.parse_args()
+
+    # Each client socket needs a file descriptor on this side too
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    print(f"{'mode':<10} {'conns':>7} {'RSS MB':>8} {'KB/conn':>8} "
+          f"{'conns/GB':>10} {'+threads':>9} {'conn/s':>8}")
+    for i, mode in enumerate(args.modes):
+        try:
+            r = run_mode(mode, args.connections, args.port + i)
+        except Exception as e:
+            print(f"{mode:<10} failed: {e}")
+            continue
+        print(f"{r['mode']:<10} {r['connections']:>7} {r['rss_mb']:>8.1f} "
+              f"{r['kb_per_conn']:>8.1f} {r['conns_per_gb']:>10} "
+              f"{r['threads']:>9} {r['connect_rate']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK - Time a hot-path log call spends on the calling thread
+
+Compares, per log call as seen by the handler that logs:
+
+  sync      - the old setup: f-string message, StreamHandler writing and
+              flushing on the calling thread
+  queued    - structured_logging: JSON records handed to the background
+              writer through the bounded queue
+  sampled   - queued, with the event sampled (LOG_SAMPLE_RATES)
+  disabled  - log_event below the configured level (returns at once)
+
+The sink can be slowed down (--sink-delay-us) to stand in for a busy
+terminal, pipe or log shipper, which is when writing on the handler
+thread hurts most.
+
+With --gevent the process is monkey patched like the gevent worker, and
+the number of queued records the sink wrote on the hub's OS thread is
+reported too: each of those writes blocked every greenlet (it should be
+0, the writer being a thread of its own).
+
+Usage:
+    python benchmarks/bench_logging.py --calls 20000
+    python benchmarks/bench_logging.py --sink-delay-us 50 --sample-rate 0.05
+    python benchmarks/bench_logging.py --gevent
+"""
+
+import sys
+
+if "--gevent" in sys.argv:
+    # Before anything imports threading, as wsgi.py does
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import io
+import logging
+import os
+import statistics
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structured_logging import (  # noqa: E402
+    TEXT_FORMAT, log_event, logging_stats, setup_logging, stop_logging,
+)
+
+
+class SlowSink(io.TextIOBase):
+    """Discards output, blocking `delay` seconds per write like a slow consumer"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.sleep = time.sleep
+        self.thread_id = threading.get_ident
+        if "gevent.monkey" in sys.modules:
+            # A blocking write, not a cooperative one; OS threads, not greenlets
+            monkey = sys.modules["gevent.monkey"]
+            self.sleep = monkey.get_original("time", "sleep")
+            self.thread_id = monkey.get_original("_thread", "get_ident")
+        self.main_thread = self.thread_id()
+        self.writes = self.on_main_thread = 0
+
+    def write(self, text):
+        self.writes += 1
+        if self.thread_id() == self.main_thread:
+            self.on_main_thread += 1
+        if self.delay:
+            self.sleep(self.delay)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def run(calls, log_once):
+    """Per-call latencies in microseconds"""
+    samples = []
+    for i in range(calls):
+        started = time.perf_counter()
+        log_once(i)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def report(name, samples):
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<10} mean {statistics.fmean(samples):8.2f}us   "
+          f"p50 {samples[len(samples) // 2]:8.2f}us   p99 {p99:8.2f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--sink-delay-us", type=float, default=20, help="time the sink takes per write")
+    parser.add_argument("--sample-rate", type=float, default=0.1)
+    parser.add_argument("--gevent", action="store_true", help="monkey patch like the gevent worker")
+    args = parser.parse_args()
+
+    sink = SlowSink(args.sink_delay_us / 1e6)
+    logger = logging.getLogger("bench.chat_events")
+    root = logging.getLogger()
+
+    # sync: what the handlers did before
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+    report("sync", run(args.calls, lambda i: logger.info(f"✅ Message {i} sent from 1 to 2")))
+
+    # queued / sampled / disabled: structured_logging, queue large enough to drop nothing
+    root.removeHandler(handler)
+    setup_logging(level="INFO", json_format=True,
+                  sample_rates={"message_sampled": args.sample_rate},
+                  queue_size=args.calls * 2, stream=sink)
+
+    def event(name):
+        return lambda i: log_event(logger, name, "✅ Message %s sent from %s to %s", i, 1, 2,
+                                   message_id=i, sender_id=1, receiver_id=2)
+
+    sink.writes = sink.on_main_thread = 0
+    report("queued", run(args.calls, event("message_sent")))
+    if args.gevent:
+        stop_logging()
+        print(f"{'':<10} {sink.on_main_thread} of {sink.writes} writes blocked the hub's OS thread")
+        setup_logging(level="INFO", json_format=True,
+                      sample_rates={"message_sampled": args.sample_rate},
+                      queue_size=args.calls * 2, stream=sink)
+    report("sampled", run(args.calls, event("message_sampled")))
+    root.setLevel(logging.WARNING)
+    report("disabled", run(args.calls, event("message_sent")))
+
+    print(f"queue after run: {logging_stats()}")
+    stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK - Chat message ingestion: commit per message vs group commit
+
+Sends the same stream of messages from several threads two ways and
+reports messages per second:
+
+  per-message  - the old send_message path: ORM add + summary update +
+                 commit for every message
+  group        - MessageWriter: id and journal entry on submit, one
+                 multi-row INSERT + one commit per batch
+
+Runs against a throwaway SQLite file by default; pass --db for another
+database (tables are created, messages are written to it).
+
+Usage:
+    python benchmarks/bench_message_ingest.py --messages 5000 --threads 8
+    python benchmarks/bench_message_ingest.py --db postgresql://... --fsync
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from conversations import record_messages  # noqa: E402
+from message_writer import MessageJournal, MessageWriter  # noqa: E402
+from models.models import db, Message, User  # noqa: E402
+from state_store import InMemoryStateStore  # noqa: E402
+
+USERS = 20
+
+
+def make_app(url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        if User.query.count() < USERS:
+            for i in range(USERS):
+                user = User(username=f"bench{i}", email=f"bench{i}@x.io")
+                user.set_password("x")
+                db.session.add(user)
+            db.session.commit()
+    return app
+
+
+def per_message(app, sender_id, receiver_id, text):
+    with app.app_context():
+        message = Message(sender_id=sender_id, receiver_id=receiver_id, text=text, is_read=False)
+        db.session.add(message)
+        db.session.flush()
+        record_messages([{c: getattr(message, c) for c in ('id', 'sender_id', 'receiver_id', 'text', 'created_at')}])
+        db.session.commit()
+        db.session.remove()
+
+
+def run(app, send, messages, threads):
+    with app.app_context():
+        user_ids = [u.id for u in User.query.limit(USERS)]
+
+    def worker(n, offset):
+        for i in range(n):
+            sender_id = user_ids[(offset + i) % len(user_ids)]
+            receiver_id = user_ids[(offset + i + 1) % len(user_ids)]
+            send(sender_id, receiver_id, f"message {offset}-{i}")
+
+    per_thread = messages // threads
+    workers = [threading.Thread(target=worker, args=(per_thread, t)) for t in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return per_thread * threads, started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--db", help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--messages", type=int, default=3000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batch-ms", type=float, default=5)
+    parser.add_argument("--fsync", action="store_true", help="fsync the journal before each message is accepted")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="ingest-")
+    app = make_app(args.db or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+
+    count, started = run(app, lambda s, r, t: per_message(app, s, r, t), args.messages, args.threads)
+    per_message_rate = count / (time.perf_counter() - started)
+
+    writer = MessageWriter(
+        app, InMemoryStateStore(),
+        MessageJournal(os.path.join(tmp, "journal.log"), fsync=args.fsync),
+        batch_window=args.batch_ms / 1000,
+    )
+    writer.start()
+    count, started = run(app, lambda s, r, t: writer.submit(s, r, t), args.messages, args.threads)
+    accepted_rate = count / (time.perf_counter() - started)
+    writer.flush()
+    group_rate = count / (time.perf_counter() - started)
+
+    print(f"{count} messages, {args.threads} threads")
+    print(f"{'path':<13} {'msg/s':>9}")
+    print(f"{'per-message':<13} {per_message_rate:>9.0f}")
+    print(f"{'group':<13} {group_rate:>9.0f}   (accepted at {accepted_rate:.0f}/s, "
+          f"{writer.batches} batches, avg {writer.written / max(writer.batches, 1):.0f} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK - Presence frames sent per connect: broadcast vs friend-scoped
+
+Simulates N online users with a random friend graph and a burst of
+connects, and counts the Socket.IO frames each approach sends:
+
+  broadcast  - the old emit('user_online', broadcast=True): one frame to
+               every connected client per connect
+  friends    - PresenceFanout: one presence_delta frame per online friend,
+               with every transition in the same window coalesced
+
+Nothing here touches the DB or a real server; emits are only counted.
+
+Usage:
+    python benchmarks/bench_presence_fanout.py
+    python benchmarks/bench_presence_fanout.py --online 1000 10000 50000 --friends 30 --burst 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from presence import PresenceFanout  # noqa: E402
+
+
+def friend_graph(users, degree, rng):
+    """Symmetric random graph with about `degree` friends per user"""
+    friends = {user_id: set() for user_id in range(1, users + 1)}
+    for user_id in friends:
+        for other in rng.sample(range(1, users + 1), degree // 2):
+            if other != user_id:
+                friends[user_id].add(other)
+                friends[other].add(user_id)
+    return friends
+
+
+def run(online, degree, burst, windows, seed=1):
+    rng = random.Random(seed)
+    total = online + burst * windows
+    friends = friend_graph(total, degree, rng)
+    is_online = set(range(1, online + 1))
+    joining = list(range(online + 1, total + 1))
+
+    frames = []
+    fanout = PresenceFanout(
+        emit=lambda event, data, to: frames.append(to),
+        friends_of=lambda user_ids: {u: friends[u] for u in user_ids},
+        is_online=is_online.__contains__,
+    )
+
+    broadcast_frames = 0
+    started = time.perf_counter()
+    for window in range(windows):
+        for user_id in joining[window * burst:(window + 1) * burst]:
+            broadcast_frames += len(is_online)   # every connected client
+            is_online.add(user_id)
+            fanout.notify(user_id, True)
+        fanout.flush()
+    elapsed = time.perf_counter() - started
+
+    connects = burst * windows
+    return {
+        'broadcast': broadcast_frames / connects,
+        'friends': len(frames) / connects,
+        'flush_ms': elapsed * 1000 / windows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--online", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--friends", type=int, default=30, help="average friends per user")
+    parser.add_argument("--burst", type=int, default=100, help="connects per fan-out window")
+    parser.add_argument("--windows", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.friends} friends/user, {args.burst} connects per window")
+    print(f"{'online':>8} {'broadcast/conn':>15} {'friends/conn':>13} {'reduction':>10} {'ms/window':>10}")
+    for online in args.online:
+        r = run(online, args.friends, args.burst, args.windows)
+        reduction = r['broadcast'] / r['friends'] if r['friends'] else float('inf')
+        print(f"{online:>8} {r['broadcast']:>15.0f} {r['friends']:>13.2f} {reduction:>9.0f}x {r['flush_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+CHECK - Socket.IO fan-out reaches sockets held by another server
+
+Runs two socketio.Servers, each with a BatchingPubSubManager, over one
+LocalBroker (the local:// message queue) and checks what each socket
+receives:
+
+  remote_enter_room  - server A puts B's socket in a room, a room emit
+                       from A then reaches it
+  room_emit          - a room emit reaches the members on both servers,
+                       once each
+  direct_emit        - an emit to B's socket from A reaches it; an emit
+                       to A's own socket never goes through the broker
+  skip_sid           - skip_sid holds for a socket on either server
+  disconnect         - A disconnects B's socket: B drops it and sends
+                       the client a DISCONNECT
+  shared_local       - two managers made from local:// share a broker
+
+Exits non-zero if any scenario fails.
+
+Usage:
+    python benchmarks/check_fanout.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio  # noqa: E402
+from socketio import packet  # noqa: E402
+
+from fanout import BatchingPubSubManager, LocalBroker, create_client_manager  # noqa: E402
+
+TIMEOUT = 2
+
+
+class Node:
+    """A socketio.Server whose sockets are recorded instead of sent"""
+
+    def __init__(self, manager):
+        self.server = socketio.Server(client_manager=manager, async_mode='threading')
+        self.manager = manager
+        self.received = {}      # {eio_sid: [(event, data) or 'disconnect']}
+        self.server._send_eio_packet = self._record_eio
+        self.server._send_packet = self._record
+        manager.initialize()
+        self.server.manager_initialized = True
+
+    def connect(self, name):
+        """A connected socket: its sid (eio sid = name)"""
+        self.received[name] = []
+        return self.manager.connect(name, '/')
+
+    def _record_eio(self, eio_sid, eio_pkt):
+        self._record(eio_sid, self.server.packet_class(encoded_packet=eio_pkt.data))
+
+    def _record(self, eio_sid, pkt):
+        if pkt.packet_type == packet.DISCONNECT:
+            self.received[eio_sid].append('disconnect')
+        else:
+            self.received[eio_sid].append(tuple(pkt.data))
+
+
+def cluster(broker=None):
+    broker = broker or LocalBroker()
+    nodes = [Node(BatchingPubSubManager(broker, batch_window=0.001)) for _ in range(2)]
+    wait(lambda: broker.subscribers('openworld-socketio') >= 2)
+    return nodes
+
+
+def wait(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def settle():
+    """Long enough for anything still in flight to land"""
+    time.sleep(0.05)
+
+
+def remote_enter_room():
+    a, b = cluster()
+    sid = b.connect('b1')
+    a.server.enter_room(sid, 'lobby')
+    if not wait(lambda: 'lobby' in b.manager.get_rooms(sid, '/')):
+        return False
+    a.server.emit('hello', {'n': 1}, room='lobby')
+    return wait(lambda: b.received['b1'] == [('hello', {'n': 1})])
+
+
+def room_emit():
+    a, b = cluster()
+    a.server.enter_room(a.connect('a1'), 'room')
+    b.server.enter_room(b.connect('b1'), 'room')
+    b.connect('b2')
+    a.server.emit('ping', 1, room='room')
+    ok = wait(lambda: a.received['a1'] and b.received['b1'])
+    settle()
+    return ok and a.received['a1'] == b.received['b1'] == [('ping', 1)] and b.received['b2'] == []
+
+
+def direct_emit():
+    a, b = cluster()
+    own, remote = a.connect('a1'), b.connect('b1')
+    a.server.emit('local', 1, to=own)
+    published = a.manager.published_messages
+    a.server.emit('remote', 2, to=remote)
+    ok = wait(lambda: b.received['b1'])
+    settle()
+    return (ok and published == 0 and a.received['a1'] == [('local', 1)]
+            and b.received['b1'] == [('remote', 2)])
+
+
+def skip_sid():
+    a, b = cluster()
+    a1, b1 = a.connect('a1'), b.connect('b1')
+    b2 = b.connect('b2')
+    for sid, node in ((a1, a), (b1, b), (b2, b)):
+        node.server.enter_room(sid, 'room')
+    a.server.emit('one', 1, room='room', skip_sid=b1)
+    a.server.emit('two', 2, room='room', skip_sid=a1)
+    ok = wait(lambda: len(b.received['b2']) == 2)
+    settle()
+    return (ok and a.received['a1'] == [('one', 1)] and b.received['b1'] == [('two', 2)]
+            and b.received['b2'] == [('one', 1), ('two', 2)])
+
+
+def disconnect():
+    a, b = cluster()
+    sid = b.connect('b1')
+    a.server.disconnect(sid)
+    return wait(lambda: not b.manager.is_connected(sid, '/') and b.received['b1'] == ['disconnect'])
+
+
+def shared_local():
+    first, second = create_client_manager('local://'), create_client_manager('local://')
+    if first.broker is not second.broker:
+        return False
+    a, b = Node(first), Node(second)
+    wait(lambda: first.broker.subscribers('openworld-socketio') >= 2)
+    sid = b.connect('b1')
+    a.server.emit('across', 1, to=sid)
+    return wait(lambda: b.received['b1'] == [('across', 1)])
+
+
+SCENARIOS = (remote_enter_room, room_emit, direct_emit, skip_sid, disconnect, shared_local)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.parse_args()
+
+    failures = 0
+    for scenario in SCENARIOS:
+        ok = scenario()
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {scenario.__name__}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
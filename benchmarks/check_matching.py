@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+CHECK - Matchmaking picks a compatible partner whenever one is waiting
+
+Runs the MatchmakingQueue (scored and bucketed FIFO) through scenarios
+that have tripped pairing before:
+
+  overdue_incompatible  - the only overdue waiter rejects the searcher's
+                          country; a compatible fresh waiter must still
+                          be matched instead of the searcher being queued
+  overdue_first         - an overdue compatible waiter beats a better
+                          scored fresh one
+  blocked / recent      - blocked users are never paired, recent partners
+                          are skipped while another candidate is waiting
+  preferences           - gender / age preferences hold both ways
+  client_preferences    - malformed preferences from a client are dropped
+                          field by field, the rest still apply
+
+Exits non-zero if any scenario fails.
+
+Usage:
+    python benchmarks/check_matching.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching_engine import CandidateScorer, MatchmakingQueue, QueueEntry, np, parse_search_prefs  # noqa: E402
+
+
+def entry(user_id, waited=0, **fields):
+    e = QueueEntry(user_id, f"sid-{user_id}", **fields)
+    e.enqueued_at = time.time() - waited
+    return e
+
+
+def pair(queue, *waiting, searcher):
+    for e in waiting:
+        queue.enqueue(e)
+    partner = queue.match_or_enqueue(searcher)
+    return partner.user_id if partner else None
+
+
+def overdue_incompatible(queue):
+    overdue = entry(1, waited=CandidateScorer.MAX_WAIT_SECONDS + 5, country='us', preferred_countries=['us'])
+    fresh = entry(2, country='in')
+    return pair(queue, overdue, fresh, searcher=entry(3, country='in')), 2
+
+
+def overdue_first(queue):
+    overdue = entry(1, waited=CandidateScorer.MAX_WAIT_SECONDS + 5)
+    fresh = entry(2, interests=['music', 'chess'], reputation=5)
+    return pair(queue, overdue, fresh, searcher=entry(3, interests=['music', 'chess'])), 1
+
+
+def blocked(queue):
+    return pair(queue, entry(1, waited=10), entry(2), searcher=entry(3, blocked=[1])), 2
+
+
+def recent(queue):
+    return pair(queue, entry(1, waited=10), entry(2), searcher=entry(3, recent=[1])), 2
+
+
+def preferences(queue):
+    picky = entry(1, waited=10, gender='male', age=30, preferred_gender='female')
+    fits = entry(2, gender='female', age=40, min_age=18, max_age=35)
+    return pair(queue, picky, fits, searcher=entry(3, gender='male', age=25, preferred_gender='female')), 2
+
+
+def client_preferences(queue):
+    prefs = parse_search_prefs({'preferred_gender': 1, 'min_age': 'abc', 'max_age': '35',
+                                'preferred_countries': 5})
+    too_old = entry(1, waited=10, age=40)
+    fits = entry(2, age=30)
+    return pair(queue, too_old, fits, searcher=entry(3, age=25, **prefs)), 2
+
+
+SCENARIOS = (overdue_incompatible, overdue_first, blocked, recent, preferences, client_preferences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.parse_args()
+
+    modes = [("fifo", False)] + ([("scored", True)] if np is not None else [])
+    failures = 0
+    for mode, use_scoring in modes:
+        for scenario in SCENARIOS:
+            got, expected = scenario(MatchmakingQueue(use_scoring=use_scoring))
+            ok = got == expected
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {mode:<6} {scenario.__name__}: paired with {got}, expected {expected}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+CHECK - Every hot query must be served by an index
+
+Seeds a database with users, messages, friend requests, queue and match
+rows, then runs the real hot-path code (history pages, read watermarks,
+sync, friends list and block sets, friend request lookups, the match
+reaper, queue audit and match lookups) while recording the SQL it
+issues. Each recorded SELECT / UPDATE / DELETE is explained:
+
+  SQLite      - EXPLAIN QUERY PLAN, fails on a plain `SCAN <table>`
+  PostgreSQL  - EXPLAIN with enable_seqscan off, fails on `Seq Scan`
+                (with sequential scans discouraged the planner still
+                picks one only when no index applies)
+
+Exits non-zero if any query falls back to a sequential scan.
+
+Usage:
+    python benchmarks/check_query_plans.py
+    python benchmarks/check_query_plans.py --db postgresql://... --verbose
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import event, insert, text  # noqa: E402
+
+from conversations import (  # noqa: E402
+    backfill, conversation_id, friend_conversations, history_page, mark_read, sync_messages,
+)
+from matching_engine import MatchQueueAudit, MatchReaper, StrangerMatcher  # noqa: E402
+from migrations import migrate  # noqa: E402
+from models.models import (  # noqa: E402
+    db, ActiveMatch, FriendRequest, MatchQueue, Message, User, friends_association,
+)
+from presence import friend_ids_of  # noqa: E402
+from social_graph import get_social_graph  # noqa: E402
+from state_store import InMemoryStateStore  # noqa: E402
+
+SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+def make_app(url):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed(users, messages):
+    """Bulk-load enough rows that the planner has a real choice"""
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    db.session.execute(insert(User), [
+        {"id": i, "username": f"plan{i}", "email": f"plan{i}@x.io", "password": "x"}
+        for i in range(1, users + 1)
+    ])
+    db.session.execute(insert(friends_association), [
+        {"user_id": a, "friend_id": b}
+        for a in range(1, users + 1) for b in {(a % users) + 1, ((a + 1) % users) + 1}
+        if a != b
+    ])
+    rows = []
+    for i in range(messages):
+        sender_id = rng.randint(1, users)
+        receiver_id = (sender_id % users) + 1 if rng.random() < 0.5 else ((sender_id - 2) % users) + 1
+        rows.append({
+            "sender_id": sender_id, "receiver_id": receiver_id, "text": f"message {i}",
+            "is_read": rng.random() < 0.8, "created_at": now - timedelta(seconds=messages - i),
+        })
+    db.session.execute(insert(Message), rows)
+    db.session.execute(insert(FriendRequest), [
+        {"sender_id": rng.randint(1, users), "receiver_id": rng.randint(1, users),
+         "status": rng.choice(["pending", "accepted", "rejected"]), "created_at": now}
+        for _ in range(users * 5)
+    ])
+    db.session.execute(insert(MatchQueue), [
+        {"user_id": rng.randint(1, users), "status": rng.choice(["waiting", "matched", "cancelled", "expired"]),
+         "created_at": now - timedelta(hours=rng.randint(0, 48)),
+         "timeout_at": now + timedelta(minutes=rng.randint(-60, 10))}
+        for _ in range(users * 10)
+    ])
+    db.session.execute(insert(ActiveMatch), [
+        {"room_id": f"match_{i}_{i + 1}_{i}", "user1_id": (i % users) + 1, "user2_id": ((i + 1) % users) + 1,
+         "status": "active" if i % 20 == 0 else "ended",
+         "started_at": now - timedelta(hours=i % 1000), "ended_at": None if i % 20 == 0 else now - timedelta(days=i % 60)}
+        for i in range(users * 10)
+    ])
+    db.session.commit()
+    backfill()
+
+
+def hot_paths(user_id=1, peer_id=2):
+    """Run the code paths whose queries must stay indexed"""
+    _, cursor = history_page(user_id, peer_id, limit=20)
+    if cursor:
+        history_page(user_id, peer_id, before=cursor, limit=20)
+    mark_read(peer_id, user_id)
+    db.session.commit()
+    sync_messages(conversation_id(user_id, peer_id), 0)
+    friend_conversations(user_id)
+    friend_ids_of([user_id, peer_id, 3])
+    get_social_graph().block_set(user_id)
+
+    # friend_events: duplicate / pending request lookups
+    FriendRequest.query.filter(
+        (FriendRequest.sender_id == user_id) &
+        (FriendRequest.receiver_id == peer_id) &
+        (FriendRequest.status == 'pending')
+    ).first()
+    # friend_requests UI inbox
+    FriendRequest.query.filter_by(receiver_id=user_id, status="pending").all()
+
+    MatchQueueAudit()._write([("cancelled", user_id, None, datetime.utcnow())])
+    reaper = MatchReaper(InMemoryStateStore())
+    reaper.reap_orphans()
+    reaper.compact()
+
+    StrangerMatcher.get_other_user_id("match_0_1_0", user_id)
+    StrangerMatcher.is_match_active("match_0_1_0")
+    StrangerMatcher.end_match("match_20_21_20")
+    db.session.remove()
+
+
+def explain(conn, statement, parameters):
+    """(plan lines, [scanned tables]) for one statement"""
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        lines = [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)]
+        scans = [m.group(1) for m in (re.search(r"Seq Scan on (\w+)", line) for line in lines) if m]
+        return lines, scans
+    lines = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+    scans = [m.group(1) for m in (SQLITE_SCAN.match(line.strip()) for line in lines) if m]
+    return lines, scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--db", help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    url = args.db or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='plans-'), 'plans.db')}"
+    app = make_app(url)
+    with app.app_context():
+        db.create_all()
+        if not User.query.first():
+            seed(args.users, args.messages)
+        migrate()
+        with db.engine.begin() as conn:
+            # Rewind user 2's watermark so mark_read has messages to mark
+            conn.execute(text("UPDATE conversations SET last_read_message_id = 0 WHERE user_id = 2 AND peer_id = 1"))
+            conn.execute(text("ANALYZE"))
+
+        statements = {}
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+                statements.setdefault(statement, parameters)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            hot_paths()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+
+        failures = 0
+        with db.engine.connect() as conn:
+            for statement, parameters in statements.items():
+                lines, scans = explain(conn, statement, parameters)
+                summary = " ".join(statement.split())
+                if scans:
+                    failures += 1
+                    print(f"❌ sequential scan on {', '.join(scans)}: {summary[:160]}")
+                elif args.verbose:
+                    print(f"✅ {summary[:160]}")
+                if scans or args.verbose:
+                    for line in lines:
+                        print(f"      {line}")
+
+    print(f"{len(statements)} queries checked, {failures} with sequential scans")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
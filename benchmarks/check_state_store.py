@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+CHECK - Both state store backends pair, cancel and claim the same way
+
+Runs the same scenarios against InMemoryStateStore and RedisStateStore,
+the latter on the in-process FakeRedis client (and on a real server with
+--redis):
+
+  pairing        - the second searcher pops the first, the queue empties
+  cancel         - a cancelled user is never offered again
+  claim          - a user can only be claimed for one room at a time
+  skip / drop    - a partner is_available() skips stays queued (at the
+                   front), one it drops is gone
+  watch_retry    - a write to the queue between WATCH and EXEC makes the
+                   transaction run again, and nobody is lost (Redis only)
+  concurrent     - many threads searching at once: every user ends up
+                   paired exactly once or still waiting
+  seed           - seed_sequences() raises counters to the stored maxima
+                   and never lowers one already past them
+
+Exits non-zero if any scenario fails.
+
+Usage:
+    python benchmarks/check_state_store.py
+    python benchmarks/check_state_store.py --redis redis://localhost:6379/15
+"""
+
+import argparse
+import os
+import sys
+import threading
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_redis import FakeRedis  # noqa: E402
+from matching_engine import QueueEntry  # noqa: E402
+from state_store import InMemoryStateStore, RedisStateStore  # noqa: E402
+
+
+def entry(user_id, **fields):
+    return QueueEntry(user_id, f"sid-{user_id}", **fields)
+
+
+def partner_id(partner):
+    return partner.user_id if partner else None
+
+
+def pairing(store):
+    first = store.match_or_enqueue(entry(1))
+    second = store.match_or_enqueue(entry(2))
+    return (partner_id(first), partner_id(second), store.queue_length()) == (None, 1, 0)
+
+
+def cancel(store):
+    store.match_or_enqueue(entry(1))
+    cancelled = store.cancel(1)
+    again = store.cancel(1)
+    partner = store.match_or_enqueue(entry(2))
+    return (cancelled, again, partner_id(partner), store.queue_length()) == (True, False, None, 1)
+
+
+def claim(store):
+    first = store.claim_pair(1, 2, "room_a")
+    second = store.claim_pair(1, 3, "room_b")
+    members = store.release_room("room_a")
+    third = store.claim_pair(1, 3, "room_b")
+    return (first, second, members, third, store.get_room(2)) == (True, False, (1, 2), True, None)
+
+
+def skip(store):
+    store.match_or_enqueue(entry(1))
+    store.match_or_enqueue(entry(3, blocked=[1]))   # both stay waiting
+    partner = store.match_or_enqueue(entry(2), lambda p: p.user_id != 1)
+    # user 1 was skipped, so is still waiting and is the next one offered
+    after = store.match_or_enqueue(entry(4))
+    return (partner_id(partner), partner_id(after), store.queue_length()) == (3, 1, 0)
+
+
+def drop(store):
+    store.match_or_enqueue(entry(1))
+    partner = store.match_or_enqueue(entry(2), lambda p: None)
+    # user 1 is gone; user 2 is the one waiting now
+    after = store.match_or_enqueue(entry(3))
+    return (partner_id(partner), partner_id(after), store.queue_length()) == (None, 2, 0)
+
+
+def watch_retry(store):
+    if not isinstance(store, RedisStateStore):
+        return None
+    store.match_or_enqueue(entry(1))
+    calls = []
+    body = store._pop_or_push
+
+    def interfering(pipe, searcher):
+        calls.append(searcher.user_id)
+        if len(calls) == 1:
+            # Another worker queues someone after WATCH, before EXEC
+            store.requeue(entry(9))
+        return body(pipe, searcher)
+
+    store._pop_or_push = interfering
+    try:
+        partner = store.match_or_enqueue(entry(2))
+    finally:
+        store._pop_or_push = body
+    leftover = store.match_or_enqueue(entry(3))
+    return len(calls) >= 2 and {partner_id(partner), partner_id(leftover)} == {1, 9} and store.queue_length() == 0
+
+
+def concurrent(store, users=400, threads=8):
+    pairs = []
+    lock = threading.Lock()
+
+    def search(user_ids):
+        for user_id in user_ids:
+            partner = store.match_or_enqueue(entry(user_id))
+            if partner is not None:
+                with lock:
+                    pairs.append((user_id, partner.user_id))
+
+    workers = [threading.Thread(target=search, args=(range(i + 1, users + 1, threads),)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    paired = [user_id for pair in pairs for user_id in pair]
+    return len(paired) == len(set(paired)) and len(paired) + store.queue_length() == users
+
+
+def seed(store):
+    store.next_sequence("1_2")
+    store.next_sequence("1_2")
+    store.seed_sequences({"1_2": 1, "1_3": 7, "2_3": 0})
+    store.seed_sequences({})
+    return [store.next_sequence(c) for c in ("1_2", "1_3", "2_3", "3_4")] == [3, 8, 1, 1]
+
+
+SCENARIOS = (pairing, cancel, claim, skip, drop, watch_retry, concurrent, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--redis", help="also run against this server (keys under a random prefix)")
+    args = parser.parse_args()
+
+    backends = [
+        ("memory", InMemoryStateStore),
+        ("fakeredis", lambda: RedisStateStore(client=FakeRedis())),
+    ]
+    if args.redis:
+        import redis
+        client = redis.Redis.from_url(args.redis, decode_responses=True)
+        backends.append(("redis", lambda: RedisStateStore(client=client, prefix=f"check:{uuid.uuid4().hex[:8]}")))
+
+    failures = 0
+    for name, make_store in backends:
+        for scenario in SCENARIOS:
+            store = make_store()
+            ok = scenario(store)
+            if ok is None:
+                continue
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {name:<9} {scenario.__name__}")
+            if isinstance(store, RedisStateStore) and name == "redis":
+                for key in store.client.scan_iter(f"{store.k_sockets.rsplit(':', 1)[0]}:*"):
+                    store.client.delete(key)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
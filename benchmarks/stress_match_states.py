@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+STRESS TEST - Concurrent start / skip / end / disconnect on the match state machine
+
+Runs the same MatchCoordinator transitions the socket handlers use, from
+many threads at once against the in-process state store, then checks
+that no user ended up in two rooms, every room has two members that point
+back at it, and every user's state agrees with the store. Also counts
+immediate rematches (paired again with the partner just skipped).
+
+Usage:
+    python benchmarks/stress_match_states.py --users 2000 --ops 50000
+    python benchmarks/stress_match_states.py --threads 1 2 4 8 16
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from match_state import MatchCoordinator, IDLE, QUEUED, MATCHED  # noqa: E402
+from matching_engine import QueueEntry  # noqa: E402
+from state_store import InMemoryStateStore  # noqa: E402
+
+
+class Simulation:
+    """The match handlers minus Socket.IO and the database"""
+
+    def __init__(self, users):
+        self.store = InMemoryStateStore()
+        self.coordinator = MatchCoordinator(self.store)
+        self.users = users
+        self.pairs = 0
+        self.rematches = 0
+        self.last_partner = {}
+        self._pairs_lock = threading.Lock()
+        for user_id in range(1, users + 1):
+            self.store.set_socket(user_id, f"sid-{user_id}")
+
+    def start(self, user_id):
+        if self.store.get_room(user_id) or not self.coordinator.begin_search(user_id):
+            return
+        self.search(user_id)
+
+    def search(self, user_id):
+        paired = self.coordinator.pair(QueueEntry(user_id, f"sid-{user_id}"))
+        if paired is None:
+            return
+        other_user_id = paired[0].user_id
+        with self._pairs_lock:
+            self.pairs += 1
+            if self.last_partner.get(user_id) == other_user_id:
+                self.rematches += 1
+            self.last_partner[user_id] = other_user_id
+            self.last_partner[other_user_id] = user_id
+
+    def skip(self, user_id):
+        self.coordinator.end_match(user_id)
+        if self.coordinator.finish_ending(user_id, requeue=True) == QUEUED:
+            self.search(user_id)
+
+    def end(self, user_id):
+        self.coordinator.end_match(user_id)
+        self.coordinator.finish_ending(user_id)
+        self.coordinator.cancel(user_id)
+
+    def disconnect(self, user_id):
+        self.coordinator.cancel(user_id)
+        self.coordinator.end_match(user_id)
+        self.coordinator.forget(user_id)
+
+    def worker(self, ops, seed):
+        rng = random.Random(seed)
+        actions = [self.start] * 5 + [self.skip] * 3 + [self.end, self.disconnect]
+        for _ in range(ops):
+            rng.choice(actions)(rng.randint(1, self.users))
+
+    def check(self):
+        """Return a list of invariant violations (empty when consistent)"""
+        errors = []
+        store, coordinator = self.store, self.coordinator
+        for room_id, members in store.rooms.items():
+            if members[0] == members[1]:
+                errors.append(f"{room_id}: user paired with themselves")
+            for user_id in members:
+                if store.user_rooms.get(user_id) != room_id:
+                    errors.append(f"{room_id}: user {user_id} points at {store.user_rooms.get(user_id)}")
+        if len(store.user_rooms) != 2 * len(store.rooms):
+            errors.append(f"{len(store.user_rooms)} users in {len(store.rooms)} rooms")
+
+        for user_id in range(1, self.users + 1):
+            state = coordinator.state(user_id)
+            in_room = user_id in store.user_rooms
+            in_queue = user_id in store.queue
+            if (state == MATCHED) != in_room:
+                errors.append(f"user {user_id}: state {state} but in_room={in_room}")
+            if (state == QUEUED) != in_queue:
+                errors.append(f"user {user_id}: state {state} but in_queue={in_queue}")
+            if in_room and in_queue:
+                errors.append(f"user {user_id}: both queued and in a room")
+            if state not in (IDLE, QUEUED, MATCHED):
+                errors.append(f"user {user_id}: left in state {state}")
+        return errors
+
+
+def run(users, threads, ops):
+    sim = Simulation(users)
+    per_thread = ops // threads
+    workers = [
+        threading.Thread(target=sim.worker, args=(per_thread, seed))
+        for seed in range(threads)
+    ]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return sim, per_thread * threads / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=40000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    sys.setswitchinterval(1e-5)  # switch threads often to provoke races
+
+    failed = False
+    print(f"{'threads':>7} {'ops/s':>9} {'pairs':>7} {'rematch':>8} {'rooms':>6} {'queued':>7}  result")
+    for threads in args.threads:
+        sim, rate, _ = run(args.users, threads, args.ops)
+        errors = sim.check()
+        failed = failed or bool(errors)
+        print(f"{threads:>7} {rate:>9.0f} {sim.pairs:>7} {sim.rematches:>8} {len(sim.store.rooms):>6} "
+              f"{len(sim.store.queue):>7}  {'OK' if not errors else f'{len(errors)} violations'}")
+        for error in errors[:10]:
+            print(f"    {error}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,82 @@ class Config:
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
 
+    # Matching runs on an in-memory queue; the match_queue table is only
+    # written (in the background) when this audit trail is switched on
+    MATCH_QUEUE_AUDIT = os.getenv('MATCH_QUEUE_AUDIT', 'false').lower() == 'true'
+
+    # Redis URL for matchmaking/presence state shared between workers;
+    # unset keeps the state inside this process (single worker only)
+    STATE_STORE_URL = os.getenv('STATE_STORE_URL')
+
+    # Pub/sub broker that fans Socket.IO emits out to every process
+    # (redis://... in production, local:// for an in-process stand-in)
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_FANOUT_WINDOW_MS = int(os.getenv('SOCKETIO_FANOUT_WINDOW_MS', '5'))
+
+    # Socket.IO async mode (threading / gevent / eventlet) is read from
+    # SOCKETIO_ASYNC_MODE by async_runtime.py before Flask is imported
+
+    # Timers (timers.py): how long a search may wait, how long a dropped
+    # socket has to reconnect before the user is marked offline, and how
+    # often orphaned matches are reaped / match tables compacted
+    MATCH_QUEUE_TIMEOUT_SECONDS = int(os.getenv('MATCH_QUEUE_TIMEOUT_SECONDS', '600'))
+    RECONNECT_GRACE_SECONDS = int(os.getenv('RECONNECT_GRACE_SECONDS', '10'))
+    MATCH_REAP_INTERVAL_SECONDS = int(os.getenv('MATCH_REAP_INTERVAL_SECONDS', '60'))
+    MATCH_COMPACT_INTERVAL_SECONDS = int(os.getenv('MATCH_COMPACT_INTERVAL_SECONDS', '3600'))
+    MATCH_HISTORY_RETENTION_DAYS = int(os.getenv('MATCH_HISTORY_RETENTION_DAYS', '30'))
+
+    # users.is_online / last_seen are written behind, batched this often
+    PRESENCE_FLUSH_SECONDS = int(os.getenv('PRESENCE_FLUSH_SECONDS', '5'))
+
+    # Online/offline changes are sent to online friends in one delta frame
+    # per window instead of being broadcast to everyone
+    PRESENCE_FANOUT_SECONDS = float(os.getenv('PRESENCE_FANOUT_SECONDS', '1'))
+
+    # Friend / block sets are cached per worker; changes made on another
+    # worker show up once the cached entry is this old (0 = never expire)
+    SOCIAL_GRAPH_TTL_SECONDS = int(os.getenv('SOCIAL_GRAPH_TTL_SECONDS', '60'))
+
+    # current_user snapshots kept per worker (LRU); ORM changes to a user
+    # drop theirs at once, anything else is re-read after the TTL
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+    USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', '30'))
+
+    # /health/ready gives the database this long to answer SELECT 1.
+    # /stats and /metrics need `Authorization: Bearer <STATS_TOKEN>`; with
+    # no token set they only answer direct requests from localhost, so set
+    # STATS_TOKEN to scrape them from a monitoring host
+    HEALTH_DB_TIMEOUT_MS = int(os.getenv('HEALTH_DB_TIMEOUT_MS', '1000'))
+    STATS_TOKEN = os.getenv('STATS_TOKEN', '')
+    # Latency histograms for every socket event and HTTP view (metrics.py)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Logging (structured_logging.py): JSON lines (or "text") written by a
+    # background thread; LOG_SAMPLE_RATES keeps a fraction of chatty
+    # events, e.g. "http_request=0.05,message_sent=0.1"
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'http_request=0.05')
+    # Per-packet Socket.IO / Engine.IO logging
+    SOCKETIO_LOGGER = os.getenv('SOCKETIO_LOGGER', 'false').lower() == 'true'
+
+    # Chat messages are inserted by a background writer in batches of up
+    # to MESSAGE_BATCH_SIZE rows every MESSAGE_BATCH_WINDOW_MS; accepted
+    # messages are journaled until committed (empty path disables it).
+    # The path is a prefix: each worker process locks its own numbered
+    # slot of it, and a slot left by a dead worker is replayed by the next
+    # one to start. Messages the database rejects are moved to <path>.dead
+    MESSAGE_BATCH_WINDOW_MS = int(os.getenv('MESSAGE_BATCH_WINDOW_MS', '5'))
+    MESSAGE_BATCH_SIZE = int(os.getenv('MESSAGE_BATCH_SIZE', '500'))
+    MESSAGE_JOURNAL_PATH = os.getenv('MESSAGE_JOURNAL_PATH', 'instance/message-journal.log')
+    MESSAGE_JOURNAL_FSYNC = os.getenv('MESSAGE_JOURNAL_FSYNC', 'false').lower() == 'true'
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SQLALCHEMY_ECHO = True
     SESSION_COOKIE_SECURE = False
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
     SOCKETIO_CORS_ALLOWED_ORIGINS = [
         "http://localhost:5000",
         "http://127.0.0.1:5000",
@@ -78,8 +149,3 @@ elif config_name == 'testing':
     config = TestingConfig
 else:
     config = DevelopmentConfig
-
-# Log the configuration being used (helpful for debugging)
-import logging
-logger = logging.getLogger(__name__)
-logger.info("Using config: " + config_name)
\ No newline at end of file
@@ -0,0 +1,334 @@
+"""
+CONVERSATIONS - Per-user conversation summaries kept in step with messages
+
+Each 1:1 conversation has two `conversations` rows, one per participant,
+holding what the friends list shows: last message id / time / preview
+and that participant's unread count. They are written in the same
+transaction as the message insert or read that changes them, so the
+friends list is one indexed query instead of two per friend.
+
+Reading is a watermark: last_read_message_id says everything the peer
+sent up to that id has been read. Moving it is one UPDATE, and unread
+counts are the peer's messages above it.
+
+`flask backfill-conversations` rebuilds every row from the messages
+table (for existing data, or to repair drift), numbering any messages
+that predate sequence numbers.
+
+Message history is read in pages, newest first, with keyset pagination
+on (created_at, id): the cursor is the last row seen, so a page costs the
+same however far back it is.
+
+Every message also carries its conversation key and a per-conversation
+sequence number; a reconnecting client asks for everything after the
+last seq it has (sync_messages), one range scan on (conversation, seq).
+"""
+
+import base64
+import logging
+from datetime import datetime
+
+import click
+from sqlalchemy import and_, bindparam, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models.models import db, Conversation, Message, User, friends_association
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_LENGTH = 100
+BACKFILL_BATCH = 1000
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+SYNC_MAX_MESSAGES = 500
+
+
+def conversation_id(user_a, user_b):
+    """Conversation key of two users, the same as their chat room"""
+    return f"chat_{min(user_a, user_b)}_{max(user_a, user_b)}"
+
+
+def conversation_members(conversation):
+    """(low_id, high_id) from a conversation key, ValueError if malformed"""
+    try:
+        prefix, low_id, high_id = conversation.split("_")
+        if prefix != "chat":
+            raise ValueError
+        return int(low_id), int(high_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid conversation: {conversation!r}")
+
+
+def message_preview(text):
+    return (text or "📎 Shared file")[:PREVIEW_LENGTH]
+
+
+# ===== WRITES (caller commits) =====
+
+def record_messages(messages):
+    """Fold a batch of new message rows (dicts, id order) into the summaries
+
+    Each conversation's two rows are written once per batch, whatever the
+    number of messages. Returns {(receiver_id, sender_id): unread count}.
+    """
+    latest = {}     # {(low_id, high_id): newest message}
+    received = {}   # {(receiver_id, sender_id): messages received}
+    for message in messages:
+        sender_id, receiver_id = message['sender_id'], message['receiver_id']
+        latest[(min(sender_id, receiver_id), max(sender_id, receiver_id))] = message
+        received[(receiver_id, sender_id)] = received.get((receiver_id, sender_id), 0) + 1
+
+    for (low_id, high_id), message in latest.items():
+        last = {
+            'last_message_id': message['id'],
+            'last_message_at': message['created_at'],
+            'last_sender_id': message['sender_id'],
+            'preview': message_preview(message['text']),
+        }
+        _upsert(low_id, high_id, last, unread_delta=received.get((low_id, high_id), 0))
+        _upsert(high_id, low_id, last, unread_delta=received.get((high_id, low_id), 0))
+
+    rows = db.session.execute(
+        select(Conversation.user_id, Conversation.peer_id, Conversation.unread_count).where(or_(*(
+            and_(Conversation.user_id == user_id, Conversation.peer_id == peer_id)
+            for user_id, peer_id in received
+        )))
+    )
+    return {(user_id, peer_id): unread for user_id, peer_id, unread in rows}
+
+
+def mark_read(reader_id, peer_id, up_to=None):
+    """Move reader_id's read watermark for peer_id forward to up_to
+
+    up_to defaults to (and is capped at) the conversation's last message.
+    Returns (watermark, unread_count), or None if nothing new was read.
+
+    The summary row is locked before the unread messages are counted, so
+    the writer's `unread_count + delta` for a concurrent batch either
+    lands before the count (and is included in it) or waits for this
+    transaction and applies on top of it.
+    """
+    row = db.session.execute(
+        select(Conversation.last_message_id, Conversation.last_read_message_id).where(
+            Conversation.user_id == reader_id, Conversation.peer_id == peer_id
+        ).with_for_update()
+    ).first()
+    if row is None or not row.last_message_id:
+        return None
+    watermark = row.last_message_id if up_to is None else min(int(up_to), row.last_message_id)
+    if watermark <= row.last_read_message_id:
+        return None
+
+    from_peer = and_(Message.sender_id == peer_id, Message.receiver_id == reader_id)
+    db.session.execute(
+        update(Message)
+        .where(from_peer, Message.id > row.last_read_message_id, Message.id <= watermark)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
+    )
+    unread = db.session.execute(
+        select(func.count(Message.id)).where(from_peer, Message.id > watermark)
+    ).scalar()
+    moved = db.session.execute(
+        update(Conversation)
+        .where(
+            Conversation.user_id == reader_id,
+            Conversation.peer_id == peer_id,
+            Conversation.last_read_message_id < watermark,
+        )
+        .values(last_read_message_id=watermark, unread_count=unread)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not moved:
+        return None   # a concurrent read got further
+    return watermark, unread
+
+
+def _upsert(user_id, peer_id, last, unread_delta):
+    """UPDATE the summary row, INSERT it if missing (retrying once on a race)"""
+    for _ in range(2):
+        updated = db.session.execute(
+            update(Conversation)
+            .where(Conversation.user_id == user_id, Conversation.peer_id == peer_id)
+            .values(unread_count=Conversation.unread_count + unread_delta, **last)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Conversation).values(
+                    user_id=user_id, peer_id=peer_id, unread_count=unread_delta,
+                    last_read_message_id=0, **last
+                ))
+            return
+        except IntegrityError:
+            # Inserted concurrently by the other participant's request
+            continue
+
+
+# ===== QUERIES =====
+
+def friend_conversations(user_id):
+    """[(friend, Conversation or None)] for user_id, most recent first
+
+    One query: friends joined to the user's summary rows; friends with no
+    messages yet come last.
+    """
+    return (
+        db.session.query(User, Conversation)
+        .join(friends_association, friends_association.c.friend_id == User.id)
+        .outerjoin(Conversation, and_(
+            Conversation.user_id == user_id,
+            Conversation.peer_id == User.id,
+        ))
+        .filter(friends_association.c.user_id == user_id)
+        .order_by(Conversation.last_message_at.is_(None), Conversation.last_message_at.desc(), User.id)
+        .all()
+    )
+
+
+# ===== HISTORY =====
+
+def encode_cursor(message):
+    raw = f"{message.created_at.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, ValueError if it is malformed"""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def history_page(user_id, peer_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """One page of a 1:1 conversation, older than the `before` cursor
+
+    Returns (messages oldest first, cursor for the next older page or None).
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    query = Message.query.filter(or_(
+        and_(Message.sender_id == user_id, Message.receiver_id == peer_id),
+        and_(Message.sender_id == peer_id, Message.receiver_id == user_id),
+    ))
+    if before:
+        created_at, message_id = decode_cursor(before)
+        query = query.filter(or_(
+            Message.created_at < created_at,
+            and_(Message.created_at == created_at, Message.id < message_id),
+        ))
+    rows = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit][::-1], next_cursor
+
+
+def message_payload(message):
+    """JSON shape of a message (ORM row or writer dict), as sent with receive_message"""
+    if not isinstance(message, dict):
+        message = {c: getattr(message, c) for c in (
+            'id', 'sender_id', 'conversation', 'seq', 'text', 'image', 'document',
+            'created_at', 'is_read',
+        )}
+    return {
+        'id': message['id'],
+        'sender_id': message['sender_id'],
+        'conversation_id': message['conversation'],
+        'seq': message['seq'],
+        'text': message['text'],
+        'image': message['image'],
+        'document': message['document'],
+        'timestamp': message['created_at'].strftime('%H:%M'),
+        'created_at': message['created_at'].isoformat(),
+        'is_read': message['is_read'],
+    }
+
+
+def sync_messages(conversation, since_seq, limit=SYNC_MAX_MESSAGES):
+    """Stored messages of a conversation after since_seq, in seq order
+
+    Returns (messages, has_more); has_more means call again from the
+    last seq returned.
+    """
+    rows = (
+        Message.query
+        .filter(Message.conversation == conversation, Message.seq > since_seq)
+        .order_by(Message.seq)
+        .limit(limit + 1)
+        .all()
+    )
+    return rows[:limit], len(rows) > limit
+
+
+# ===== BACKFILL =====
+
+def backfill():
+    """Rebuild all summaries from messages, returns the number of rows written"""
+    summaries = {}   # {(user_id, peer_id): row values}
+    rows = db.session.execute(
+        select(
+            Message.id, Message.sender_id, Message.receiver_id,
+            Message.created_at, Message.text, Message.is_read, Message.seq,
+        ).order_by(Message.id).execution_options(yield_per=BACKFILL_BATCH)
+    )
+    # Unnumbered messages continue after the conversation's highest seq
+    sequences = dict(db.session.execute(
+        select(Message.conversation, func.max(Message.seq))
+        .where(Message.seq.isnot(None))
+        .group_by(Message.conversation)
+    ).all())
+    numbered = []    # messages that predate sequence numbers
+    for message_id, sender_id, receiver_id, created_at, text, is_read, seq in rows:
+        last = {
+            'last_message_id': message_id,
+            'last_message_at': created_at,
+            'last_sender_id': sender_id,
+            'preview': message_preview(text),
+        }
+        for user_id, peer_id in ((sender_id, receiver_id), (receiver_id, sender_id)):
+            summary = summaries.setdefault((user_id, peer_id), {
+                'user_id': user_id, 'peer_id': peer_id,
+                'unread_count': 0, 'last_read_message_id': 0,
+            })
+            summary.update(last)
+        conversation = conversation_id(sender_id, receiver_id)
+        if seq is None:
+            sequences[conversation] = sequences.get(conversation, 0) + 1
+            numbered.append({'_id': message_id, 'conversation': conversation, 'seq': sequences[conversation]})
+
+        # Watermark = newest read message; unread = the peer's messages after it
+        summary = summaries[(receiver_id, sender_id)]
+        if is_read:
+            summary['last_read_message_id'] = message_id
+            summary['unread_count'] = 0
+        else:
+            summary['unread_count'] += 1
+
+    # Sequence numbers for messages stored before they existed
+    for start in range(0, len(numbered), BACKFILL_BATCH):
+        db.session.execute(
+            update(Message.__table__)
+            .where(Message.__table__.c.id == bindparam('_id'))
+            .values(conversation=bindparam('conversation'), seq=bindparam('seq')),
+            numbered[start:start + BACKFILL_BATCH],
+        )
+
+    db.session.execute(Conversation.__table__.delete())
+    values = list(summaries.values())
+    for start in range(0, len(values), BACKFILL_BATCH):
+        db.session.execute(insert(Conversation), values[start:start + BACKFILL_BATCH])
+    db.session.commit()
+    return len(values)
+
+
+def init_conversation_commands(app):
+    @app.cli.command("backfill-conversations")
+    def backfill_conversations():
+        """Rebuild the conversations summary table from messages."""
+        db.create_all()
+        count = backfill()
+        logger.info(f"✅ Backfilled {count} conversation summaries")
+        click.echo(f"✅ Backfilled {count} conversation summaries")
@@ -0,0 +1,211 @@
+"""
+FAKE REDIS - In-process stand-in for the redis-py client
+
+Implements just the commands RedisStateStore uses (hashes, sets, lists,
+counters), pipelines and WATCH / MULTI / EXEC transactions, so the
+shared backend can be exercised without a server:
+
+    store = RedisStateStore(client=FakeRedis())
+
+Every write bumps a per-key version; a transaction whose watched keys
+changed between WATCH and EXEC raises WatchError and is retried by
+transaction(), exactly like against a real server. `conflicts` counts
+those retries. Values are returned as str (decode_responses=True).
+"""
+
+import threading
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:
+    class WatchError(Exception):
+        """A watched key changed before EXEC"""
+
+
+class FakeRedis:
+    """Thread-safe dict-backed client"""
+
+    WRITES = {
+        'hset', 'hdel', 'hincrby', 'sadd', 'srem', 'incr', 'set',
+        'lpush', 'rpush', 'lrem', 'delete',
+    }
+
+    def __init__(self):
+        self._data = {}
+        self._versions = {}
+        self._lock = threading.RLock()
+        self.conflicts = 0
+
+    # ===== TRANSACTIONS =====
+
+    def pipeline(self, transaction=True):
+        return Pipeline(self)
+
+    def transaction(self, func, *watches, value_from_callable=False):
+        pipe = self.pipeline()
+        while True:
+            try:
+                if watches:
+                    pipe.watch(*watches)
+                value = func(pipe)
+                result = pipe.execute()
+                return value if value_from_callable else result
+            except WatchError:
+                self.conflicts += 1
+            finally:
+                pipe.reset()
+
+    def _run(self, name, args, kwargs):
+        with self._lock:
+            if name in self.WRITES:
+                key = args[0]
+                self._versions[key] = self._versions.get(key, 0) + 1
+            return getattr(self, '_' + name)(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not hasattr(type(self), '_' + name):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._run(name, args, kwargs)
+
+    # ===== COMMANDS =====
+
+    def _get(self, key):
+        return self._data.get(key)
+
+    def _set(self, key, value):
+        self._data[key] = str(value)
+        return True
+
+    def _incr(self, key, amount=1):
+        value = int(self._data.get(key, 0)) + amount
+        self._data[key] = str(value)
+        return value
+
+    def _delete(self, *keys):
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def _hset(self, key, field=None, value=None, mapping=None):
+        table = self._data.setdefault(key, {})
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        added = 0
+        for f, v in items.items():
+            added += str(f) not in table
+            table[str(f)] = str(v)
+        return added
+
+    def _hget(self, key, field):
+        return self._data.get(key, {}).get(str(field))
+
+    def _hmget(self, key, fields, *more):
+        fields = list(fields) if isinstance(fields, (list, tuple)) else [fields]
+        table = self._data.get(key, {})
+        return [table.get(str(f)) for f in fields + list(more)]
+
+    def _hdel(self, key, *fields):
+        table = self._data.get(key, {})
+        return sum(table.pop(str(f), None) is not None for f in fields)
+
+    def _hlen(self, key):
+        return len(self._data.get(key, {}))
+
+    def _hincrby(self, key, field, amount=1):
+        table = self._data.setdefault(key, {})
+        value = int(table.get(str(field), 0)) + amount
+        table[str(field)] = str(value)
+        return value
+
+    def _sadd(self, key, *values):
+        members = self._data.setdefault(key, set())
+        before = len(members)
+        members.update(str(v) for v in values)
+        return len(members) - before
+
+    def _srem(self, key, *values):
+        members = self._data.get(key, set())
+        before = len(members)
+        members.difference_update(str(v) for v in values)
+        return before - len(members)
+
+    def _smembers(self, key):
+        return set(self._data.get(key, ()))
+
+    def _scard(self, key):
+        return len(self._data.get(key, ()))
+
+    def _lpush(self, key, *values):
+        items = self._data.setdefault(key, [])
+        for value in values:
+            items.insert(0, str(value))
+        return len(items)
+
+    def _rpush(self, key, *values):
+        items = self._data.setdefault(key, [])
+        items.extend(str(v) for v in values)
+        return len(items)
+
+    def _lrange(self, key, start, end):
+        items = self._data.get(key, [])
+        return list(items[start:] if end == -1 else items[start:end + 1])
+
+    def _lrem(self, key, count, value):
+        items = self._data.get(key, [])
+        removed = 0
+        for i in range(len(items) - 1, -1, -1) if count < 0 else range(len(items)):
+            if i < len(items) and items[i] == str(value):
+                del items[i]
+                removed += 1
+                if count and removed == abs(count):
+                    break
+        return removed
+
+
+class Pipeline:
+    """Commands run at once while watching, are queued after multi() (or
+    from the start when nothing is watched) and applied by execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.reset()
+
+    def reset(self):
+        self._watched = None
+        self._queued = []
+        self._immediate = False
+
+    def watch(self, *keys):
+        with self.client._lock:
+            self._watched = {key: self.client._versions.get(key, 0) for key in keys}
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    def execute(self):
+        with self.client._lock:
+            try:
+                for key, version in (self._watched or {}).items():
+                    if self.client._versions.get(key, 0) != version:
+                        raise WatchError(f"{key} changed")
+                return [self.client._run(name, args, kwargs) for name, args, kwargs in self._queued]
+            finally:
+                self.reset()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        command = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            if self._immediate:
+                return command(*args, **kwargs)
+            self._queued.append((name, args, kwargs))
+            return self
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
@@ -0,0 +1,242 @@
+"""
+FANOUT - Cross-process Socket.IO emits and room joins over pub/sub
+
+Plugged into Socket.IO as its client manager. Every emit, disconnect,
+close_room and remote room join is published to a broker channel and
+applied by whichever process holds the target sockets. Publishes are
+coalesced: everything sent within `batch_window` seconds (or `max_batch`
+messages) goes out as one broker message.
+
+Emits to a single socket held by this process skip the broker entirely.
+
+Brokers:
+  RedisBroker  - redis:// URLs, for real multi-process / multi-host setups
+  LocalBroker  - in-process stand-in (local://) for tests and development;
+                 every local:// manager in a process shares one broker, so
+                 several servers in one process reach each other
+"""
+
+import logging
+import pickle
+import queue
+import threading
+import time
+
+from socketio import BaseManager, PubSubManager
+
+from batching import BatchFlusher
+
+try:
+    import redis
+except ImportError:  # only needed for redis:// message queues
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+# =====================================================
+# BROKERS
+# =====================================================
+
+class LocalBroker:
+    """In-process pub/sub with the same interface as RedisBroker"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for inbox in subscribers:
+            inbox.put(payload)
+
+    def listen(self, channel):
+        inbox = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(inbox)
+        while True:
+            yield inbox.get()
+
+    def subscribers(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+class RedisBroker:
+    """Pub/sub over Redis PUBLISH/SUBSCRIBE, reconnecting on errors"""
+
+    RETRY_SECONDS = 1
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a redis:// message queue")
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+
+    def publish(self, channel, payload):
+        try:
+            self.client.publish(channel, payload)
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Fan-out publish failed, retrying once: {e}")
+            self.client = redis.Redis.from_url(self.url)
+            self.client.publish(channel, payload)
+
+    def listen(self, channel):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        yield message['data']
+            except redis.exceptions.RedisError as e:
+                logger.error(f"Fan-out subscription lost, reconnecting: {e}")
+                time.sleep(self.RETRY_SECONDS)
+                self.client = redis.Redis.from_url(self.url)
+
+
+# =====================================================
+# CLIENT MANAGER
+# =====================================================
+
+class BatchingPubSubManager(PubSubManager):
+    """Socket.IO client manager that fans out through a broker in batches"""
+
+    name = 'batching-pubsub'
+
+    def __init__(self, broker, channel='openworld-socketio', batch_window=0.005,
+                 max_batch=100, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.broker = broker
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._pending = []
+        self._cond = threading.Condition()
+        self._flusher = BatchFlusher(
+            "socketio-fanout", self._cond, batch_window,
+            pending=lambda: self._pending,
+            full=lambda: len(self._pending) >= self.max_batch,
+            flush=self.flush,
+        )
+
+        self.published_messages = 0
+        self.published_batches = 0
+
+    def initialize(self):
+        super().initialize()
+        self._flusher.start()
+
+    # ===== OUTGOING =====
+
+    def emit(self, event, data, namespace=None, room=None, skip_sid=None,
+             callback=None, **kwargs):
+        namespace = namespace or '/'
+        if not kwargs.get('ignore_queue') and room is not None and \
+                callback is None and self.is_connected(room, namespace):
+            # room is one of our own sockets - nobody else needs to hear it
+            return BaseManager.emit(self, event, data, namespace=namespace,
+                                    room=room, skip_sid=skip_sid)
+        return super().emit(event, data, namespace=namespace, room=room,
+                            skip_sid=skip_sid, callback=callback, **kwargs)
+
+    def enter_room(self, sid, namespace, room, eio_sid=None):
+        if eio_sid is not None or self.is_connected(sid, namespace):
+            return super().enter_room(sid, namespace, room, eio_sid=eio_sid)
+        self._publish({'method': 'enter_room', 'sid': sid,
+                       'namespace': namespace or '/', 'room': room})
+
+    def leave_room(self, sid, namespace, room):
+        if self.is_connected(sid, namespace):
+            return super().leave_room(sid, namespace, room)
+        self._publish({'method': 'leave_room', 'sid': sid,
+                       'namespace': namespace or '/', 'room': room})
+
+    def _publish(self, data):
+        with self._cond:
+            self._pending.append(data)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self):
+        """Publish everything pending as one broker message"""
+        with self._cond:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            self.broker.publish(self.channel, pickle.dumps(
+                {'method': 'batch', 'host_id': self.host_id, 'messages': batch}
+            ))
+            self.published_messages += len(batch)
+            self.published_batches += 1
+        except Exception as e:
+            logger.error(f"Fan-out publish of {len(batch)} messages failed: {e}")
+
+    # ===== INCOMING =====
+
+    def _listen(self):
+        yield from self.broker.listen(self.channel)
+
+    def _thread(self):
+        for payload in self._listen():
+            try:
+                data = pickle.loads(payload) if isinstance(payload, bytes) else payload
+            except Exception:
+                logger.error("Dropping undecodable fan-out message")
+                continue
+            if not isinstance(data, dict):
+                continue
+            messages = data.get('messages', ()) if data.get('method') == 'batch' else (data,)
+            for message in messages:
+                try:
+                    self._dispatch(message)
+                except Exception:
+                    logger.exception("Error applying fan-out message")
+
+    def _dispatch(self, message):
+        method = message.get('method')
+        if method == 'emit':
+            self._handle_emit(message)
+        elif method == 'callback':
+            self._handle_callback(message)
+        elif method == 'disconnect':
+            if self.is_connected(message.get('sid'), message.get('namespace')):
+                self._handle_disconnect(message)
+        elif method == 'close_room':
+            self._handle_close_room(message)
+        elif method == 'enter_room':
+            if self.is_connected(message['sid'], message['namespace']):
+                super().enter_room(message['sid'], message['namespace'], message['room'])
+        elif method == 'leave_room':
+            if self.is_connected(message['sid'], message['namespace']):
+                super().leave_room(message['sid'], message['namespace'], message['room'])
+
+
+def create_client_manager(url, batch_window=0.005, channel='openworld-socketio'):
+    """Build the fan-out client manager for a message queue URL (None = off)"""
+    if not url:
+        return None
+    if url.startswith(('redis://', 'rediss://')):
+        broker = RedisBroker(url)
+    elif url.startswith('local://'):
+        broker = get_local_broker()
+    else:
+        raise ValueError(f"Unsupported message queue URL: {url}")
+    logger.info(f"✅ Socket.IO fan-out via {url.split('://', 1)[0]} broker")
+    return BatchingPubSubManager(broker, channel=channel, batch_window=batch_window)
+
+
+# ===== GLOBAL INSTANCE =====
+
+_local_broker = None
+_local_broker_lock = threading.Lock()
+
+
+def get_local_broker():
+    """The process-wide broker shared by every local:// manager"""
+    global _local_broker
+    with _local_broker_lock:
+        if _local_broker is None:
+            _local_broker = LocalBroker()
+        return _local_broker
@@ -0,0 +1,126 @@
+"""
+HEALTH - Liveness, readiness and capacity statistics
+
+Load balancer probes hit these every few seconds, so they must not add
+load of their own:
+
+  liveness   - answered from memory, no I/O at all
+  readiness  - SELECT 1 on a pooled connection, given up after a short
+               timeout (one probe in flight at a time, so a hung database
+               does not pile up probe threads)
+  stats      - connection pool usage, sockets, online users, match queue,
+               active rooms, message writer lag, cache hit rates and
+               log queue depth / drops
+"""
+
+import hmac
+import ipaddress
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from models.models import db
+
+logger = logging.getLogger(__name__)
+
+STARTED_AT = time.time()
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="readiness")
+_probe = None
+_probe_lock = threading.Lock()
+
+
+# ===== READINESS =====
+
+def check_database(app, timeout=1.0):
+    """(ok, error) for a SELECT 1 that must answer within timeout seconds"""
+    global _probe
+    with _probe_lock:
+        if _probe is None or _probe.done():
+            _probe = _executor.submit(_select_one, app, timeout)
+        probe = _probe
+    try:
+        probe.result(timeout=timeout)
+        return True, None
+    except FutureTimeout:
+        return False, f"no answer within {timeout}s"
+    except Exception as e:
+        return False, str(e)
+
+
+def _select_one(app, timeout):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+            conn.exec_driver_sql("SELECT 1").scalar()
+
+
+# ===== STATS =====
+
+def pool_stats(engine):
+    """Checked-out / overflow counts of the engine's connection pool"""
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+def collect_stats(socketio):
+    """Snapshot of where this worker's capacity goes (needs an app context)"""
+    from message_writer import get_message_writer
+    from presence import get_presence
+    from social_graph import get_social_graph
+    from state_store import get_state_store
+    from structured_logging import logging_stats
+    from timers import get_timers
+    from user_cache import get_user_cache
+
+    store = get_state_store()
+    writer = get_message_writer()
+    graph = get_social_graph()
+    return {
+        "uptime_seconds": int(time.time() - STARTED_AT),
+        "db_pool": pool_stats(db.engine),
+        "sockets": len(socketio.server.eio.sockets),
+        "online_users": store.online_count(),
+        "match_queue": store.queue_length(),
+        "active_rooms": store.room_count(),
+        "message_writer": {
+            "lag": writer.lag(),
+            "submitted": writer.submitted,
+            "written": writer.written,
+            "batches": writer.batches,
+            "failures": writer.failures,
+            "dead_letters": writer.dead_letters,
+        },
+        "presence_pending": get_presence().pending(),
+        "timers": len(get_timers()),
+        "user_cache": get_user_cache().stats(),
+        "social_graph": {"hits": graph.hits, "misses": graph.misses},
+        "logging": logging_stats(),
+    }
+
+
+def stats_authorized(request, token):
+    """Needs `Authorization: Bearer <token>`; with no token, local requests only
+
+    Without STATS_TOKEN the numbers are served only to a client on the
+    loopback interface that did not come through a proxy (a proxy on the
+    same host connects from loopback too, but adds X-Forwarded-For).
+    """
+    if not token:
+        return _is_loopback(request.remote_addr) and "X-Forwarded-For" not in request.headers
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(supplied, token)
+
+
+def _is_loopback(address):
+    try:
+        return ipaddress.ip_address(address or "").is_loopback
+    except ValueError:
+        return False
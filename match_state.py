@@ -0,0 +1,262 @@
+"""
+MATCH STATE - Per-user match state machine with lock-striped transitions
+
+Every user is in one of four states:
+
+  idle     - not searching, not in a match (not stored)
+  queued   - waiting in the matchmaking queue
+  matched  - in a room with a partner
+  ending   - leaving a room (skip / end chat) while the DB catches up
+
+Transitions for a user are serialized by one of a fixed set of striped
+locks picked by user id, so handlers for different users never contend
+on a global lock. Transitions touching two users (pairing, ending a
+match) take both stripes in index order, which rules out deadlocks.
+
+The state store stays the cross-worker arbiter (claim_pair); these
+states only cover the users whose sockets this process holds.
+
+Skipping is a single ending -> queued transition, and the last few
+partners of each user are kept out of their next pairings.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+
+from matching_engine import RecentPartners
+
+logger = logging.getLogger(__name__)
+
+IDLE = 'idle'
+QUEUED = 'queued'
+MATCHED = 'matched'
+ENDING = 'ending'
+
+TRANSITIONS = {
+    IDLE: {QUEUED},
+    QUEUED: {IDLE, MATCHED},
+    MATCHED: {ENDING},
+    ENDING: {IDLE, QUEUED},
+}
+
+
+def room_generation(room_id):
+    """Generation number carried at the end of a room id (0 if none)"""
+    try:
+        return int(room_id.rsplit('_', 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+class InvalidTransition(Exception):
+    """A handler tried to move a user along an edge the machine lacks"""
+
+
+class StripedLocks:
+    """A fixed pool of locks; a key always maps to the same lock"""
+
+    def __init__(self, stripes=256):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def stripe(self, key):
+        return hash(key) % len(self._locks)
+
+    @contextmanager
+    def hold(self, *keys):
+        """Hold the stripes of all keys, acquired in index order"""
+        stripes = sorted({self.stripe(k) for k in keys if k is not None})
+        for i in stripes:
+            self._locks[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(stripes):
+                self._locks[i].release()
+
+
+class MatchCoordinator:
+    """Runs the match state transitions against a StateStore
+
+    is_local(user_id) says whether this process holds the user's socket;
+    only local partners are checked against the state machine, remote
+    ones are left to the store's atomic claim.
+    """
+
+    MAX_CLAIM_ATTEMPTS = 3
+
+    def __init__(self, store, is_local=None, stripes=256):
+        self.store = store
+        self.is_local = is_local or (lambda user_id: True)
+        self.locks = StripedLocks(stripes)
+        self.recent = RecentPartners()
+        self._states = {}   # {user_id: state}, idle users are absent
+
+    # ===== STATES =====
+
+    def state(self, user_id):
+        return self._states.get(user_id, IDLE)
+
+    def _move(self, user_id, new_state):
+        """Change state (stripe held by caller), validating the edge"""
+        old_state = self.state(user_id)
+        if new_state not in TRANSITIONS[old_state]:
+            raise InvalidTransition(f"user {user_id}: {old_state} -> {new_state}")
+        if new_state == IDLE:
+            self._states.pop(user_id, None)
+        else:
+            self._states[user_id] = new_state
+
+    def _ready(self, user_id):
+        """Can this popped queue entry still be paired?"""
+        if self.is_local(user_id):
+            return self.state(user_id) == QUEUED
+        return True
+
+    # ===== SEARCH =====
+
+    def begin_search(self, user_id):
+        """idle -> queued; False if the user is in (or leaving) a match"""
+        with self.locks.hold(user_id):
+            state = self.state(user_id)
+            if state in (MATCHED, ENDING):
+                return False
+            if state == IDLE:
+                self._move(user_id, QUEUED)
+            return True
+
+    def pair(self, entry, is_available=None):
+        """Find and claim a partner for a queued user
+
+        Returns (partner_entry, room_id) once both users are matched, or
+        None when the user is left waiting (or stopped searching meanwhile).
+        """
+        user_id = entry.user_id
+        entry.recent = entry.recent | self.recent.of(user_id)
+
+        def available(partner):
+            # Stopped searching (or matched) meanwhile: drop from the queue
+            if not self._ready(partner.user_id):
+                return None
+            return True if is_available is None else is_available(partner)
+
+        for attempt in range(self.MAX_CLAIM_ATTEMPTS):
+            partner = self.store.match_or_enqueue(entry, available)
+
+            if partner is None:
+                with self.locks.hold(user_id):
+                    if self.state(user_id) != QUEUED:
+                        # Cancelled while we were enqueueing
+                        self.store.cancel(user_id)
+                return None
+
+            other_user_id = partner.user_id
+            # Room ids end in a generation number, so every pairing is unique
+            generation = self.store.next_generation()
+            room_id = f"match_{min(user_id, other_user_id)}_{max(user_id, other_user_id)}_{generation}"
+
+            with self.locks.hold(user_id, other_user_id):
+                if self.state(user_id) != QUEUED:
+                    # We stopped searching; hand the partner back
+                    if self._ready(other_user_id):
+                        self.store.requeue(partner)
+                    return None
+                if not self._ready(other_user_id):
+                    # Partner cancelled after being popped
+                    continue
+                if self.store.claim_pair(user_id, other_user_id, room_id):
+                    self.recent.remember(user_id, other_user_id)
+                    self._move(user_id, MATCHED)
+                    if self.is_local(other_user_id):
+                        self._move(other_user_id, MATCHED)
+                    return partner, room_id
+
+                # Another worker paired one of us first
+                if not self.store.get_room(other_user_id):
+                    self.store.requeue(partner)
+                if self.store.get_room(user_id):
+                    self._move(user_id, MATCHED)
+                    return None
+
+        logger.warning(f"Could not claim a partner for {user_id}")
+        self.store.requeue(entry)
+        return None
+
+    def cancel(self, user_id):
+        """queued -> idle, returns True if the user was waiting"""
+        with self.locks.hold(user_id):
+            if self.state(user_id) == QUEUED:
+                self._move(user_id, IDLE)
+            return self.store.cancel(user_id)
+
+    # ===== ENDING =====
+
+    def end_match(self, user_id):
+        """matched -> ending for user_id, partner straight back to idle
+
+        Returns (room_id, other_user_id), or None if not in a match. Call
+        finish_ending() once the match row is closed.
+        """
+        while True:
+            room_id = self.store.get_room(user_id)
+            if not room_id:
+                return None
+            members = self.store.room_members(room_id) or (user_id,)
+            with self.locks.hold(*members):
+                if self.store.get_room(user_id) != room_id:
+                    continue   # changed before we got the locks
+                self.store.release_room(room_id)
+                other_user_id = None
+                for member in members:
+                    if member == user_id:
+                        if self.state(user_id) == MATCHED:
+                            self._move(user_id, ENDING)
+                        elif self.state(user_id) == QUEUED:
+                            # Paired by another worker while we waited
+                            self._move(user_id, IDLE)
+                    else:
+                        other_user_id = member
+                        if self.state(member) == MATCHED:
+                            self._move(member, ENDING)
+                            self._move(member, IDLE)
+                return room_id, other_user_id
+
+    def finish_ending(self, user_id, requeue=False):
+        """ending -> idle (or queued, to search again)"""
+        with self.locks.hold(user_id):
+            if self.state(user_id) == ENDING:
+                self._move(user_id, QUEUED if requeue else IDLE)
+            elif requeue and self.state(user_id) == IDLE:
+                self._move(user_id, QUEUED)
+            return self.state(user_id)
+
+    def abort_match(self, room_id, user_id, partner):
+        """Undo a claimed pairing (e.g. the DB insert failed)
+
+        user_id goes back to idle, the partner to the front of the queue.
+        """
+        with self.locks.hold(user_id, partner.user_id):
+            self.store.release_room(room_id)
+            if self.state(user_id) == MATCHED:
+                self._move(user_id, ENDING)
+                self._move(user_id, IDLE)
+            if self.state(partner.user_id) == MATCHED:
+                self._move(partner.user_id, ENDING)
+                self._move(partner.user_id, QUEUED)
+                self.store.requeue(partner)
+            elif not self.is_local(partner.user_id):
+                self.store.requeue(partner)
+
+    def forget(self, user_id):
+        """Drop a disconnected user's state (after cancel / end_match)
+
+        A user queued or matched again meanwhile (a new session) is kept;
+        a matched state whose room the store no longer has is dropped.
+        """
+        with self.locks.hold(user_id):
+            state = self.state(user_id)
+            if state == QUEUED or (state == MATCHED and self.store.get_room(user_id)):
+                return False
+            self._states.pop(user_id, None)
+            self.store.cancel(user_id)
+            return True
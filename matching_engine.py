@@ -3,11 +3,730 @@ MATCHING ENGINE - Simple, Direct, Working
 """
 
 from models.models import db, ActiveMatch, MatchQueue
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+import itertools
 import logging
+import queue
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:  # scoring is optional, pairing falls back to plain FIFO
+    np = None
 
 logger = logging.getLogger(__name__)
 
+# Preference defaults (same as the MatchQueue columns)
+ANY_GENDER = 'any'
+DEFAULT_MIN_AGE = 13
+DEFAULT_MAX_AGE = 100
+
+DEFAULT_REPUTATION = 5.0
+
+# Width of the age bands used to bucket waiting users
+AGE_BAND_YEARS = 5
+
+# Recent partners are skipped unless one side has waited at least this long
+REMATCH_AFTER_SECONDS = 30
+
+
+def _popcount(values):
+    """Number of set bits in each element of a uint64 array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+if np is not None:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def parse_countries(value):
+    """Normalize preferred_countries (list or comma-separated) to a set"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    countries = {str(c).strip().lower() for c in value if str(c).strip()}
+    return countries or None
+
+
+def parse_search_prefs(data):
+    """The usable search preferences sent by a client (invalid fields dropped)
+
+    Never raises: whatever QueueEntry gets from here it can build from.
+    """
+    prefs = {}
+    if not isinstance(data, dict):
+        return prefs
+    gender = data.get('preferred_gender')
+    if isinstance(gender, str) and gender.strip():
+        prefs['preferred_gender'] = gender.strip().lower()
+    for key in ('min_age', 'max_age'):
+        value = data.get(key)
+        if isinstance(value, bool):
+            continue
+        try:
+            prefs[key] = int(value)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    countries = data.get('preferred_countries')
+    if isinstance(countries, str) or (isinstance(countries, (list, tuple)) and
+                                      all(isinstance(c, str) for c in countries)):
+        prefs['preferred_countries'] = countries
+    return prefs
+
+
+class QueueEntry:
+    """A user waiting in the matchmaking queue, with their preferences"""
+
+    __slots__ = (
+        'user_id', 'socket_id', 'enqueued_at', 'seq',
+        'gender', 'age', 'country', 'interests', 'reputation',
+        'preferred_gender', 'min_age', 'max_age', 'preferred_countries',
+        'recent', 'blocked',
+    )
+
+    def __init__(self, user_id, socket_id, gender=None, age=None, country=None,
+                 interests=None, reputation=None, preferred_gender=ANY_GENDER, min_age=DEFAULT_MIN_AGE,
+                 max_age=DEFAULT_MAX_AGE, preferred_countries=None, recent=None, blocked=None):
+        self.user_id = user_id
+        self.socket_id = socket_id
+        self.enqueued_at = time.time()
+        self.seq = 0
+
+        self.gender = (gender or '').strip().lower() or None
+        self.age = age
+        self.country = (country or '').strip().lower() or None
+        self.interests = {i.lower() for i in interests or () if i}
+        self.reputation = DEFAULT_REPUTATION if reputation is None else float(reputation)
+
+        self.preferred_gender = (preferred_gender or ANY_GENDER).strip().lower()
+        self.min_age = DEFAULT_MIN_AGE if min_age is None else int(min_age)
+        self.max_age = DEFAULT_MAX_AGE if max_age is None else int(max_age)
+        self.preferred_countries = parse_countries(preferred_countries)
+
+        # User ids met recently (see RecentPartners), not offered again for a while
+        self.recent = frozenset(recent or ())
+        # User ids blocked by or blocking this user, never offered at all
+        self.blocked = frozenset(blocked or ())
+
+    @classmethod
+    def for_user(cls, user, socket_id, prefs=None, blocked=None):
+        """Build an entry from a User and the search preferences sent by the client"""
+        prefs = prefs or {}
+        return cls(
+            user.id,
+            socket_id,
+            gender=user.gender,
+            age=user.age,
+            country=user.country,
+            interests=user.get_interests_list(),
+            reputation=user.reputation_score,
+            preferred_gender=prefs.get('preferred_gender'),
+            min_age=prefs.get('min_age'),
+            max_age=prefs.get('max_age'),
+            preferred_countries=prefs.get('preferred_countries'),
+            blocked=blocked,
+        )
+
+    @property
+    def bucket(self):
+        """(gender, age band, country) key of the bucket this user waits in"""
+        band = self.age // AGE_BAND_YEARS if self.age is not None else None
+        return (self.gender, band, self.country)
+
+    def accepts_bucket(self, key):
+        """Could anyone in bucket `key` satisfy this user's preferences?"""
+        gender, band, country = key
+        if self.preferred_gender != ANY_GENDER and gender != self.preferred_gender:
+            return False
+        if band is None:
+            if not self._any_age():
+                return False
+        elif (band + 1) * AGE_BAND_YEARS <= self.min_age or band * AGE_BAND_YEARS > self.max_age:
+            return False
+        if self.preferred_countries is not None and country not in self.preferred_countries:
+            return False
+        return True
+
+    def accepts(self, other):
+        """Does `other` satisfy this user's preferences exactly?"""
+        if self.preferred_gender != ANY_GENDER and other.gender != self.preferred_gender:
+            return False
+        if other.age is None:
+            if not self._any_age():
+                return False
+        elif not self.min_age <= other.age <= self.max_age:
+            return False
+        if self.preferred_countries is not None and other.country not in self.preferred_countries:
+            return False
+        return True
+
+    def excludes(self, other):
+        """Has either of the two blocked the other?"""
+        return other.user_id in self.blocked or self.user_id in other.blocked
+
+    def recently_met(self, other, now=None):
+        """Did these two just meet, with neither waiting long enough to rematch?"""
+        if other.user_id not in self.recent and self.user_id not in other.recent:
+            return False
+        now = time.time() if now is None else now
+        return now - min(self.enqueued_at, other.enqueued_at) < REMATCH_AFTER_SECONDS
+
+    def _any_age(self):
+        return self.min_age <= DEFAULT_MIN_AGE and self.max_age >= DEFAULT_MAX_AGE
+
+    def __repr__(self):
+        return f"<QueueEntry {self.user_id}>"
+
+
+class RecentPartners:
+    """Bounded memory of who each user was last paired with
+
+    A ring buffer of the last `size` partners per user; the least recently
+    active users are forgotten beyond `max_users`.
+    """
+
+    def __init__(self, size=5, max_users=100000):
+        self.size = size
+        self.max_users = max_users
+        self._partners = OrderedDict()   # {user_id: deque of partner ids}
+        self._lock = threading.Lock()
+
+    def remember(self, user1_id, user2_id):
+        with self._lock:
+            self._add(user1_id, user2_id)
+            self._add(user2_id, user1_id)
+
+    def of(self, user_id):
+        with self._lock:
+            return frozenset(self._partners.get(user_id, ()))
+
+    def _add(self, user_id, partner_id):
+        ring = self._partners.pop(user_id, None)
+        if ring is None:
+            ring = deque(maxlen=self.size)
+        ring.append(partner_id)
+        self._partners[user_id] = ring
+        if len(self._partners) > self.max_users:
+            self._partners.popitem(last=False)
+
+
+class InterestVocabulary:
+    """Maps interest names to bits of a 64-bit mask
+
+    The first 64 distinct interests get a bit each; rarer ones seen after
+    that share bits by hash, which only blurs their contribution a little.
+    """
+
+    BITS = 64
+
+    def __init__(self):
+        self._bits = {}
+
+    def mask(self, interests):
+        mask = 0
+        for name in interests or ():
+            bit = self._bits.get(name)
+            if bit is None:
+                if len(self._bits) < self.BITS:
+                    bit = self._bits[name] = len(self._bits)
+                else:
+                    bit = hash(name) % self.BITS
+            mask |= 1 << bit
+        return mask
+
+
+class CandidateScorer:
+    """Vectorized scoring of the whole waiting pool against one searcher
+
+    Each waiting user owns a slot in a set of NumPy arrays (interest
+    bitset, age, reputation, wait start, plus coded preferences). A search
+    builds a compatibility mask and a score for every slot in one pass and
+    picks the best candidate, except that anyone who has waited longer
+    than MAX_WAIT_SECONDS is served first, oldest first.
+    """
+
+    INTEREST_WEIGHT = 2.0      # per shared interest
+    AGE_GAP_WEIGHT = 0.1       # per year of age difference
+    UNKNOWN_AGE_GAP = 10       # years assumed when an age is missing
+    REPUTATION_WEIGHT = 0.5    # per reputation point (1.0 - 5.0)
+    WAIT_WEIGHT = 0.05         # per second already spent waiting
+    MAX_WAIT_SECONDS = 30
+    OVERDUE_RANK = 1e9         # added to an overdue waiter's score
+
+    ANY = -1                   # preference code for "no preference"
+    UNKNOWN = -2               # attribute code for "not set on profile"
+
+    def __init__(self, capacity=1024):
+        self.vocabulary = InterestVocabulary()
+        self._codes = {}
+        self._slots = {}
+        self._free = []
+        self._size = 0
+        self._allocate(capacity)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, entry):
+        if entry.user_id in self._slots:
+            self.remove(entry.user_id)
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self._size == len(self.user_ids):
+                self._grow()
+            slot = self._size
+            self._size += 1
+
+        self._slots[entry.user_id] = slot
+        self.user_ids[slot] = entry.user_id
+        self.interests[slot] = self.vocabulary.mask(entry.interests)
+        self.age[slot] = entry.age if entry.age is not None else -1
+        self.reputation[slot] = entry.reputation
+        self.enqueued_at[slot] = entry.enqueued_at
+        self.gender[slot] = self._code(entry.gender)
+        self.country[slot] = self._code(entry.country)
+        self.pref_gender[slot] = (
+            self.ANY if entry.preferred_gender == ANY_GENDER
+            else self._code(entry.preferred_gender)
+        )
+        self.min_age[slot] = entry.min_age
+        self.max_age[slot] = entry.max_age
+        self.any_age[slot] = entry._any_age()
+        self.any_country[slot] = entry.preferred_countries is None
+        self.active[slot] = True
+
+    def remove(self, user_id):
+        slot = self._slots.pop(user_id, None)
+        if slot is not None:
+            self.active[slot] = False
+            self._free.append(slot)
+
+    def best(self, entry, entries):
+        """Return the user_id of the best partner for entry, or None
+
+        entries maps user_id -> QueueEntry; it is only consulted for the
+        country lists, recent partners and blocks of the few top-ranked
+        candidates.
+        """
+        n = self._size
+        if not n:
+            return None
+
+        mask = self.active[:n].copy()
+        own = self._slots.get(entry.user_id)
+        if own is not None:
+            mask[own] = False
+        # Blocked users, in either direction
+        for user_id in entry.blocked:
+            slot = self._slots.get(user_id)
+            if slot is not None:
+                mask[slot] = False
+
+        age = self.age[:n]
+        known_age = age >= 0
+
+        # Searcher's preferences -> candidate attributes
+        if entry.preferred_gender != ANY_GENDER:
+            mask &= self.gender[:n] == self._codes.get(entry.preferred_gender, self.UNKNOWN - 1)  # unseen: nobody
+        in_range = known_age & (age >= entry.min_age) & (age <= entry.max_age)
+        mask &= (in_range | ~known_age) if entry._any_age() else in_range
+        if entry.preferred_countries is not None:
+            wanted = [self._codes[c] for c in entry.preferred_countries if c in self._codes]
+            mask &= np.isin(self.country[:n], wanted)
+
+        # Candidates' preferences -> searcher attributes
+        gender = self._codes.get(entry.gender, self.UNKNOWN)
+        pref_gender = self.pref_gender[:n]
+        mask &= (pref_gender == self.ANY) | (pref_gender == gender)
+        if entry.age is None:
+            mask &= self.any_age[:n]
+        else:
+            mask &= (self.min_age[:n] <= entry.age) & (self.max_age[:n] >= entry.age)
+
+        if not mask.any():
+            return None
+
+        waited = time.time() - self.enqueued_at[:n]
+        shared = _popcount(self.interests[:n] & np.uint64(self.vocabulary.mask(entry.interests)))
+        if entry.age is None:
+            gap = np.full(n, self.UNKNOWN_AGE_GAP, dtype=np.float32)
+        else:
+            gap = np.where(known_age, np.abs(age - entry.age), self.UNKNOWN_AGE_GAP)
+        score = (
+            self.INTEREST_WEIGHT * shared
+            - self.AGE_GAP_WEIGHT * gap
+            + self.REPUTATION_WEIGHT * self.reputation[:n]
+            + self.WAIT_WEIGHT * waited
+        )
+        # Wait cap: overdue waiters rank above everyone else, longest first,
+        # so when none of them passes the checks below the best-scored
+        # candidate is still found
+        score = np.where(waited >= self.MAX_WAIT_SECONDS, self.OVERDUE_RANK + waited, score)
+        score = np.where(mask, score, -np.inf)
+
+        # Country lists and recent partners are not vectorized; check the
+        # top candidates in order
+        now = time.time()
+        while True:
+            slot = int(np.argmax(score))
+            if score[slot] == -np.inf:
+                return None
+            user_id = int(self.user_ids[slot])
+            candidate = entries[user_id]
+            if (self.any_country[slot] or candidate.accepts(entry)) and \
+                    not entry.excludes(candidate) and not entry.recently_met(candidate, now):
+                return user_id
+            score[slot] = -np.inf
+
+    # ===== INTERNALS =====
+
+    def _code(self, value):
+        if value is None:
+            return self.UNKNOWN
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._codes)
+        return code
+
+    def _allocate(self, capacity):
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.interests = np.zeros(capacity, dtype=np.uint64)
+        self.age = np.full(capacity, -1, dtype=np.int16)
+        self.reputation = np.zeros(capacity, dtype=np.float32)
+        self.enqueued_at = np.zeros(capacity, dtype=np.float64)
+        self.gender = np.zeros(capacity, dtype=np.int32)
+        self.country = np.zeros(capacity, dtype=np.int32)
+        self.pref_gender = np.zeros(capacity, dtype=np.int32)
+        self.min_age = np.zeros(capacity, dtype=np.int16)
+        self.max_age = np.zeros(capacity, dtype=np.int16)
+        self.any_age = np.zeros(capacity, dtype=bool)
+        self.any_country = np.zeros(capacity, dtype=bool)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        old = {name: getattr(self, name) for name in self._ARRAYS}
+        self._allocate(2 * len(self.user_ids))
+        for name, values in old.items():
+            getattr(self, name)[:len(values)] = values
+
+    _ARRAYS = (
+        'user_ids', 'interests', 'age', 'reputation', 'enqueued_at',
+        'gender', 'country', 'pref_gender', 'min_age', 'max_age',
+        'any_age', 'any_country', 'active',
+    )
+
+
+class MatchmakingQueue:
+    """In-process pool of waiting users - the source of truth for pairing
+
+    Waiting users are kept in buckets keyed by (gender, age band, country),
+    each bucket an insertion-ordered dict, plus a user_id -> entry index.
+    Enqueue and cancel are O(1); a search only looks at the buckets the
+    searcher's preferences allow and takes the longest-waiting user there
+    whose own preferences accept the searcher, so the cost depends on the
+    number of buckets rather than the length of the queue.
+
+    When NumPy is available the partner is instead chosen by a
+    CandidateScorer (shared interests, age gap, reputation, wait time).
+    """
+
+    def __init__(self, use_scoring=True):
+        self._scorer = CandidateScorer() if use_scoring and np is not None else None
+        self._buckets = {}
+        self._index = {}
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, user_id):
+        return user_id in self._index
+
+    def enqueue(self, entry):
+        """Add a user to the back of the queue (replacing any old entry)"""
+        with self._lock:
+            self._enqueue(entry)
+            return entry
+
+    def requeue(self, entry):
+        """Put a popped entry back at the front of its bucket"""
+        with self._lock:
+            self._requeue(entry)
+
+    def cancel(self, user_id):
+        """Remove a user from the queue, returns the entry or None"""
+        with self._lock:
+            return self._cancel(user_id)
+
+    def pop_partner(self, entry):
+        """Pop the longest-waiting compatible partner for entry"""
+        with self._lock:
+            return self._pop_partner(entry)
+
+    def match_or_enqueue(self, entry, is_available=None):
+        """Pair entry with the longest-waiting compatible user, or queue it
+
+        is_available(partner) vets each candidate without giving up the
+        search: True takes them, False skips them for now (requeued at the
+        front afterwards, e.g. between two sockets), None drops them.
+        Returns the partner's entry, or None if entry is now waiting.
+        """
+        with self._lock:
+            self._cancel(entry.user_id)
+            skipped = []
+            try:
+                while True:
+                    partner = self._pop_partner(entry)
+                    if partner is None:
+                        self._enqueue(entry)
+                        return None
+                    available = True if is_available is None else is_available(partner)
+                    if available:
+                        return partner
+                    if available is False:
+                        skipped.append(partner)
+            finally:
+                for partner in reversed(skipped):
+                    self._requeue(partner)
+
+    # ===== INTERNALS (lock held) =====
+
+    def _enqueue(self, entry):
+        self._cancel(entry.user_id)
+        entry.seq = next(self._seq)
+        self._buckets.setdefault(entry.bucket, {})[entry.user_id] = entry
+        self._index[entry.user_id] = entry
+        if self._scorer is not None:
+            self._scorer.add(entry)
+
+    def _requeue(self, entry):
+        if entry.user_id in self._index:
+            return
+        key = entry.bucket
+        bucket = self._buckets.get(key, {})
+        self._buckets[key] = {entry.user_id: entry, **bucket}
+        self._index[entry.user_id] = entry
+        if self._scorer is not None:
+            self._scorer.add(entry)
+
+    def _cancel(self, user_id):
+        entry = self._index.pop(user_id, None)
+        if entry is not None:
+            self._remove_from_bucket(entry)
+        return entry
+
+    def _remove_from_bucket(self, entry):
+        key = entry.bucket
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.pop(entry.user_id, None)
+            if not bucket:
+                del self._buckets[key]
+        if self._scorer is not None:
+            self._scorer.remove(entry.user_id)
+
+    def _pop_partner(self, entry):
+        if self._scorer is not None:
+            partner = self._index.get(self._scorer.best(entry, self._index))
+        else:
+            partner = self._oldest_partner(entry)
+
+        if partner is not None:
+            self._index.pop(partner.user_id, None)
+            self._remove_from_bucket(partner)
+        return partner
+
+    def _oldest_partner(self, entry):
+        partner = None
+        for key, bucket in self._buckets.items():
+            if not entry.accepts_bucket(key):
+                continue
+            # Buckets are in arrival order: the first mutual fit is the oldest
+            for candidate in bucket.values():
+                if partner is not None and candidate.seq > partner.seq:
+                    break
+                if candidate.user_id == entry.user_id:
+                    continue
+                if entry.accepts(candidate) and candidate.accepts(entry) and \
+                        not entry.excludes(candidate) and not entry.recently_met(candidate):
+                    partner = candidate
+                    break
+        return partner
+
+
+class MatchQueueAudit:
+    """Optional asynchronous audit trail of the queue in the MatchQueue table
+
+    Handlers only put events on an in-memory queue; a background thread
+    writes them in batches so no socket event waits on the database.
+    """
+
+    BATCH_SIZE = 200
+
+    def __init__(self):
+        self.enabled = None  # resolved from MATCH_QUEUE_AUDIT on first use
+        self._events = queue.Queue()
+        self._thread = None
+        self._app = None
+        self._lock = threading.Lock()
+
+    def record(self, status, user_id, entry=None):
+        """Queue a 'waiting', 'matched', 'cancelled' or 'expired' audit event"""
+        if self.enabled is None:
+            self._start()
+        if not self.enabled:
+            return
+        self._events.put((status, user_id, entry, datetime.utcnow()))
+
+    def _start(self):
+        with self._lock:
+            if self.enabled is not None:
+                return
+            from flask import current_app
+            self._app = current_app._get_current_object()
+            if self._app.config.get('MATCH_QUEUE_AUDIT'):
+                self._thread = threading.Thread(
+                    target=self._run, name="match-queue-audit", daemon=True
+                )
+                self._thread.start()
+                self.enabled = True
+            else:
+                self.enabled = False
+
+    def _run(self):
+        while True:
+            batch = [self._events.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._events.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._app.app_context():
+                    self._write(batch)
+            except Exception as e:
+                logger.error(f"Queue audit write failed: {e}")
+
+    def _write(self, batch):
+        try:
+            for status, user_id, entry, at in batch:
+                if status == 'waiting':
+                    countries = entry.preferred_countries
+                    db.session.add(MatchQueue(
+                        user_id=user_id,
+                        socket_id=entry.socket_id,
+                        status='waiting',
+                        preferred_gender=entry.preferred_gender,
+                        min_age=entry.min_age,
+                        max_age=entry.max_age,
+                        preferred_countries=','.join(sorted(countries)) if countries else None,
+                        created_at=at
+                    ))
+                else:
+                    MatchQueue.query.filter_by(
+                        user_id=user_id, status='waiting'
+                    ).update({'status': status}, synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+class MatchReaper:
+    """Set-based cleanup of match rows nothing in memory backs any more
+
+    reap_orphans() ends 'active' ActiveMatch rows whose room is gone from
+    the state store (e.g. the worker holding it crashed), one UPDATE per
+    batch of ids. compact() expires timed-out queue audit rows and purges
+    old audit and match history with single UPDATE / DELETE statements.
+    Both expect an app context.
+    """
+
+    BATCH_SIZE = 500
+    # Rows younger than this may belong to a match still being created
+    ORPHAN_GRACE = timedelta(seconds=60)
+
+    def __init__(self, store, queue_retention=timedelta(days=1),
+                 history_retention=timedelta(days=30)):
+        self.store = store
+        self.queue_retention = queue_retention
+        self.history_retention = history_retention
+
+    def reap_orphans(self):
+        """End active matches whose room no longer exists, returns the count"""
+        now = datetime.utcnow()
+        reaped = 0
+        last_id = 0
+        try:
+            while True:
+                rows = db.session.query(ActiveMatch.id, ActiveMatch.room_id).filter(
+                    ActiveMatch.status == 'active',
+                    ActiveMatch.started_at < now - self.ORPHAN_GRACE,
+                    ActiveMatch.id > last_id,
+                ).order_by(ActiveMatch.id).limit(self.BATCH_SIZE).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                live = self.store.live_rooms(room_id for _, room_id in rows)
+                orphaned = [row_id for row_id, room_id in rows if room_id not in live]
+                if orphaned:
+                    reaped += ActiveMatch.query.filter(
+                        ActiveMatch.id.in_(orphaned),
+                        ActiveMatch.status == 'active',
+                    ).update({'status': 'ended', 'ended_at': now}, synchronize_session=False)
+                    db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+        if reaped:
+            logger.info(f"🧹 Reaped {reaped} orphaned matches")
+        return reaped
+
+    def compact(self):
+        """Expire and purge old queue / match rows, returns the row counts"""
+        now = datetime.utcnow()
+        try:
+            expired = MatchQueue.query.filter(
+                MatchQueue.status == 'waiting',
+                MatchQueue.timeout_at < now,
+            ).update({'status': 'expired'}, synchronize_session=False)
+
+            purged = MatchQueue.query.filter(
+                MatchQueue.status != 'waiting',
+                MatchQueue.created_at < now - self.queue_retention,
+            ).delete(synchronize_session=False)
+
+            history = ActiveMatch.query.filter(
+                ActiveMatch.status == 'ended',
+                ActiveMatch.ended_at < now - self.history_retention,
+            ).delete(synchronize_session=False)
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+        counts = {'expired': expired, 'purged': purged, 'history': history}
+        if any(counts.values()):
+            logger.info(f"🧹 Compacted match tables: {counts}")
+        return counts
+
+
 class StrangerMatcher:
     """Simple stranger matching"""
     
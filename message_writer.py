@@ -0,0 +1,641 @@
+"""
+MESSAGE WRITER - Group-commit ingestion for chat messages
+
+send_message no longer waits for the database. A message gets its id
+(from the state store, so ids stay unique and increasing across workers)
+and its timestamp up front, is appended to a local journal, and can be
+emitted to the room straight away. A background writer then persists
+everything submitted within `batch_window` seconds (or `max_batch`
+messages) with one multi-row INSERT, updates the conversation summaries
+for the whole batch and commits once.
+
+The per-conversation sequence number is assigned together with the id
+under the conversation's stripe lock, so within a worker seq order, id
+order and queue order agree whatever the async mode. Counters are seeded
+in bulk from the stored maxima when the writer starts.
+
+Durability: the journal (an append-only JSON-lines file) holds every
+accepted message until its batch is committed. On start the writer
+replays whatever a crashed process left in it, skipping ids the database
+already has. Each line is flushed to the OS before the message is
+acknowledged; with fsync=True it is also forced to disk. Workers sharing
+a journal path each claim their own slot of it (see MessageJournal).
+
+A batch that fails while the database is reachable is split until the
+messages that cannot be stored (bad values, unknown users, a schema not
+yet migrated) are isolated; those are moved to the dead-letter file
+`<journal path>.dead` (or logged when there is no journal) and count as
+handled, so one bad row never holds up the rest. Only when the database
+itself is failing is the batch retried, with backoff. Replay sets bad
+records aside the same way.
+
+Hooks registered with on_commit(callback) run after each commit with the
+batch and its {(receiver_id, sender_id): unread} counts (used for the
+chat_list_update deltas).
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): one process per journal path
+    fcntl = None
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from async_runtime import patched_runtime
+from batching import BatchFlusher
+from conversations import SYNC_MAX_MESSAGES, conversation_id, message_payload, record_messages, sync_messages
+from match_state import StripedLocks
+from models.models import db, Message
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    'id', 'sender_id', 'receiver_id', 'conversation', 'seq',
+    'text', 'image', 'document', 'is_read', 'created_at',
+)
+
+
+class MessageJournal:
+    """Append-only segment files of accepted messages not yet committed
+
+    `path` is a prefix shared by all workers: each process claims the
+    first free slot N (an flock on `path.N.lock`, held while it runs) and
+    writes its segments to `path.N.000001`, `path.N.000002`, ... The
+    writer starts a new segment each time it takes a batch, and a segment
+    is deleted as soon as every message in it is committed, so the
+    journal only ever holds the backlog. Slots whose process is gone are
+    adopted and replayed by the next process to start.
+
+    `lock` guards the files and must be held across append() and queueing
+    the message, so journal order is queue order (committed() counts).
+    With fsync on, append() only writes; sync(position) then forces the
+    file to disk outside the lock, and one fsync covers every line
+    appended before it, so concurrent submitters share it.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.slot, self._slot_lock = self._claim()
+        self._segments = deque()   # [[segment path, messages not yet committed]], oldest first
+        self._file = None          # open segment (the last one), if any
+        self._adopted = []         # locks of dead processes' slots, until replayed
+        self._number = max(self._segment_numbers(self.slot), default=0)
+        self.lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._appended = 0         # lines written so far
+        self._synced = 0           # lines known to be on disk
+        self.fsyncs = 0
+
+    def append(self, message, tracked=True):
+        """Journal a message (flushed to the OS), returns its position for sync()
+
+        Untracked records are not counted by committed().
+        """
+        with self.lock:
+            if self._file is None:
+                self._number += 1
+                segment = f"{self.path}.{self.slot}.{self._number:06d}"
+                self._file = open(segment, 'a', encoding='utf-8')
+                self._segments.append([segment, 0])
+            line = dict(message, created_at=message['created_at'].isoformat())
+            self._file.write(json.dumps(line, separators=(',', ':')) + '\n')
+            self._file.flush()
+            if tracked:
+                self._segments[-1][1] += 1
+            self._appended += 1
+            return self._appended
+
+    def sync(self, position):
+        """With fsync on, return once the line at `position` is on disk"""
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            with self.lock:
+                if self._synced >= position:
+                    return   # an fsync that started after it was appended covered it
+                target = self._appended
+                fd = os.dup(self._file.fileno())
+            try:
+                _fsync(fd)
+                self.fsyncs += 1
+            finally:
+                os.close(fd)
+            with self.lock:
+                self._synced = max(self._synced, target)
+
+    def rotate(self):
+        """Close the open segment (if it holds anything); the next append starts another"""
+        with self.lock:
+            if self._file is not None and self._segments[-1][1]:
+                if self.fsync and self._synced < self._appended:
+                    # Lines not synced yet would be out of sync()'s reach once closed
+                    _fsync(self._file.fileno())
+                    self.fsyncs += 1
+                    self._synced = self._appended
+                self._file.close()
+                self._file = None
+
+    def committed(self, count):
+        """The oldest `count` journaled messages are committed: drop finished segments"""
+        with self.lock:
+            while self._segments:
+                segment = self._segments[0]
+                done = min(count, segment[1])
+                segment[1] -= done
+                count -= done
+                if segment[1] or (self._file is not None and len(self._segments) == 1):
+                    break
+                self._segments.popleft()
+                _remove(segment[0])
+
+    # ===== REPLAY =====
+
+    def leftovers(self):
+        """Segment files left by a previous process in this slot or a dead one"""
+        files = self._segment_files(self.slot)
+        if os.path.exists(self.path):
+            files.insert(0, self.path)   # single-file journal of older versions
+        for slot in self._slots():
+            if slot == self.slot:
+                continue
+            lock = _try_lock(f"{self.path}.{slot}.lock")
+            if lock is not None:
+                self._adopted.append(lock)
+                files.extend(self._segment_files(slot))
+        return files
+
+    def records(self, files):
+        """Every complete record in the files, in order (torn lines skipped)"""
+        for name in files:
+            with open(name, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        message = json.loads(line)
+                        message['created_at'] = datetime.fromisoformat(message['created_at'])
+                    except (ValueError, TypeError, KeyError):
+                        logger.warning(f"Skipping torn journal line in {name}")
+                        continue
+                    yield message
+
+    def dead_letter(self, message, error):
+        """Set aside a message that can never be stored, with the reason"""
+        line = dict(message, error=str(error))
+        with open(f"{self.path}.dead", 'a', encoding='utf-8') as f:
+            f.write(json.dumps(line, default=_json_value, separators=(',', ':')) + '\n')
+
+    def discard(self, files):
+        """Delete replayed files and release the slots adopted for them"""
+        for name in files:
+            _remove(name)
+        for lock in self._adopted:
+            lock.close()
+        self._adopted = []
+
+    # ===== SLOTS =====
+
+    def _claim(self):
+        for slot in itertools.count():
+            lock = _try_lock(f"{self.path}.{slot}.lock")
+            if lock is not None:
+                return slot, lock
+
+    def _slots(self):
+        prefix = os.path.basename(self.path) + '.'
+        slots = set()
+        for name in os.listdir(os.path.dirname(self.path) or '.'):
+            parts = name[len(prefix):].split('.') if name.startswith(prefix) else ()
+            if len(parts) == 2 and parts[0].isdigit():
+                slots.add(int(parts[0]))
+        return sorted(slots)
+
+    def _segment_numbers(self, slot):
+        prefix = f"{os.path.basename(self.path)}.{slot}."
+        return [
+            int(name[len(prefix):]) for name in os.listdir(os.path.dirname(self.path) or '.')
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        ]
+
+    def _segment_files(self, slot):
+        return [f"{self.path}.{slot}.{number:06d}" for number in sorted(self._segment_numbers(slot))]
+
+
+def _try_lock(path):
+    """An open file holding an exclusive flock on path, or None if it is taken"""
+    lock = open(path, 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+    return lock
+
+
+def _fsync(fd):
+    """os.fsync, off the event loop in gevent / eventlet workers"""
+    runtime = patched_runtime()
+    if runtime == 'gevent':
+        import gevent
+        gevent.get_hub().threadpool.apply(os.fsync, (fd,))
+    elif runtime == 'eventlet':
+        from eventlet import tpool
+        tpool.execute(os.fsync, fd)
+    else:
+        os.fsync(fd)
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else repr(value)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class MessageWriter:
+    """Background batcher that persists submitted messages"""
+
+    RETRY_MAX_SECONDS = 5
+    REPLAY_CHUNK = 500         # journaled messages checked and inserted per query
+    SEED_CHUNK = 1000          # conversations seeded per state store call
+
+    def __init__(self, app, store, journal=None, batch_window=0.005, max_batch=500):
+        self.app = app
+        self.store = store
+        self.journal = journal
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        self._pending = deque()
+        self._inflight = []     # batch being written right now
+        self._uncommitted = 0   # submitted, not yet committed
+        self._unsaved = {}      # {id: message} of those, for wait_saved()
+        self._settled = 0       # handled messages not yet reported to the journal
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._committed = threading.Condition(self._lock)
+        self._hooks = []
+        self._locks = StripedLocks()
+        self._flusher = BatchFlusher(
+            "message-writer", self._cond, batch_window,
+            pending=lambda: self._pending,
+            full=lambda: len(self._pending) >= self.max_batch,
+            flush=self._write_next,
+        )
+        self._attempts = 0      # consecutive failed attempts at the current batch
+        self._start_lock = threading.Lock()
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.replayed = 0
+        self.dead_letters = 0
+
+    def on_commit(self, callback):
+        self._hooks.append(callback)
+        return callback
+
+    # ===== SUBMIT =====
+
+    def submit(self, sender_id, receiver_id, text=None, image=None, document=None):
+        """Accept a message: id, timestamp and journal entry now, INSERT later"""
+        self.start()
+        conversation = conversation_id(sender_id, receiver_id)
+        position = None
+        with self._locks.hold(conversation):
+            message = {
+                'id': self.store.next_message_id(),
+                'sender_id': sender_id,
+                'receiver_id': receiver_id,
+                'conversation': conversation,
+                'seq': self.store.next_sequence(conversation),
+                'text': text,
+                'image': image,
+                'document': document,
+                'is_read': False,
+                'created_at': datetime.utcnow(),
+            }
+            if self.journal is None:
+                self._enqueue(message)
+            else:
+                # Journal lock, not the writer's: other conversations keep queueing
+                with self.journal.lock:
+                    position = self.journal.append(message)
+                    self._enqueue(message)
+        if position is not None:
+            self.journal.sync(position)
+        return message
+
+    def _enqueue(self, message):
+        with self._cond:
+            self._pending.append(message)
+            self._unsaved[message['id']] = message
+            self._uncommitted += 1
+            self.submitted += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def pending(self, conversation, since_seq=0):
+        """Accepted but uncommitted messages of a conversation after since_seq"""
+        with self._lock:
+            return [
+                m for m in itertools.chain(self._inflight, self._pending)
+                if m['conversation'] == conversation and m['seq'] > since_seq
+            ]
+
+    def sync(self, conversation, since_seq, limit=SYNC_MAX_MESSAGES):
+        """Payloads of every message after since_seq, stored or still queued
+
+        Returns (messages in seq order, has_more).
+        """
+        stored, has_more = sync_messages(conversation, since_seq, limit)
+        messages = {m.seq: message_payload(m) for m in stored}
+        if not has_more:
+            for m in self.pending(conversation, since_seq):
+                messages.setdefault(m['seq'], message_payload(m))
+        ordered = [messages[seq] for seq in sorted(messages)]
+        return ordered[:limit], has_more or len(ordered) > limit
+
+    def flush(self, timeout=None):
+        """Wait until everything submitted so far is committed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._committed:
+            while self._uncommitted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._committed.wait(remaining)
+        return True
+
+    def unsaved(self, message_id):
+        """The message with this id if it was accepted here and is not committed yet"""
+        return self._unsaved.get(message_id)
+
+    def wait_saved(self, message_id, timeout=None):
+        """Wait until one message accepted here is committed (or set aside)
+
+        Unlike flush() this does not wait for messages submitted later, so
+        it returns promptly under steady traffic.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._committed:
+            while message_id in self._unsaved:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._committed.wait(remaining)
+        return True
+
+    def lag(self):
+        """Messages accepted but not yet committed"""
+        return self._uncommitted
+
+    # ===== STARTUP =====
+
+    def start(self):
+        """Replay the journal, seed ids and start the writer thread (once)"""
+        if self._flusher.started:
+            return
+        with self._start_lock:
+            if self._flusher.started:
+                return
+            with self.app.app_context():
+                self._replay()
+                max_id = db.session.execute(select(func.max(Message.id))).scalar() or 0
+                seeded = self._seed_sequences()
+                db.session.remove()
+            self.store.seed_message_ids(max_id)
+            self._flusher.start()
+            logger.info(f"✅ Message writer started (ids above {max_id}, {seeded} conversations seeded)")
+
+    def _seed_sequences(self):
+        """Raise every conversation's seq counter to its stored maximum"""
+        rows = db.session.execute(
+            select(Message.conversation, func.max(Message.seq))
+            .group_by(Message.conversation)
+            .execution_options(yield_per=self.SEED_CHUNK)
+        )
+        seeded = 0
+        for chunk in rows.partitions():
+            self.store.seed_sequences({conversation: seq or 0 for conversation, seq in chunk})
+            seeded += len(chunk)
+        return seeded
+
+    def _replay(self):
+        """Persist messages a previous process accepted but never committed"""
+        if self.journal is None:
+            return
+        files = self.journal.leftovers()
+        if not files:
+            return
+        replayed = stored = 0
+        chunk = []
+        for message in itertools.chain(self.journal.records(files), [None]):
+            if message is not None:
+                chunk.append(message)
+                if len(chunk) < self.REPLAY_CHUNK:
+                    continue
+            if chunk:
+                ids = [m.get('id') for m in chunk if isinstance(m.get('id'), int)]
+                existing = set(db.session.execute(select(Message.id).where(Message.id.in_(ids))).scalars())
+                missing = []
+                for m in chunk:
+                    if not isinstance(m.get('id'), int):
+                        self._dead_letter(m, "journal record has no message id")
+                    elif m['id'] not in existing:
+                        missing.append(m)
+                if missing:
+                    written, rejected = [], []
+                    self._write_isolating(missing, written, {}, rejected)
+                    for message, error in rejected:
+                        self._dead_letter(message, error)
+                    replayed += len(written)
+                stored += len(existing)
+                chunk = []
+        self.replayed += replayed
+        self.journal.discard(files)
+        logger.info(f"✅ Replayed {replayed} journaled messages ({stored} already stored)")
+
+    # ===== WRITER =====
+
+    def _write_next(self):
+        """Write the oldest max_batch pending messages (the flusher's flush)"""
+        with self.journal.lock if self.journal is not None else nullcontext():
+            with self._lock:
+                batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+                self._inflight = batch
+            if self.journal is not None:
+                self.journal.rotate()
+
+        written, unread, rejected = [], {}, []
+        failed = None
+        try:
+            with self.app.app_context():
+                try:
+                    self._write_isolating(batch, written, unread, rejected)
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            failed = e
+        for message, error in rejected:
+            self._dead_letter(message, error)
+        settled = len(written) + len(rejected)
+
+        report = 0
+        with self._committed:
+            if failed is not None:
+                # Database down: keep what got in, retry the rest first
+                done = {id(m) for m in written} | {id(m) for m, _ in rejected}
+                self._pending.extendleft(reversed([m for m in batch if id(m) not in done]))
+            self._inflight = []
+            self._uncommitted -= settled
+            for message in itertools.chain(written, (m for m, _ in rejected)):
+                self._unsaved.pop(message['id'], None)
+            self.written += len(written)
+            # Journal segments go in order, so report once the whole batch is done
+            self._settled += settled
+            if failed is None:
+                self.batches += 1
+                report, self._settled = self._settled, 0
+            self._committed.notify_all()
+        if report and self.journal is not None:
+            self.journal.committed(report)
+
+        if written:
+            for hook in self._hooks:
+                try:
+                    hook(written, unread)
+                except Exception as e:
+                    logger.error(f"Message commit hook failed: {e}")
+
+        if failed is not None:
+            self._attempts += 1
+            self.failures += 1
+            logger.error(f"Message batch of {len(batch)} failed (attempt {self._attempts}), "
+                         f"{len(batch) - settled} requeued: {failed}")
+            time.sleep(min(0.1 * 2 ** self._attempts, self.RETRY_MAX_SECONDS))
+        else:
+            self._attempts = 0
+
+    def _write_isolating(self, batch, written, unread, rejected):
+        """Commit a batch, splitting it while it fails and the database is up
+
+        Committed messages are added to `written` (their unread counts to
+        `unread`), messages that fail on their own to `rejected` as
+        (message, error). Raises when the database itself is failing.
+        """
+        try:
+            done, counts = self._write(batch)
+        except Exception as e:
+            if not self._database_ok():
+                raise
+            if len(batch) == 1:
+                rejected.append((batch[0], e))
+                return
+            middle = len(batch) // 2
+            self._write_isolating(batch[:middle], written, unread, rejected)
+            self._write_isolating(batch[middle:], written, unread, rejected)
+            return
+        written.extend(done)
+        unread.update(counts)
+
+    def _database_ok(self):
+        try:
+            db.session.execute(select(1))
+            return True
+        except Exception:
+            db.session.rollback()
+            return False
+
+    def _dead_letter(self, message, error):
+        error = getattr(error, 'orig', None) or error   # the driver's reason, without the SQL
+        self.dead_letters += 1
+        logger.error(f"Message {message.get('id')} can't be stored, set aside: {error}")
+        if self.journal is not None:
+            try:
+                self.journal.dead_letter(message, error)
+                return
+            except OSError as e:
+                logger.error(f"Dead-letter file write failed: {e}")
+        logger.error(f"Dead letter: {json.dumps(message, default=_json_value)}")
+
+    def _write(self, batch):
+        """Commit a batch, returns (messages written, unread counts)
+
+        Ids are only handed out here, but a row inserted some other way
+        can still take one; those messages get fresh ids (re-journaled
+        under the new id) and are written with the rest of the batch.
+        Clients see the new id on their next history load or sync.
+        """
+        try:
+            unread = self._persist(batch)
+            db.session.commit()
+            return batch, unread
+        except IntegrityError:
+            db.session.rollback()
+            ids = [m['id'] for m in batch]
+            taken = set(db.session.execute(select(Message.id).where(Message.id.in_(ids))).scalars())
+            if not taken:
+                raise
+            logger.warning(f"Renumbering {len(taken)} messages whose ids were taken outside the writer")
+            self.store.seed_message_ids(db.session.execute(select(func.max(Message.id))).scalar())
+            for message in batch:
+                if message['id'] in taken:
+                    old_id, message['id'] = message['id'], self.store.next_message_id()
+                    with self._lock:
+                        self._unsaved[message['id']] = self._unsaved.pop(old_id, message)
+                    if self.journal is not None:
+                        self.journal.sync(self.journal.append(message, tracked=False))
+            try:
+                unread = self._persist(batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return batch, unread
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _persist(self, batch):
+        """One multi-row INSERT plus the summary updates (caller commits)"""
+        db.session.execute(insert(Message).values([{f: m[f] for f in FIELDS} for m in batch]))
+        return record_messages(batch)
+
+
+# ===== GLOBAL INSTANCE =====
+
+_writer = None
+
+
+def init_message_writer(app, store, journal_path=None, fsync=False, batch_window=0.005, max_batch=500):
+    """Create the process-wide writer (started on the first message)"""
+    global _writer
+    journal = MessageJournal(journal_path, fsync=fsync) if journal_path else None
+    _writer = MessageWriter(app, store, journal, batch_window=batch_window, max_batch=max_batch)
+    logger.info(f"✅ Message writer ({batch_window * 1000:.0f} ms / {max_batch} rows, "
+                f"journal: {journal_path or 'off'})")
+    return _writer
+
+
+def get_message_writer():
+    return _writer
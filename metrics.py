@@ -0,0 +1,298 @@
+"""
+METRICS - Per-handler call counts, error counts and latency histograms
+
+Every Socket.IO handler (match, chat, friend events) and every HTTP view
+is wrapped by a timing decorator. Each thread records into its own
+buckets, with no lock on the hot path; a scrape of /metrics merges the
+threads' buckets and renders them in the Prometheus text format, next
+to domain gauges (queue depth, online users, active rooms, message
+writer lag, cache hit rates, ...) and the time-to-match histogram.
+
+A call counts as an error when the handler raises, returns a 5xx, or
+logs at ERROR while it runs (most handlers catch their exceptions,
+log them and emit an "error" event instead of raising).
+
+    openworld_socketio_event_seconds{event="send_message"}
+    openworld_http_route_seconds{endpoint="chat.chat_window"}
+    sum by (event) (rate(openworld_socketio_event_seconds_sum[5m]))
+        -> which event the worker spends its time in
+"""
+
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from werkzeug.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds in seconds (+Inf is implied)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MATCH_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+# name: (help, label, buckets)
+HISTOGRAMS = {
+    'openworld_socketio_event_seconds': ('Socket.IO handler latency', 'event', LATENCY_BUCKETS),
+    'openworld_http_route_seconds': ('HTTP view latency', 'endpoint', LATENCY_BUCKETS),
+    'openworld_time_to_match_seconds': ('Time from joining the queue to being matched', None, MATCH_BUCKETS),
+}
+ERRORS = {
+    'openworld_socketio_event_seconds': 'openworld_socketio_event_errors_total',
+    'openworld_http_route_seconds': 'openworld_http_route_errors_total',
+}
+
+
+class Metrics:
+    """Histograms kept per thread, merged when scraped
+
+    With gevent / eventlet every greenlet runs on the one OS thread, and
+    thread-locals are per greenlet: `shared=True` records into a single
+    shard instead (greenlets only switch on I/O, never mid-update).
+    """
+
+    def __init__(self, shared=False, clock=time.perf_counter):
+        self.clock = clock
+        self._local = threading.local()
+        self._shards = []       # [(thread, {(name, label): [count, errors, sum, buckets]})]
+        self._retired = {}      # shards of threads that have exited, folded together
+        self._lock = threading.Lock()
+        self._shared = None
+        if shared:
+            self._shared = {}
+            self._shards.append((None, self._shared))
+        self._message_samples = deque(maxlen=64)   # (time, messages submitted)
+
+    # ===== RECORDING (hot path, no locks) =====
+
+    def observe(self, name, label, seconds, error=False):
+        shard = self._shared
+        if shard is None:
+            shard = getattr(self._local, 'shard', None)
+            if shard is None:
+                shard = self._new_shard()
+        entry = shard.get((name, label))
+        if entry is None:
+            entry = shard[(name, label)] = [0, 0, 0.0, [0] * (len(HISTOGRAMS[name][2]) + 1)]
+        entry[0] += 1
+        if error:
+            entry[1] += 1
+        entry[2] += seconds
+        entry[3][bisect.bisect_left(HISTOGRAMS[name][2], seconds)] += 1
+
+    def timed(self, name, label):
+        """Decorator: record each call of the wrapped function under label"""
+        def decorator(handler):
+            local = self._local
+            clock = self.clock
+
+            def call(args, kwargs):
+                outer = getattr(local, 'errors', None)
+                local.errors = 0
+                started = clock()
+                failed = False
+                try:
+                    rv = handler(*args, **kwargs)
+                    failed = _is_server_error(rv)
+                    return rv
+                except HTTPException as e:
+                    failed = e.code is None or e.code >= 500
+                    raise
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    logged = local.errors
+                    local.errors = outer
+                    self.observe(name, label, clock() - started, failed or logged > 0)
+
+            # Keep zero-argument handlers zero-argument: Flask-SocketIO tries
+            # connect(auth) first and falls back to connect() on TypeError
+            code = getattr(handler, '__code__', None)
+            if code is not None and code.co_argcount == 0 and not code.co_flags & 0x0C:
+                @wraps(handler)
+                def wrapper():
+                    return call((), {})
+            else:
+                @wraps(handler)
+                def wrapper(*args, **kwargs):
+                    return call(args, kwargs)
+            return wrapper
+        return decorator
+
+    def count_error(self):
+        """An ERROR was logged: charge it to the handler running on this thread"""
+        local = self._local
+        if getattr(local, 'errors', None) is not None:
+            local.errors += 1
+
+    def _new_shard(self):
+        shard = self._local.shard = {}
+        with self._lock:
+            # Fold exited threads here too, so the list stays bounded by the
+            # live threads even if nothing ever scrapes
+            self._fold_dead()
+            self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_dead(self):
+        """Merge shards of exited threads into _retired (lock held)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread is None or thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge(self._retired, shard)
+        self._shards = live
+
+    # ===== SCRAPING =====
+
+    def snapshot(self):
+        """{(name, label): (count, errors, sum, buckets)} across all threads"""
+        merged = {}
+        with self._lock:
+            self._fold_dead()
+            shards = [shard for _, shard in self._shards]
+            _merge(merged, self._retired)
+        for shard in shards:
+            _merge(merged, shard)
+        return merged
+
+    def messages_per_second(self, submitted, window=60):
+        """Chat messages accepted per second over (up to) the last window seconds"""
+        now = time.monotonic()
+        with self._lock:
+            samples = self._message_samples
+            samples.append((now, submitted))
+            while len(samples) > 2 and now - samples[1][0] >= window:
+                samples.popleft()
+            then, before = samples[0]
+        return (submitted - before) / (now - then) if now > then else 0.0
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of the histograms plus gauges"""
+        merged = self.snapshot()
+        lines = []
+        for name, (help_text, label_name, buckets) in HISTOGRAMS.items():
+            series = sorted((label, entry) for (key, label), entry in merged.items() if key == name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for label, (count, _, total, counts) in series:
+                labels = f'{label_name}="{_escape(label)}",' if label_name else ""
+                cumulative = 0
+                for bound, n in zip(buckets + (float('inf'),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{name}_bucket{{{labels}le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{_braces(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_braces(labels)} {count}")
+
+            errors = ERRORS.get(name)
+            if errors:
+                lines.append(f"# HELP {errors} {help_text.split()[0]} calls that raised, returned 5xx or logged an error")
+                lines.append(f"# TYPE {errors} counter")
+                for label, entry in series:
+                    lines.append(f'{errors}{{{label_name}="{_escape(label)}"}} {entry[1]}')
+
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class ErrorCounter(logging.Handler):
+    """Root handler that charges ERROR records to the running handler"""
+
+    def __init__(self, metrics):
+        super().__init__(level=logging.ERROR)
+        self.metrics = metrics
+
+    def emit(self, record):
+        self.metrics.count_error()
+
+
+def _merge(into, shard):
+    for key, (count, errors, total, buckets) in list(shard.items()):
+        entry = into.get(key)
+        if entry is None:
+            into[key] = [count, errors, total, list(buckets)]
+        else:
+            entry[0] += count
+            entry[1] += errors
+            entry[2] += total
+            entry[3] = [a + b for a, b in zip(entry[3], buckets)]
+
+
+def _is_server_error(rv):
+    status = rv[1] if isinstance(rv, tuple) and len(rv) > 1 else getattr(rv, 'status_code', None)
+    return isinstance(status, int) and status >= 500
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _braces(labels):
+    return f"{{{labels.rstrip(',')}}}" if labels else ""
+
+
+def flatten_gauges(stats, prefix='openworld'):
+    """Numeric leaves of a collect_stats() dict as {metric_name: value}"""
+    gauges = {}
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            gauges.update(flatten_gauges(value, name))
+        elif isinstance(value, bool):
+            gauges[name] = int(value)
+        elif isinstance(value, (int, float)):
+            gauges[name] = value
+    return gauges
+
+
+# ===== INSTRUMENTATION =====
+
+def instrument_socketio(socketio, metrics):
+    """Time every handler registered with socketio.on from now on"""
+    register = socketio.on
+
+    def on(message, namespace=None):
+        decorator = register(message, namespace)
+        timed = metrics.timed('openworld_socketio_event_seconds', message)
+
+        def wrap(handler):
+            decorator(timed(handler))
+            return handler
+        return wrap
+
+    socketio.on = on
+
+
+def instrument_app(app, metrics, exclude=('static',)):
+    """Time every view function registered on the app (blueprints included)"""
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint not in exclude:
+            app.view_functions[endpoint] = metrics.timed('openworld_http_route_seconds', endpoint)(view)
+    logger.info(f"✅ Metrics on {len(app.view_functions) - len(exclude)} HTTP endpoints")
+
+
+# ===== GLOBAL INSTANCE =====
+
+_metrics = None
+
+
+def init_metrics(async_mode='threading'):
+    """Create the process-wide metrics and count logged errors per handler"""
+    global _metrics
+    _metrics = Metrics(shared=async_mode in ('gevent', 'gevent_uwsgi', 'eventlet'))
+    logging.getLogger().addHandler(ErrorCounter(_metrics))
+    return _metrics
+
+
+def get_metrics():
+    if _metrics is None:
+        init_metrics()
+    return _metrics
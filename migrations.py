@@ -0,0 +1,113 @@
+"""
+MIGRATIONS - Bring an existing SQLite / PostgreSQL database up to the models
+
+db.create_all() only creates missing tables, so databases created before
+a column or index was declared never get it. migrate() compares the
+models with the live schema and, idempotently:
+
+  - creates missing tables
+  - adds missing columns (ALTER TABLE ... ADD COLUMN, with the column's
+    scalar default so NOT NULL columns can be added to populated tables)
+  - creates missing indexes, partial ones included; on PostgreSQL with
+    CREATE INDEX CONCURRENTLY so live traffic is not blocked
+  - refreshes planner statistics (ANALYZE)
+
+Run it with `flask migrate-schema` after deploying new models.
+"""
+
+import logging
+
+import click
+from sqlalchemy import inspect, literal, text
+
+from models.models import db
+
+logger = logging.getLogger(__name__)
+
+
+def _add_column(conn, table, column):
+    dialect = conn.dialect
+    quote = dialect.identifier_preparer.quote
+    ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=dialect)}"
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        rendered = literal(default, column.type).compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {rendered}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def _create_index(engine, index):
+    if engine.dialect.name == "postgresql":
+        # CONCURRENTLY cannot run inside a transaction block
+        index.dialect_kwargs["postgresql_concurrently"] = True
+        try:
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                index.create(conn)
+        finally:
+            index.dialect_kwargs["postgresql_concurrently"] = False
+    else:
+        with engine.begin() as conn:
+            index.create(conn)
+
+
+def migrate(engine=None):
+    """Add missing tables, columns and indexes, returns what was done
+
+    {'tables': [...], 'columns': [...], 'indexes': [...], 'failed': [...]}
+    A failed index (e.g. a unique one over duplicate rows) is logged and
+    reported, the rest still go ahead.
+    """
+    engine = engine or db.engine
+    done = {"tables": [], "columns": [], "indexes": [], "failed": []}
+
+    existing_tables = set(inspect(engine).get_table_names())
+    missing_tables = [t for t in db.metadata.sorted_tables if t.name not in existing_tables]
+    if missing_tables:
+        db.metadata.create_all(engine, tables=missing_tables)
+        done["tables"] = [t.name for t in missing_tables]
+
+    inspector = inspect(engine)
+    for table in db.metadata.sorted_tables:
+        if table.name in done["tables"]:
+            continue
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        with engine.begin() as conn:
+            for column in table.columns:
+                if column.name not in columns:
+                    _add_column(conn, table, column)
+                    done["columns"].append(f"{table.name}.{column.name}")
+
+        indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name in indexes:
+                continue
+            try:
+                _create_index(engine, index)
+                done["indexes"].append(index.name)
+            except Exception as e:
+                logger.error(f"❌ Index {index.name} failed: {e}")
+                done["failed"].append(index.name)
+
+    if done["columns"] or done["indexes"]:
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+    return done
+
+
+def init_migration_commands(app):
+    @app.cli.command("migrate-schema")
+    def migrate_schema():
+        """Add missing tables, columns and indexes to the database."""
+        done = migrate()
+        for kind in ("tables", "columns", "indexes"):
+            for name in done[kind]:
+                click.echo(f"  + {kind[:-1]} {name}")
+        if done["failed"]:
+            raise click.ClickException(f"Could not create: {', '.join(done['failed'])}")
+        if not any(done.values()):
+            click.echo("✅ Schema already up to date")
+        else:
+            logger.info(f"✅ Schema migrated: {done}")
+            click.echo("✅ Schema migrated")
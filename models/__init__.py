@@ -1,3 +1,3 @@
-from .models import db, User, Message, FriendRequest
+from .models import db, User, Message, Conversation, FriendRequest
 
-__all__ = ['db', 'User', 'Message', 'FriendRequest']
\ No newline at end of file
+__all__ = ['db', 'User', 'Message', 'Conversation', 'FriendRequest']
\ No newline at end of file
@@ -21,9 +21,15 @@ friends_association = db.Table(
 blocked_association = db.Table(
     'blocked_association',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
-    db.Column('blocked_user_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    db.Column('blocked_user_id', db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    # Who blocked a user (blocks apply both ways)
+    db.Index('ix_blocked_association_blocked_user', 'blocked_user_id')
 )
 
+def _social_graph():
+    from social_graph import get_social_graph  # imports this module
+    return get_social_graph()
+
 # =========================
 # USER MODEL
 # =========================
@@ -116,41 +122,48 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password, password)
 
     def is_friend_with(self, user):
-        return self.friends.filter(
-            friends_association.c.friend_id == user.id
-        ).count() > 0
+        return _social_graph().is_friend(self.id, user.id)
 
     def has_blocked(self, user):
         """Check if current user has blocked another user"""
-        return self.blocked_users.filter(
-            blocked_association.c.blocked_user_id == user.id
-        ).count() > 0
+        return _social_graph().has_blocked(self.id, user.id)
 
     def block_user(self, user):
         """Block another user"""
         if not self.has_blocked(user):
             self.blocked_users.append(user)
-            db.session.commit()
+            self._commit_social(user, 'block')
 
     def unblock_user(self, user):
         """Unblock a user"""
         if self.has_blocked(user):
             self.blocked_users.remove(user)
-            db.session.commit()
+            self._commit_social(user, 'unblock')
 
     def add_friend(self, user):
         """Add another user as friend (bidirectional)"""
         if not self.is_friend_with(user):
             self.friends.append(user)
             user.friends.append(self)
-            db.session.commit()
+            self._commit_social(user, 'add_friend')
 
     def remove_friend(self, user):
         """Remove another user from friends"""
         if self.is_friend_with(user):
             self.friends.remove(user)
             user.friends.remove(self)
+            self._commit_social(user, 'remove_friend')
+
+    def _commit_social(self, user, change):
+        """Commit a friend / block change, then apply it to the cached graph"""
+        graph = _social_graph()
+        try:
             db.session.commit()
+        except Exception:
+            db.session.rollback()
+            graph.invalidate(self.id, user.id)
+            raise
+        getattr(graph, change)(self.id, user.id)
 
     def get_interests_list(self):
         """Get interests as a list"""
@@ -185,11 +198,20 @@ class User(UserMixin, db.Model):
 # =========================
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_messages_conversation_seq', 'conversation', 'seq', unique=True),
+        # History pages and read watermarks of one direction of a 1:1 chat
+        db.Index('ix_messages_pair_created', 'sender_id', 'receiver_id', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
+    # Conversation key ("chat_<low id>_<high id>") and position within it
+    conversation = db.Column(db.String(40))
+    seq = db.Column(db.Integer)
+
     text = db.Column(db.Text)
     image = db.Column(db.String(200))  # Filename for image
     document = db.Column(db.String(200))  # Filename for document
@@ -199,11 +221,48 @@ class Message(db.Model):
     def __repr__(self):
         return f"<Message {self.id}>"
 
+# =========================
+# CONVERSATION SUMMARY MODEL
+# =========================
+class Conversation(db.Model):
+    """One row per (user, peer): the user's view of a 1:1 conversation
+
+    Denormalized from messages and kept current in the same transaction
+    as every message insert / read (see conversations.py).
+    """
+    __tablename__ = 'conversations'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'peer_id', name='uq_conversations_user_peer'),
+        db.Index('ix_conversations_user_recent', 'user_id', 'last_message_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    peer_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id', ondelete='SET NULL'))
+    last_message_at = db.Column(db.DateTime)
+    last_sender_id = db.Column(db.Integer)
+    preview = db.Column(db.String(100))
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    # Read watermark: every message from peer with id <= this has been read
+    last_read_message_id = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<Conversation {self.user_id}->{self.peer_id}>"
+
 # =========================
 # FRIEND REQUEST MODEL
 # =========================
 class FriendRequest(db.Model):
     __tablename__ = 'friend_requests'
+    __table_args__ = (
+        db.Index('ix_friend_requests_pair_status', 'sender_id', 'receiver_id', 'status'),
+        # Incoming requests inbox
+        db.Index('ix_friend_requests_pending', 'receiver_id',
+                 postgresql_where=db.text("status = 'pending'"),
+                 sqlite_where=db.text("status = 'pending'")),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -220,12 +279,22 @@ class FriendRequest(db.Model):
 # =========================
 class MatchQueue(db.Model):
     __tablename__ = 'match_queue'
+    __table_args__ = (
+        db.Index('ix_match_queue_user_status', 'user_id', 'status'),
+        # Reaper: expire timed-out searches, purge closed audit rows
+        db.Index('ix_match_queue_waiting_timeout', 'timeout_at',
+                 postgresql_where=db.text("status = 'waiting'"),
+                 sqlite_where=db.text("status = 'waiting'")),
+        db.Index('ix_match_queue_closed_created', 'created_at',
+                 postgresql_where=db.text("status != 'waiting'"),
+                 sqlite_where=db.text("status != 'waiting'")),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     user = db.relationship('User', backref='queue_entries')
     
-    status = db.Column(db.String(20), default='waiting')  # waiting, matched, cancelled
+    status = db.Column(db.String(20), default='waiting')  # waiting, matched, cancelled, expired
     
     # Preferences
     preferred_gender = db.Column(db.String(20), default='any')
@@ -248,6 +317,15 @@ class MatchQueue(db.Model):
 # =========================
 class ActiveMatch(db.Model):
     __tablename__ = 'active_matches'
+    __table_args__ = (
+        # Reaper: orphaned live matches, purge of old ended ones
+        db.Index('ix_active_matches_live', 'started_at',
+                 postgresql_where=db.text("status = 'active'"),
+                 sqlite_where=db.text("status = 'active'")),
+        db.Index('ix_active_matches_ended', 'ended_at',
+                 postgresql_where=db.text("status = 'ended'"),
+                 sqlite_where=db.text("status = 'ended'")),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.String(100), unique=True, nullable=False)
@@ -0,0 +1,186 @@
+"""
+PRESENCE - Who is online, from memory, with write-behind to the DB
+
+Every open socket is a session; a user is online while they have at
+least one (tabs and devices are refcounted, so closing one tab does not
+take the user offline). Sessions live in the state store, so "is online"
+and "which sockets" never touch the database.
+
+users.is_online / last_seen are written behind: transitions are buffered
+and flushed every few seconds as one bulk UPDATE for all changed users.
+
+Transitions are also announced only to the user's online friends, in
+their user_<id> rooms: everything within one fan-out window goes out as
+a single `presence_delta` frame per recipient.
+"""
+
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import case, update
+
+from models.models import db, User
+from social_graph import get_social_graph
+
+logger = logging.getLogger(__name__)
+
+
+def friend_ids_of(user_ids):
+    """{user_id: friend ids} for a batch of users, from the social graph cache"""
+    return get_social_graph().friends_of(user_ids)
+
+
+class PresenceFanout:
+    """Coalesces presence transitions into per-friend delta frames
+
+    emit(event, data, to) sends a frame; friends_of(user_ids) returns
+    {user_id: friend ids}; is_online(user_id) filters recipients.
+    """
+
+    def __init__(self, emit, friends_of=friend_ids_of, is_online=None):
+        self.emit = emit
+        self.friends_of = friends_of
+        self.is_online = is_online or (lambda user_id: True)
+        self._changes = {}   # {user_id: is_online} since the last flush
+        self._lock = threading.Lock()
+
+        self.frames = 0
+        self.transitions = 0
+
+    def notify(self, user_id, online):
+        with self._lock:
+            self._changes[user_id] = online
+
+    def flush(self):
+        """Send one presence_delta frame to each online friend, returns frames sent"""
+        with self._lock:
+            changes, self._changes = self._changes, {}
+        if not changes:
+            return 0
+
+        deltas = {}   # {recipient: {'online': [...], 'offline': [...]}}
+        for user_id, friend_ids in self.friends_of(list(changes)).items():
+            state = 'online' if changes[user_id] else 'offline'
+            for friend_id in friend_ids:
+                if friend_id in changes and not changes[friend_id]:
+                    continue
+                delta = deltas.get(friend_id)
+                if delta is None:
+                    if not self.is_online(friend_id):
+                        continue
+                    delta = deltas[friend_id] = {'online': [], 'offline': []}
+                delta[state].append(user_id)
+
+        for recipient, delta in deltas.items():
+            try:
+                self.emit('presence_delta', delta, to=f"user_{recipient}")
+            except Exception as e:
+                logger.error(f"Presence delta to {recipient} failed: {e}")
+        self.frames += len(deltas)
+        self.transitions += len(changes)
+        return len(deltas)
+
+
+class PresenceRegistry:
+    """Refcounted sessions per user plus a buffered is_online writer"""
+
+    def __init__(self, store, fanout=None):
+        self.store = store
+        self.fanout = fanout
+        self._dirty = {}    # {user_id: is_online} waiting for the next flush
+        self._lock = threading.Lock()
+
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    # ===== SESSIONS =====
+
+    def connect(self, user_id, socket_id):
+        """Add a session, returns True if this brought the user online"""
+        return self.store.add_session(user_id, socket_id) == 1
+
+    def disconnect(self, user_id, socket_id):
+        """Drop a session, returns True if it was the user's last one"""
+        return self.store.remove_session(user_id, socket_id) == 0
+
+    def is_online(self, user_id):
+        return bool(self.store.sessions(user_id))
+
+    def sockets(self, user_id):
+        return self.store.sessions(user_id)
+
+    # ===== WRITE-BEHIND =====
+
+    def mark(self, user_id, online):
+        """Record an online/offline transition for the next flush and fan-out"""
+        with self._lock:
+            self._dirty[user_id] = online
+        if self.fanout is not None:
+            self.fanout.notify(user_id, online)
+
+    def pending(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def flush(self):
+        """Write all buffered transitions in one UPDATE (needs an app context)"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        online_ids = [user_id for user_id, online in dirty.items() if online]
+        try:
+            db.session.execute(
+                update(User)
+                .where(User.id.in_(list(dirty)))
+                .values(
+                    is_online=case((User.id.in_(online_ids), True), else_=False)
+                    if online_ids else False,
+                    last_seen=datetime.utcnow(),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Presence flush of {len(dirty)} users failed: {e}")
+            # Keep them for the next round unless newer transitions arrived
+            with self._lock:
+                for user_id, online in dirty.items():
+                    self._dirty.setdefault(user_id, online)
+            return 0
+        finally:
+            db.session.remove()
+
+        self.flushes += 1
+        self.flushed_rows += len(dirty)
+        return len(dirty)
+
+
+# ===== GLOBAL INSTANCE =====
+
+_presence = None
+
+
+def init_presence(store, timers=None, flush_seconds=5, socketio=None, fanout_seconds=1):
+    """Create the process-wide registry and schedule its flushes"""
+    global _presence
+    fanout = None
+    if socketio is not None:
+        fanout = PresenceFanout(socketio.emit, is_online=lambda user_id: bool(store.sessions(user_id)))
+    _presence = PresenceRegistry(store, fanout)
+    if timers is not None:
+        timers.every(flush_seconds, _presence.flush, key='presence-flush', background=True)
+        if fanout is not None:
+            timers.every(fanout_seconds, fanout.flush, key='presence-fanout', background=True)
+    logger.info(f"✅ Presence registry (flush every {flush_seconds}s)")
+    return _presence
+
+
+def get_presence():
+    if _presence is None:
+        from state_store import get_state_store
+        init_presence(get_state_store())
+    return _presence
@@ -3,6 +3,9 @@ from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -45,7 +48,7 @@ def upload_chat_file():
         })
     
     except Exception as e:
-        print(f"upload_chat_file error: {e}")
+        logger.error(f"upload_chat_file error: {e}")
         return jsonify({'error': str(e)}), 500
 
 @api_bp.route('/user/<int:user_id>', methods=['GET'])
@@ -67,16 +70,76 @@ def get_user_info(user_id):
             'is_friend': current_user.is_friend_with(user)
         })
     except Exception as e:
-        print(f"get_user_info error: {e}")
+        logger.error(f"get_user_info error: {e}")
         return jsonify({'error': 'Failed to get user info'}), 500
 
+@api_bp.route('/messages/<int:user_id>', methods=['GET'])
+@login_required
+def get_message_history(user_id):
+    """Page of chat history with a friend, newest page first
+
+    ?before=<cursor> continues from the previous page's next_cursor.
+    """
+    try:
+        from models.models import User
+        from conversations import history_page, message_payload
+
+        friend = User.query.get(user_id)
+        if not friend or not current_user.is_friend_with(friend):
+            return jsonify({'error': 'Not a friend'}), 403
+
+        limit = request.args.get('limit', 50, type=int)
+        try:
+            messages, next_cursor = history_page(
+                current_user.id, user_id, before=request.args.get('before'), limit=limit
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        return jsonify({
+            'messages': [message_payload(m) for m in messages],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+    except Exception as e:
+        logger.error(f"get_message_history error: {e}")
+        return jsonify({'error': 'Failed to load messages'}), 500
+
+@api_bp.route('/conversations/<conversation_id>/sync', methods=['GET'])
+@login_required
+def sync_conversation(conversation_id):
+    """Messages after ?since_seq=N in one conversation, in seq order"""
+    try:
+        from conversations import conversation_members
+        from message_writer import get_message_writer
+
+        try:
+            members = conversation_members(conversation_id)
+            since_seq = int(request.args.get('since_seq', 0))
+        except ValueError:
+            return jsonify({'error': 'Invalid conversation or since_seq'}), 400
+        if current_user.id not in members:
+            return jsonify({'error': 'Not a member of this conversation'}), 403
+
+        messages, has_more = get_message_writer().sync(conversation_id, since_seq)
+        return jsonify({
+            'conversation_id': conversation_id,
+            'since_seq': since_seq,
+            'messages': messages,
+            'has_more': has_more
+        })
+    except Exception as e:
+        logger.error(f"sync_conversation error: {e}")
+        return jsonify({'error': 'Failed to sync messages'}), 500
+
 @api_bp.route('/friends-count', methods=['GET'])
 @login_required
 def get_friends_count():
     """Get count of friends"""
     try:
-        count = current_user.friends.count()
+        from social_graph import get_social_graph
+        count = len(get_social_graph().friends(current_user.id))
         return jsonify({'count': count})
     except Exception as e:
-        print(f"get_friends_count error: {e}")
+        logger.error(f"get_friends_count error: {e}")
         return jsonify({'error': 'Failed to get friends count'}), 500
\ No newline at end of file
@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 from models.models import db, User, FriendRequest
+import logging
+
+logger = logging.getLogger(__name__)
 
 # =========================
 # BLUEPRINT (MUST BE FIRST)
@@ -28,7 +31,7 @@ def requests_ui():
             requests=requests
         )
     except Exception as e:
-        print(f"Requests UI error: {e}")
+        logger.error(f"Requests UI error: {e}")
         return render_template("friend_requests.html", requests=[])
 
 # =========================
@@ -51,18 +54,15 @@ def accept_request(request_id):
             flash("User not found", "error")
             return redirect(url_for("friend_requests.requests_ui"))
 
-        # Add friendship BOTH ways
-        if sender not in receiver.friends:
-            receiver.friends.append(sender)
-            sender.friends.append(receiver)
-
         fr.status = "accepted"
+        # Add friendship BOTH ways (commits the status too)
+        receiver.add_friend(sender)
         db.session.commit()
 
         flash(f"You are now friends with {sender.username}", "success")
         return redirect(url_for("chat.friends_list"))
     except Exception as e:
-        print(f"Accept request error: {e}")
+        logger.error(f"Accept request error: {e}")
         db.session.rollback()
         flash("An error occurred while accepting the request", "error")
         return redirect(url_for("friend_requests.requests_ui"))
@@ -86,7 +86,7 @@ def reject_request(request_id):
         flash("Friend request rejected", "info")
         return redirect(url_for("friend_requests.requests_ui"))
     except Exception as e:
-        print(f"Reject request error: {e}")
+        logger.error(f"Reject request error: {e}")
         db.session.rollback()
         flash("An error occurred while rejecting the request", "error")
         return redirect(url_for("friend_requests.requests_ui"))
\ No newline at end of file
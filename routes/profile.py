@@ -5,6 +5,9 @@ from models.models import db, User
 import os
 from datetime import datetime
 import pytz
+import logging
+
+logger = logging.getLogger(__name__)
 
 profile_bp = Blueprint('profile', __name__)
 
@@ -32,7 +35,7 @@ def view_profile(user_id):
             last_seen=last_seen_formatted
         )
     except Exception as e:
-        print(f"❌ View profile error: {e}")
+        logger.error(f"❌ View profile error: {e}")
         return redirect(url_for('profile.my_profile'))
 
 @profile_bp.route('/profile')
@@ -42,7 +45,7 @@ def my_profile():
     try:
         return redirect(url_for('profile.view_profile', user_id=current_user.id))
     except Exception as e:
-        print(f"❌ My profile error: {e}")
+        logger.error(f"❌ My profile error: {e}")
         return redirect(url_for('match.match_page'))
 
 @profile_bp.route('/edit-profile', methods=['GET', 'POST'])
@@ -108,9 +111,9 @@ def edit_profile():
                         filepath = os.path.join('static/uploads/profiles', filename)
                         file.save(filepath)
                         current_user.profile_pic = filename
-                        print(f"✅ Profile picture updated: {filename}")
+                        logger.info(f"✅ Profile picture updated: {filename}")
                     except Exception as e:
-                        print(f"❌ Profile pic upload error: {e}")
+                        logger.error(f"❌ Profile pic upload error: {e}")
                         flash('Error uploading profile picture', 'error')
             
             db.session.commit()
@@ -119,7 +122,7 @@ def edit_profile():
         
         return render_template('edit_profile.html', user=current_user)
     except Exception as e:
-        print(f"❌ Edit profile error: {e}")
+        logger.error(f"❌ Edit profile error: {e}")
         db.session.rollback()
         flash('An error occurred while editing your profile', 'error')
         return render_template('edit_profile.html', user=current_user)
@@ -131,5 +134,5 @@ def settings():
     try:
         return render_template('settings.html', user=current_user)
     except Exception as e:
-        print(f"❌ Settings error: {e}")
+        logger.error(f"❌ Settings error: {e}")
         return render_template('settings.html', user=current_user)
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""
+SIGNALING - WebRTC offer / answer / ICE relay between matched peers
+
+Relays go straight to the peer's socket, resolved in O(1) from a route
+table (socket -> room, generation, peer socket) that is filled when a
+match is created and cleared when it ends. Nothing here touches the DB.
+
+Every room carries a generation number (see match_state.room_generation);
+clients echo it with each signal, and signals for a room or generation
+that is no longer the sender's current one are dropped, so a late ICE
+candidate from a skipped match cannot reach the next partner.
+
+ICE candidates arriving in a burst are coalesced per peer and delivered
+as one `webrtc_ice_candidates` frame every `batch_window` seconds.
+"""
+
+import logging
+import threading
+
+from batching import BatchFlusher
+from match_state import room_generation
+
+logger = logging.getLogger(__name__)
+
+
+class SignalingRelay:
+    """Memory-only router for WebRTC signaling inside a match"""
+
+    def __init__(self, socketio, store, batch_window=0.02, max_batch=20):
+        self.socketio = socketio
+        self.store = store
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        self._routes = {}    # {sid: (room_id, generation, peer_sid)}
+        self._rooms = {}     # {room_id: (sid1, sid2)}
+        self._lock = threading.Lock()
+
+        self._pending = {}   # {peer_sid: (room_id, generation, [candidates])}
+        self._cond = threading.Condition(self._lock)
+        self._flusher = BatchFlusher(
+            "signaling-ice", self._cond, batch_window,
+            pending=lambda: self._pending,
+            full=lambda: any(len(p[2]) >= self.max_batch for p in self._pending.values()),
+            flush=self.flush,
+        )
+
+        self.relayed = 0
+        self.dropped = 0
+        self.ice_frames = 0
+        self.ice_candidates = 0
+
+    # ===== ROUTES =====
+
+    def open_room(self, room_id, sid1, sid2):
+        """Route two matched sockets to each other"""
+        generation = room_generation(room_id)
+        with self._lock:
+            self._rooms[room_id] = (sid1, sid2)
+            self._routes[sid1] = (room_id, generation, sid2)
+            self._routes[sid2] = (room_id, generation, sid1)
+        return generation
+
+    def close_room(self, room_id):
+        """Stop relaying for a room and drop its queued ICE candidates"""
+        with self._lock:
+            for sid in self._rooms.pop(room_id, ()):
+                route = self._routes.get(sid)
+                if route and route[0] == room_id:
+                    del self._routes[sid]
+                pending = self._pending.get(sid)
+                if pending and pending[0] == room_id:
+                    del self._pending[sid]
+
+    def drop_socket(self, sid):
+        with self._lock:
+            route = self._routes.pop(sid, None)
+            self._pending.pop(sid, None)
+        if route:
+            self.close_room(route[0])
+
+    def peer(self, sid, user_id, room_id, generation=None):
+        """Peer socket for a signal from sid, or None if it is stale"""
+        route = self._routes.get(sid)
+        if route is None and self.store.shared:
+            # Matched by another worker: resolve from the shared store
+            route = self._resolve(user_id)
+        if route is None or route[0] != room_id:
+            return None
+        if generation is not None and route[1] != generation:
+            return None
+        return route[2]
+
+    def _resolve(self, user_id):
+        room_id = self.store.get_room(user_id)
+        if not room_id:
+            return None
+        other_user_id = self.store.other_member(room_id, user_id)
+        peer_sid = self.store.get_socket(other_user_id) if other_user_id else None
+        if not peer_sid:
+            return None
+        return room_id, room_generation(room_id), peer_sid
+
+    # ===== RELAY =====
+
+    def relay(self, event, sid, user_id, data, field):
+        """Forward data[field] (an offer or answer) to the peer right away"""
+        room_id = data.get("room")
+        generation = _generation(data)
+        peer_sid = self.peer(sid, user_id, room_id, generation)
+        if peer_sid is None:
+            self.dropped += 1
+            logger.debug(f"Dropped stale {event} for {room_id}")
+            return False
+        self.socketio.emit(event, {
+            field: data.get(field),
+            "room": room_id,
+            "gen": room_generation(room_id),
+        }, to=peer_sid)
+        self.relayed += 1
+        return True
+
+    def relay_ice(self, sid, user_id, data):
+        """Queue one or more ICE candidates for the peer's next batch"""
+        room_id = data.get("room")
+        generation = _generation(data)
+        candidates = data.get("candidates")
+        if candidates is None:
+            candidates = [data.get("candidate")]
+        candidates = [c for c in candidates if c]
+
+        peer_sid = self.peer(sid, user_id, room_id, generation)
+        if peer_sid is None or not candidates:
+            self.dropped += len(candidates)
+            return False
+
+        with self._cond:
+            was_idle = not self._pending
+            pending = self._pending.get(peer_sid)
+            if pending is None or pending[0] != room_id:
+                pending = self._pending[peer_sid] = (room_id, room_generation(room_id), [])
+            pending[2].extend(candidates)
+            if was_idle or len(pending[2]) >= self.max_batch:
+                self._cond.notify()
+        self._flusher.start()
+        return True
+
+    # ===== ICE BATCHING =====
+
+    def flush(self):
+        """Send every peer its queued candidates as one frame"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for peer_sid, (room_id, generation, candidates) in pending.items():
+            try:
+                self.socketio.emit("webrtc_ice_candidates", {
+                    "room": room_id,
+                    "gen": generation,
+                    "candidates": candidates,
+                }, to=peer_sid)
+                self.ice_frames += 1
+                self.ice_candidates += len(candidates)
+            except Exception as e:
+                logger.error(f"ICE batch to {peer_sid} failed: {e}")
+
+
+def _generation(data):
+    gen = data.get("gen")
+    try:
+        return int(gen) if gen is not None else None
+    except (TypeError, ValueError):
+        return -1
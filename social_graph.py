@@ -0,0 +1,174 @@
+"""
+SOCIAL GRAPH - Friend and block adjacency cached in memory
+
+Friend checks (is_friend_with) and block checks (has_blocked) run on
+nearly every profile, chat and friend request; each used to be a COUNT
+query. Here every user's friend set and blocked set is loaded once (for
+a batch of users, one query) and answered from memory afterwards.
+
+Blocks apply both ways: block_set(user_id) is everyone user_id blocked
+or was blocked by, which matchmaking excludes and chat refuses.
+
+User.add_friend / remove_friend / block_user / unblock_user update the
+cached sets after their commit. Changes made by another worker are
+picked up when the entry expires (`ttl` seconds, 0 keeps entries until
+they are invalidated).
+"""
+
+import logging
+import threading
+import time
+
+from sqlalchemy import select
+
+from models.models import db, blocked_association, friends_association
+
+logger = logging.getLogger(__name__)
+
+EMPTY = frozenset()
+
+
+class SocialGraph:
+    """Lazily loaded {user_id: frozenset of ids} for friends and blocks"""
+
+    def __init__(self, ttl=60, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._friends = {}   # {user_id: (friend ids, loaded_at)}
+        self._blocked = {}   # {user_id: (ids user_id has blocked, loaded_at)}
+        self._blocked_by = {}   # {user_id: (ids that blocked user_id, loaded_at)}
+        # Bumped on every change, so a load racing with it is not cached
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    # ===== QUERIES =====
+
+    def friends(self, user_id):
+        return self.friends_of([user_id])[user_id]
+
+    def friends_of(self, user_ids):
+        """{user_id: frozenset of friend ids} for a batch of users"""
+        return self._lookup(self._friends, friends_association.c.user_id,
+                            friends_association.c.friend_id, user_ids)
+
+    def is_friend(self, user_id, other_user_id):
+        return other_user_id in self.friends(user_id)
+
+    def blocked(self, user_id):
+        """Ids user_id has blocked"""
+        return self._lookup(self._blocked, blocked_association.c.user_id,
+                            blocked_association.c.blocked_user_id, [user_id])[user_id]
+
+    def has_blocked(self, user_id, other_user_id):
+        return other_user_id in self.blocked(user_id)
+
+    def blocked_by(self, user_id):
+        """Ids that have blocked user_id"""
+        return self._lookup(self._blocked_by, blocked_association.c.blocked_user_id,
+                            blocked_association.c.user_id, [user_id])[user_id]
+
+    def block_set(self, user_id):
+        """Ids user_id must never be paired or chat with (either side blocked)"""
+        blocked, blocked_by = self.blocked(user_id), self.blocked_by(user_id)
+        return blocked | blocked_by if blocked_by else blocked
+
+    def is_blocked_between(self, user_id, other_user_id):
+        return other_user_id in self.block_set(user_id)
+
+    # ===== UPDATES (call after the change is committed) =====
+
+    def add_friend(self, user_id, other_user_id):
+        self._update(self._friends, user_id, other_user_id, True)
+        self._update(self._friends, other_user_id, user_id, True)
+
+    def remove_friend(self, user_id, other_user_id):
+        self._update(self._friends, user_id, other_user_id, False)
+        self._update(self._friends, other_user_id, user_id, False)
+
+    def block(self, user_id, other_user_id):
+        self._update(self._blocked, user_id, other_user_id, True)
+        self._update(self._blocked_by, other_user_id, user_id, True)
+
+    def unblock(self, user_id, other_user_id):
+        self._update(self._blocked, user_id, other_user_id, False)
+        self._update(self._blocked_by, other_user_id, user_id, False)
+
+    def invalidate(self, *user_ids):
+        """Forget everything cached for these users (reloaded on next use)"""
+        with self._lock:
+            self._epoch += 1
+            for user_id in user_ids:
+                self._friends.pop(user_id, None)
+                self._blocked.pop(user_id, None)
+                self._blocked_by.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._friends.clear()
+            self._blocked.clear()
+            self._blocked_by.clear()
+
+    # ===== INTERNALS =====
+
+    def _update(self, cache, user_id, other_user_id, present):
+        with self._lock:
+            self._epoch += 1
+            entry = cache.get(user_id)
+            if entry is not None:
+                ids = entry[0] | {other_user_id} if present else entry[0] - {other_user_id}
+                cache[user_id] = (ids, entry[1])
+
+    def _lookup(self, cache, key_column, value_column, user_ids):
+        now = self.clock()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                entry = cache.get(user_id)
+                if entry is not None and (not self.ttl or now - entry[1] < self.ttl):
+                    found[user_id] = entry[0]
+                else:
+                    missing.append(user_id)
+            epoch = self._epoch
+            self.hits += len(found)
+            self.misses += len(missing)
+        if not missing:
+            return found
+
+        loaded = {user_id: set() for user_id in missing}
+        rows = db.session.execute(
+            select(key_column, value_column).where(key_column.in_(missing))
+        )
+        for user_id, other_user_id in rows:
+            loaded[user_id].add(other_user_id)
+
+        with self._lock:
+            fresh = self._epoch == epoch
+            for user_id, ids in loaded.items():
+                ids = frozenset(ids) if ids else EMPTY
+                found[user_id] = ids
+                if fresh:
+                    cache[user_id] = (ids, now)
+        return found
+
+
+# ===== GLOBAL INSTANCE =====
+
+_graph = None
+
+
+def init_social_graph(ttl=60):
+    """Create the process-wide friend / block cache"""
+    global _graph
+    _graph = SocialGraph(ttl=ttl)
+    logger.info(f"✅ Social graph cache (ttl {ttl}s)")
+    return _graph
+
+
+def get_social_graph():
+    if _graph is None:
+        init_social_graph()
+    return _graph
@@ -1,8 +1,43 @@
+import logging
+
 from flask_socketio import emit, join_room, leave_room
 from flask_login import current_user
-from models.models import db, Message, User
+from models.models import db, Message
+from conversations import conversation_id, conversation_members, mark_read, message_payload
+from message_writer import get_message_writer
+from social_graph import get_social_graph
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+# Attachments are upload filenames stored in messages.image / .document
+MAX_ATTACHMENT_NAME = Message.image.type.length
+
 
 def init_chat_events(socketio):
+    writer = get_message_writer()
+    social_graph = get_social_graph()
+
+    @writer.on_commit
+    def announce_conversations(batch, unread):
+        """Update both participants' friends lists in place (after commit)"""
+        latest = {}
+        for message in batch:
+            latest[conversation_id(message['sender_id'], message['receiver_id'])] = message
+        for convo_id, message in latest.items():
+            for user_id, friend_id in ((message['sender_id'], message['receiver_id']),
+                                       (message['receiver_id'], message['sender_id'])):
+                delta = {
+                    'conversation_id': convo_id,
+                    'friend_id': friend_id,
+                    'last_message_id': message['id'],
+                    'preview': (message['text'] or "📎 Shared file")[:50],
+                    'timestamp': message['created_at'].strftime('%H:%M'),
+                    'from_me': message['sender_id'] == user_id,
+                }
+                if (user_id, friend_id) in unread:
+                    delta['unread'] = unread[(user_id, friend_id)]
+                socketio.emit('chat_list_update', delta, to=f"user_{user_id}")
 
     @socketio.on('join_chat')
     def join_chat(data):
@@ -10,9 +45,10 @@ def init_chat_events(socketio):
             room = data.get('room')
             if room:
                 join_room(room)
-                print(f"✅ User joined chat room: {room}")
+                log_event(logger, "chat_joined", "✅ User joined chat room: %s", room,
+                          level=logging.DEBUG, room=room)
         except Exception as e:
-            print(f"❌ join_chat error: {e}")
+            logger.error(f"❌ join_chat error: {e}")
 
     @socketio.on('send_message')
     def send_message(data):
@@ -27,38 +63,36 @@ def init_chat_events(socketio):
             if not receiver_id or not room:
                 emit('error', {'message': 'Invalid message data'})
                 return
+            receiver_id = int(receiver_id)
+
+            # Anything the writer could not store would only be set aside later
+            for name in (image, document):
+                if name and not (isinstance(name, str) and len(name) <= MAX_ATTACHMENT_NAME):
+                    emit('error', {'message': 'Invalid attachment'})
+                    return
+
+            # Either side has blocked the other
+            if social_graph.is_blocked_between(current_user.id, receiver_id):
+                emit('error', {'message': 'You cannot message this user'})
+                return
 
             # Must have at least text OR image OR document
             if not text and not image and not document:
-                print("⚠️ Empty message (no text, image, or document)")
+                log_event(logger, "message_empty", "⚠️ Empty message (no text, image, or document)",
+                          level=logging.DEBUG, sender_id=current_user.id)
                 return
 
-            # Create message
-            message = Message(
+            # Id and timestamp now, INSERT in the writer's next batch
+            message = writer.submit(
                 sender_id=current_user.id,
                 receiver_id=receiver_id,
                 text=text if text else None,
                 image=image if image else None,
-                document=document if document else None,
-                is_read=False
+                document=document if document else None
             )
 
-            db.session.add(message)
-            db.session.commit()
-
-            # Get receiver info for notification
-            receiver = User.query.get(receiver_id)
-
             # Emit to chat room (for people in chat window)
-            emit('receive_message', {
-                'id': message.id,
-                'sender_id': current_user.id,
-                'text': message.text,
-                'image': message.image,
-                'document': message.document,
-                'timestamp': message.created_at.strftime('%H:%M'),
-                'is_read': message.is_read
-            }, room=room)
+            emit('receive_message', message_payload(message), room=room)
 
             # Emit notification popup to receiver (even if not in chat window)
             # Only if they're not in this chat room
@@ -71,58 +105,123 @@ def init_chat_events(socketio):
             
             emit('message_notification', notification_data, to=f"user_{receiver_id}", skip_sid=True)
 
-            # Update friends list for receiver
-            emit('chat_list_update', {}, broadcast=True)
+            # Friends lists are updated once the batch commits (announce_conversations)
 
-            print(f"✅ Message sent from {current_user.id} to {receiver_id}")
+            log_event(logger, "message_sent", "✅ Message %s sent from %s to %s",
+                      message['id'], current_user.id, receiver_id,
+                      message_id=message['id'], sender_id=current_user.id, receiver_id=receiver_id)
 
         except Exception as e:
-            print(f"❌ send_message error: {e}")
-            db.session.rollback()
+            logger.error(f"❌ send_message error: {e}")
             emit('error', {'message': 'Failed to send message'})
 
+    def acknowledge_read(friend_id, up_to=None):
+        """Move the read watermark and tell both sides (one event each)"""
+        result = mark_read(current_user.id, friend_id, up_to)
+        db.session.commit()
+        if result is None:
+            return
+        watermark, unread = result
+        convo_id = conversation_id(friend_id, current_user.id)
+
+        # Sender: everything up to the watermark has been read
+        emit('message_read', {
+            'message_id': watermark,
+            'sender_id': friend_id,
+            'conversation_id': convo_id,
+            'friend_id': current_user.id,
+            'read_up_to': watermark,
+        }, to=f"user_{friend_id}")
+
+        # Reader's other tabs: new unread count
+        emit('chat_list_update', {
+            'conversation_id': convo_id,
+            'friend_id': friend_id,
+            'unread': unread,
+            'read_up_to': watermark,
+        }, to=f"user_{current_user.id}")
+        log_event(logger, "conversation_read", "✅ Conversation %s read up to %s", convo_id, watermark,
+                  conversation_id=convo_id, read_up_to=watermark)
+
+    @socketio.on('mark_read')
+    def mark_read_up_to(data):
+        """Mark everything from friend_id up to message id up_to as read"""
+        try:
+            friend_id = data.get('friend_id')
+            if friend_id:
+                acknowledge_read(int(friend_id), data.get('up_to'))
+        except Exception as e:
+            logger.error(f"❌ mark_read error: {e}")
+            db.session.rollback()
+
     @socketio.on('mark_as_read')
     def mark_as_read(data):
-        """Mark messages as read"""
+        """Mark messages as read (older clients: one message id at a time)
+
+        Same watermark path as mark_read, up to message_id. An acked
+        message may still be queued in the writer: wait for that one
+        message to commit, or the watermark would stop short of it.
+        """
         try:
-            message_id = data.get('message_id')
+            message_id = int(data.get('message_id') or 0)
             if message_id:
-                msg = Message.query.get(message_id)
-                if msg and msg.receiver_id == current_user.id:
-                    msg.is_read = True
-                    db.session.commit()
-                    
-                    # Notify sender that message was read
-                    emit('message_read', {
-                        'message_id': message_id,
-                        'sender_id': msg.sender_id
-                    }, broadcast=True)
-                    
-                    print(f"✅ Message {message_id} marked as read")
+                pending = writer.unsaved(message_id)
+                if pending is not None:
+                    friend_id = pending['sender_id'] if pending['receiver_id'] == current_user.id else None
+                    writer.wait_saved(message_id, timeout=1)
+                else:
+                    friend_id = db.session.query(Message.sender_id).filter_by(
+                        id=message_id, receiver_id=current_user.id
+                    ).scalar()
+                if friend_id:
+                    acknowledge_read(friend_id, message_id)
         except Exception as e:
-            print(f"❌ mark_as_read error: {e}")
+            logger.error(f"❌ mark_as_read error: {e}")
             db.session.rollback()
 
+    @socketio.on('sync')
+    def sync(data):
+        """Catch up after a reconnect: messages after since_seq"""
+        try:
+            convo_id = data.get('conversation_id')
+            since_seq = int(data.get('since_seq') or 0)
+            if current_user.id not in conversation_members(convo_id):
+                emit('error', {'message': 'Not a member of this conversation'})
+                return
+            messages, has_more = writer.sync(convo_id, since_seq)
+            emit('sync_result', {
+                'conversation_id': convo_id,
+                'since_seq': since_seq,
+                'messages': messages,
+                'has_more': has_more
+            })
+        except ValueError:
+            emit('error', {'message': 'Invalid sync request'})
+        except Exception as e:
+            logger.error(f"❌ sync error: {e}")
+
     @socketio.on('leave_chat')
     def leave_chat(data):
         try:
             room = data.get('room')
             if room:
                 leave_room(room)
-                print(f"✅ User left chat room: {room}")
+                log_event(logger, "chat_left", "✅ User left chat room: %s", room,
+                          level=logging.DEBUG, room=room)
         except Exception as e:
-            print(f"❌ leave_chat error: {e}")
+            logger.error(f"❌ leave_chat error: {e}")
 
     @socketio.on('user_connected')
     def user_connected():
-        """Called when user connects - join their personal notification room"""
+        """Called when user connects - join their personal notification room
+
+        Online status is no longer broadcast from here: the presence
+        registry sends coalesced presence_delta frames to online friends.
+        """
         try:
             if current_user.is_authenticated:
                 join_room(f"user_{current_user.id}")
-                print(f"✅ User {current_user.id} connected to notifications")
-                emit('user_online', {
-                    'user_id': current_user.id,
-                    'username': current_user.username
-                }, broadcast=True)
+                log_event(logger, "notifications_joined", "✅ User %s connected to notifications",
+                          current_user.id, level=logging.DEBUG, user_id=current_user.id)
         except Exception as e:
-            print(f"❌ user_connected error: {e}")
\ No newline at end of file
+            logger.error(f"❌ user_connected error: {e}")
\ No newline at end of file
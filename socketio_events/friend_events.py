@@ -1,6 +1,11 @@
+import logging
+
 from flask_socketio import emit, join_room
 from flask_login import current_user
 from models.models import db, User, FriendRequest
+from structured_logging import log_event
+
+logger = logging.getLogger(__name__)
 
 def init_friend_events(socketio):
     """Friend request and friend management events"""
@@ -59,10 +64,11 @@ def init_friend_events(socketio):
                 'sender_pic': current_user.profile_pic
             }, room=f'user_{receiver_id}')
             
-            print(f"✅ Friend request sent: {current_user.id} -> {receiver_id}")
+            log_event(logger, "friend_request_sent", "✅ Friend request sent: %s -> %s", current_user.id, receiver_id,
+                      user_id=current_user.id, other_user_id=receiver_id)
         
         except Exception as e:
-            print(f"❌ send_friend_request error: {e}")
+            logger.error(f"❌ send_friend_request error: {e}")
             emit('error', f'Failed to send request: {str(e)}')
     
     @socketio.on('add_friend_direct')
@@ -90,10 +96,11 @@ def init_friend_events(socketio):
                 }
             }, room=room)
             
-            print(f"✅ Friends added: {current_user.id} <-> {friend_id}")
+            log_event(logger, "friends_added", "✅ Friends added: %s <-> %s", current_user.id, friend_id,
+                      user_id=current_user.id, other_user_id=friend_id)
         
         except Exception as e:
-            print(f"❌ add_friend_direct error: {e}")
+            logger.error(f"❌ add_friend_direct error: {e}")
             emit('error', f'Failed to add friend: {str(e)}')
     
     @socketio.on('accept_friend_request')
@@ -138,10 +145,11 @@ def init_friend_events(socketio):
                 'message': f'You are now friends with {friend.username}!'
             })
             
-            print(f"✅ Friend request accepted: {current_user.id} accepted {sender_id}")
+            log_event(logger, "friend_request_accepted", "✅ Friend request accepted: %s accepted %s", current_user.id, sender_id,
+                      user_id=current_user.id, other_user_id=sender_id)
         
         except Exception as e:
-            print(f"❌ accept_friend_request error: {e}")
+            logger.error(f"❌ accept_friend_request error: {e}")
             emit('error', f'Failed to accept request: {str(e)}')
     
     @socketio.on('reject_friend_request')
@@ -167,10 +175,11 @@ def init_friend_events(socketio):
                 'message': f'{current_user.username} rejected your friend request'
             }, room=f'user_{sender_id}')
             
-            print(f"✅ Friend request rejected: {current_user.id} rejected {sender_id}")
+            log_event(logger, "friend_request_rejected", "✅ Friend request rejected: %s rejected %s", current_user.id, sender_id,
+                      user_id=current_user.id, other_user_id=sender_id)
         
         except Exception as e:
-            print(f"❌ reject_friend_request error: {e}")
+            logger.error(f"❌ reject_friend_request error: {e}")
             emit('error', f'Failed to reject request: {str(e)}')
     
     @socketio.on('block_user')
@@ -187,10 +196,11 @@ def init_friend_events(socketio):
             current_user.block_user(user)
             emit('user_blocked', {'user_id': user_id})
             
-            print(f"✅ User blocked: {current_user.id} blocked {user_id}")
+            log_event(logger, "user_blocked", "✅ User blocked: %s blocked %s", current_user.id, user_id,
+                      user_id=current_user.id, other_user_id=user_id)
         
         except Exception as e:
-            print(f"❌ block_user error: {e}")
+            logger.error(f"❌ block_user error: {e}")
             emit('error', f'Failed to block user: {str(e)}')
     
     @socketio.on('unblock_user')
@@ -207,8 +217,9 @@ def init_friend_events(socketio):
             current_user.unblock_user(user)
             emit('user_unblocked', {'user_id': user_id})
             
-            print(f"✅ User unblocked: {current_user.id} unblocked {user_id}")
+            log_event(logger, "user_unblocked", "✅ User unblocked: %s unblocked %s", current_user.id, user_id,
+                      user_id=current_user.id, other_user_id=user_id)
         
         except Exception as e:
-            print(f"❌ unblock_user error: {e}")
+            logger.error(f"❌ unblock_user error: {e}")
             emit('error', f'Failed to unblock user: {str(e)}')
\ No newline at end of file
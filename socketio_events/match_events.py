@@ -10,75 +10,117 @@ MATCH EVENTS - FINAL PERFECT VERSION
 from flask_socketio import emit, join_room
 from flask_login import current_user
 from flask import request
-from models.models import db, User, MatchQueue, ActiveMatch
+from models.models import db, User, ActiveMatch
+from matching_engine import MatchQueueAudit, MatchReaper, QueueEntry, parse_search_prefs
+from match_state import MatchCoordinator, QUEUED
+from metrics import get_metrics
+from presence import get_presence
+from signaling import SignalingRelay
+from social_graph import get_social_graph
+from state_store import get_state_store
+from timers import get_timers
+from structured_logging import log_event
 import logging
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-# Track online users and their matches
-online_users = {}      # {user_id: socket_id}
-user_matches = {}      # {user_id: room_id}
-match_rooms = {}       # {room_id: {user1_id, user2_id}}
+# Online users, their matches and the waiting queue live in the state
+# store (shared between workers); the match_queue table is only an audit trail.
+# Each user's idle/queued/matched/ending transitions go through the coordinator.
+search_prefs = {}      # {user_id: last preferences sent with start_search}
+search_sockets = {}    # {user_id: socket that is searching / in the match}
+queue_audit = MatchQueueAudit()
+coordinator = None
+relay = None           # WebRTC signaling, routed in memory (no DB)
 
 def init_match_events(socketio):
     """Initialize all matching socket events"""
+    global coordinator, relay
     
-    # ===== HELPERS =====
+    store = get_state_store()
+    presence = get_presence()
+    social_graph = get_social_graph()
+    metrics = get_metrics()
     
-    def get_other_user_id(room_id, current_user_id):
-        """Get the other user's ID in a match"""
-        try:
-            match = ActiveMatch.query.filter_by(room_id=room_id).first()
-            if not match:
-                logger.warning(f"Match not found: {room_id}")
-                return None
-            
-            other_id = match.user2_id if match.user1_id == current_user_id else match.user1_id
-            logger.debug(f"Other user: {other_id}")
-            return other_id
-        except Exception as e:
-            logger.error(f"Error getting other user: {e}")
-            return None
+    def is_local(user_id):
+        """Does this process hold the user's socket?"""
+        if not store.shared:
+            return True
+        socket_id = store.get_socket(user_id)
+        return bool(socket_id) and socketio.server.manager.is_connected(socket_id, '/')
+    
+    coordinator = MatchCoordinator(store, is_local=is_local)
+    relay = SignalingRelay(socketio, store)
     
-    def get_other_socket(room_id, current_user_id):
-        """Get the other user's socket ID"""
-        other_id = get_other_user_id(room_id, current_user_id)
-        if other_id and other_id in online_users:
-            return online_users[other_id]
-        return None
+    # ===== TIMERS =====
+    
+    timers = get_timers()
+    config = timers.app.config if timers.app else {}
+    queue_timeout = config.get('MATCH_QUEUE_TIMEOUT_SECONDS', 600)
+    reconnect_grace = config.get('RECONNECT_GRACE_SECONDS', 10)
+    
+    def expire_search(user_id):
+        """Queue timeout: stop searching for a user nobody matched"""
+        if coordinator.cancel(user_id):
+            queue_audit.record('expired', user_id)
+            socket_id = search_sockets.get(user_id) or store.get_socket(user_id)
+            if socket_id:
+                socketio.emit("search_timeout",
+                            {"message": "No match found - click Start to try again"},
+                            to=socket_id)
+            log_event(logger, "search_timeout", "⏱️ Search timed out: User %s", user_id, user_id=user_id)
+    
+    def mark_offline(user_id):
+        """Reconnect grace ran out: the user really left"""
+        if not presence.is_online(user_id):
+            presence.mark(user_id, online=False)
+    
+    reaper = MatchReaper(
+        store,
+        history_retention=timedelta(days=config.get('MATCH_HISTORY_RETENTION_DAYS', 30))
+    )
+    timers.every(config.get('MATCH_REAP_INTERVAL_SECONDS', 60), reaper.reap_orphans,
+                 key='reap-matches', background=True)
+    timers.every(config.get('MATCH_COMPACT_INTERVAL_SECONDS', 3600), reaper.compact,
+                 key='compact-matches', background=True)
+    
+    # ===== HELPERS =====
     
     def clean_user_queue(user_id):
         """Remove user from queue"""
-        try:
-            MatchQueue.query.filter_by(user_id=user_id).delete()
-            db.session.commit()
-        except Exception as e:
-            logger.error(f"Queue cleanup error: {e}")
-            db.session.rollback()
+        timers.cancel(('queue', user_id))
+        if coordinator.cancel(user_id):
+            queue_audit.record('cancelled', user_id)
+    
+    def end_user_match(user_id, notify_event, message):
+        """End user_id's match (if any), telling the other user why"""
+        ended = coordinator.end_match(user_id)
+        if not ended:
+            return
+        room_id, other_user_id = ended
+        relay.close_room(room_id)
+        
+        # Notify other user
+        other_socket = None
+        if other_user_id:
+            other_socket = search_sockets.get(other_user_id) or store.get_socket(other_user_id)
+        if other_socket:
+            socketio.emit(notify_event, {"message": message}, to=other_socket)
+        
+        close_match_row(room_id)
     
-    def end_active_match(room_id):
-        """End a match completely"""
+    def close_match_row(room_id):
+        """Mark the match row ended (the store has already freed both users)"""
         try:
             match = ActiveMatch.query.filter_by(room_id=room_id).first()
             if match:
                 # Mark as ended
                 match.status = 'ended'
                 match.ended_at = datetime.utcnow()
-                
-                # Clean up queue for both users
-                MatchQueue.query.filter(
-                    MatchQueue.user_id.in_([match.user1_id, match.user2_id])
-                ).delete()
-                
                 db.session.commit()
-                logger.info(f"✅ Match ended: {room_id}")
-                
-                # Remove from tracking
-                user_matches.pop(match.user1_id, None)
-                user_matches.pop(match.user2_id, None)
-                match_rooms.pop(room_id, None)
+                log_event(logger, "match_ended", "✅ Match ended: %s", room_id, room=room_id)
         except Exception as e:
             logger.error(f"Error ending match: {e}")
             db.session.rollback()
@@ -93,16 +135,17 @@ def init_match_events(socketio):
         
         user_id = current_user.id
         socket_id = request.sid
-        online_users[user_id] = socket_id
+        first_session = presence.connect(user_id, socket_id)
         
-        try:
-            current_user.is_online = True
-            current_user.socket_id = socket_id
-            db.session.commit()
-            logger.info(f"✅ CONNECT: User {user_id} | Socket {socket_id}")
-        except Exception as e:
-            logger.error(f"Connect error: {e}")
-            db.session.rollback()
+        # Personal room: notifications and friends' presence deltas
+        join_room(f"user_{user_id}")
+        
+        # Back within the grace period: the DB never saw them go offline
+        if not timers.cancel(('offline', user_id)) and first_session:
+            presence.mark(user_id, online=True)
+        
+        log_event(logger, "socket_connect", "✅ CONNECT: User %s | Socket %s", user_id, socket_id,
+                  user_id=user_id, sid=socket_id)
     
     @socketio.on("disconnect")
     def on_disconnect():
@@ -110,187 +153,176 @@ def init_match_events(socketio):
             return
         
         user_id = current_user.id
-        socket_id = online_users.pop(user_id, None)
+        socket_id = request.sid
+        last_session = presence.disconnect(user_id, socket_id)
+        relay.drop_socket(socket_id)
         
-        logger.info(f"🔴 DISCONNECT: User {user_id} | Socket {socket_id}")
+        log_event(logger, "socket_disconnect", "🔴 DISCONNECT: User %s | Socket %s", user_id, socket_id,
+                  user_id=user_id, sid=socket_id)
         
-        # If user was in a match, end it
-        if user_id in user_matches:
-            room_id = user_matches[user_id]
-            other_id = get_other_user_id(room_id, user_id)
-            other_socket = get_other_socket(room_id, user_id)
-            
-            # Notify other user
-            if other_socket:
-                socketio.emit("stranger_disconnected", 
-                            {"message": "Stranger disconnected"},
-                            to=other_socket)
-                user_matches.pop(other_id, None)
+        # Closing another tab leaves the searching / matched one alone
+        if last_session or search_sockets.get(user_id) == socket_id:
+            # Leave the queue first, so nobody can pair them from here on
+            clean_user_queue(user_id)
             
-            end_active_match(room_id)
+            # If user was in a match, end it
+            end_user_match(user_id, "stranger_disconnected", "Stranger disconnected")
+            coordinator.forget(user_id)
+            search_sockets.pop(user_id, None)
+        
+        if last_session:
+            search_prefs.pop(user_id, None)
+            # Mark offline only if they do not reconnect within the grace period
+            timers.schedule(reconnect_grace, mark_offline, user_id, key=('offline', user_id))
+    
+    # ===== SEARCH (start and skip) =====
+    
+    def search_and_match(user_id, socket_id):
+        """Pair a queued user with the best waiting stranger, or leave them waiting"""
+        
+        def is_available(entry):
+            # Matched elsewhere meanwhile: drop them from the queue. Between
+            # two sockets (reconnecting): skip them, they stay queued
+            if store.get_room(entry.user_id):
+                return None
+            return bool(store.get_socket(entry.user_id))
+        
+        # Users blocked either way are masked out of the candidate pool
+        entry = QueueEntry.for_user(
+            current_user, socket_id, search_prefs.get(user_id),
+            blocked=social_graph.block_set(user_id),
+        )
+        
+        # ===== STEP 1+2: Take the best waiting user and claim both, or wait =====
+        logger.debug("  [1/4] Looking for match for %s...", user_id)
+        paired = coordinator.pair(entry, is_available)
         
-        # Clean up queue
-        clean_user_queue(user_id)
+        if paired is None:
+            if coordinator.state(user_id) == QUEUED:
+                queue_audit.record('waiting', user_id, entry)
+                timers.schedule(queue_timeout, expire_search, user_id, key=('queue', user_id))
+                logger.debug("  No match found yet - user %s will wait", user_id)
+            return
+        
+        partner, room_id = paired
+        other_user_id = partner.user_id
+        timers.cancel(('queue', user_id))
+        timers.cancel(('queue', other_user_id))
+        logger.debug("  [2/4] Claimed %s ↔ %s", user_id, other_user_id)
+        # The partner's searching tab, if it is still open
+        if partner.socket_id in presence.sockets(other_user_id):
+            other_socket = partner.socket_id
+        else:
+            other_socket = store.get_socket(other_user_id) or partner.socket_id
+        queue_audit.record('matched', other_user_id)
+        logger.debug("  ✅ Found match: %s", other_user_id)
         
-        # Update user status
+        # ===== STEP 3: Create match =====
+        logger.debug("  [3/4] Creating match %s ↔ %s...", user_id, other_user_id)
         try:
-            current_user.is_online = False
-            current_user.socket_id = None
+            # Create active match
+            active_match = ActiveMatch(
+                room_id=room_id,
+                user1_id=min(user_id, other_user_id),
+                user2_id=max(user_id, other_user_id),
+                status='active'
+            )
+            db.session.add(active_match)
             db.session.commit()
+            
+            logger.debug("  ✅ Match created: %s", room_id)
+            matched_at = time.time()
+            metrics.observe('openworld_time_to_match_seconds', None, matched_at - partner.enqueued_at)
+            metrics.observe('openworld_time_to_match_seconds', None, matched_at - entry.enqueued_at)
+            
         except Exception as e:
-            logger.error(f"Disconnect update error: {e}")
+            logger.error(f"  ❌ Match creation failed: {e}")
             db.session.rollback()
+            # Put the partner back at the front of the line
+            coordinator.abort_match(room_id, user_id, partner)
+            emit("error", "Failed to create match")
+            return
+        
+        # ===== STEP 4: Notify both users =====
+        logger.debug("  [4/4] Notifying users...")
+        
+        # Route signaling between the two sockets (no Socket.IO room to go stale)
+        generation = relay.open_room(room_id, socket_id, other_socket)
+        
+        # Get user names
+        try:
+            other_user = User.query.get(other_user_id)
+            other_name = other_user.full_name or other_user.username if other_user else "Stranger"
+            my_name = current_user.full_name or current_user.username
+        except:
+            other_name = "Stranger"
+            my_name = "You"
+        
+        # Determine who is initiator (the one who started the search)
+        # User who clicked Start is the initiator
+        my_role = "initiator"
+        other_role = "receiver"
+        
+        # Notify initiator (self)
+        emit("match_confirmed", {
+            "room": room_id,
+            "stranger_name": other_name,
+            "stranger_id": other_user_id,
+            "your_role": my_role,
+            "gen": generation
+        })
+        logger.debug("  📤 Sent match_confirmed to %s (%s)", user_id, my_role)
+        
+        # Notify receiver (other user)
+        socketio.emit("match_confirmed", {
+            "room": room_id,
+            "stranger_name": my_name,
+            "stranger_id": user_id,
+            "your_role": other_role,
+            "gen": generation
+        }, to=other_socket)
+        logger.debug("  📤 Sent match_confirmed to %s (%s)", other_user_id, other_role)
+        
+        log_event(logger, "match_created", "🎉 MATCH ACTIVE: %s", room_id,
+                  room=room_id, user_id=user_id, other_user_id=other_user_id)
     
     # ===== START SEARCH =====
     
     @socketio.on("start_search")
-    def on_start_search():
-        """User clicks 'Start' button - begin matching"""
+    def on_start_search(data=None):
+        """User clicks 'Start' button - begin matching
+
+        data may carry preferred_gender, min_age, max_age and
+        preferred_countries; they are remembered for later searches.
+        Fields that don't parse are dropped here, before the user is queued.
+        """
         user_id = current_user.id
         socket_id = request.sid
         
-        logger.info(f"\n🔍 START_SEARCH: User {user_id}\n")
+        if isinstance(data, dict):
+            search_prefs[user_id] = parse_search_prefs(data)
+        search_sockets[user_id] = socket_id
+        
+        log_event(logger, "search_started", "🔍 START_SEARCH: User %s", user_id, user_id=user_id)
         
         try:
             # Check if already in a match
-            if user_id in user_matches:
+            if store.get_room(user_id) or not coordinator.begin_search(user_id):
                 logger.warning(f"User {user_id} already in match")
                 emit("error", "Already in a match")
                 return
             
-            # Clean old queue entries
-            clean_user_queue(user_id)
-            
-            # ===== STEP 1: Add to queue =====
-            logger.info(f"  [1/4] Adding {user_id} to queue...")
-            try:
-                queue_entry = MatchQueue(
-                    user_id=user_id,
-                    socket_id=socket_id,
-                    status='waiting'
-                )
-                db.session.add(queue_entry)
-                db.session.commit()
-                logger.info(f"  ✅ Added to queue")
-            except Exception as e:
-                logger.error(f"  ❌ Queue add failed: {e}")
-                db.session.rollback()
-                emit("error", "Failed to add to queue")
-                return
-            
             # Tell user we're searching
             emit("status", "🔍 Searching for a stranger...")
             
-            # ===== STEP 2: Find waiting users =====
-            logger.info(f"  [2/4] Looking for match...")
-            try:
-                # Get all users waiting (except self)
-                waiting_list = MatchQueue.query.filter(
-                    MatchQueue.user_id != user_id,
-                    MatchQueue.status == 'waiting'
-                ).all()
-                
-                logger.info(f"  Found {len(waiting_list)} waiting users")
-                
-                if not waiting_list:
-                    logger.info(f"  No match found yet - user will wait")
-                    return
-                
-                # Pick first waiting user
-                other_queue = waiting_list[0]
-                other_user_id = other_queue.user_id
-                other_socket = online_users.get(other_user_id)
-                
-                if not other_socket:
-                    logger.warning(f"  User {other_user_id} not online - skipping")
-                    clean_user_queue(other_user_id)
-                    return
-                
-                logger.info(f"  ✅ Found match: {other_user_id}")
-                
-            except Exception as e:
-                logger.error(f"  ❌ Queue lookup failed: {e}")
-                db.session.rollback()
-                return
-            
-            # ===== STEP 3: Create match =====
-            logger.info(f"  [3/4] Creating match {user_id} ↔ {other_user_id}...")
-            try:
-                # Create room ID
-                room_id = f"match_{min(user_id, other_user_id)}_{max(user_id, other_user_id)}_{int(time.time() * 1000)}"
-                
-                # Update queue status
-                MatchQueue.query.filter_by(user_id=user_id).update({'status': 'matched'})
-                MatchQueue.query.filter_by(user_id=other_user_id).update({'status': 'matched'})
-                
-                # Create active match
-                active_match = ActiveMatch(
-                    room_id=room_id,
-                    user1_id=min(user_id, other_user_id),
-                    user2_id=max(user_id, other_user_id),
-                    status='active'
-                )
-                db.session.add(active_match)
-                db.session.commit()
-                
-                logger.info(f"  ✅ Match created: {room_id}")
-                
-            except Exception as e:
-                logger.error(f"  ❌ Match creation failed: {e}")
-                db.session.rollback()
-                emit("error", "Failed to create match")
-                return
-            
-            # ===== STEP 4: Notify both users =====
-            logger.info(f"  [4/4] Notifying users...")
-            
-            # Track the match
-            user_matches[user_id] = room_id
-            user_matches[other_user_id] = room_id
-            match_rooms[room_id] = {user_id, other_user_id}
-            
-            # Add both to Socket.IO room
-            join_room(room_id)
-            socketio.server.enter_room(other_socket, room_id)
-            
-            # Get user names
-            try:
-                other_user = User.query.get(other_user_id)
-                other_name = other_user.full_name or other_user.username if other_user else "Stranger"
-                my_name = current_user.full_name or current_user.username
-            except:
-                other_name = "Stranger"
-                my_name = "You"
-            
-            # Determine who is initiator (the one who started the search)
-            # User who clicked Start is the initiator
-            my_role = "initiator"
-            other_role = "receiver"
-            
-            # Notify initiator (self)
-            emit("match_confirmed", {
-                "room": room_id,
-                "stranger_name": other_name,
-                "stranger_id": other_user_id,
-                "your_role": my_role
-            })
-            logger.info(f"  📤 Sent match_confirmed to {user_id} ({my_role})")
-            
-            # Notify receiver (other user)
-            socketio.emit("match_confirmed", {
-                "room": room_id,
-                "stranger_name": my_name,
-                "stranger_id": user_id,
-                "your_role": other_role
-            }, to=other_socket)
-            logger.info(f"  📤 Sent match_confirmed to {other_user_id} ({other_role})")
-            
-            logger.info(f"\n🎉 MATCH ACTIVE: {room_id}\n")
+            search_and_match(user_id, socket_id)
             
         except Exception as e:
             logger.error(f"\n❌ CRITICAL ERROR in start_search: {e}\n", exc_info=True)
             db.session.rollback()
-            emit("error", str(e))
+            # Don't leave the user queued by a search that never ran
+            clean_user_queue(user_id)
+            emit("error", "Search failed - please try again")
     
     # ===== SKIP STRANGER =====
     
@@ -298,30 +330,20 @@ def init_match_events(socketio):
     def on_skip_stranger():
         """User clicks skip - end this match and find another"""
         user_id = current_user.id
-        logger.info(f"\n⏭️ SKIP_STRANGER: User {user_id}\n")
+        log_event(logger, "stranger_skipped", "⏭️ SKIP_STRANGER: User %s", user_id, user_id=user_id)
         
         try:
-            if user_id in user_matches:
-                room_id = user_matches.pop(user_id)
-                
-                # Notify other user
-                other_id = get_other_user_id(room_id, user_id)
-                other_socket = get_other_socket(room_id, user_id)
-                
-                if other_socket:
-                    socketio.emit("stranger_skipped",
-                                {"message": "Other user skipped"},
-                                to=other_socket)
-                    user_matches.pop(other_id, None)
-                
-                end_active_match(room_id)
+            end_user_match(user_id, "stranger_skipped", "Other user skipped")
             
-            # Auto-restart search
-            emit("status", "🔍 Searching for a stranger...")
-            logger.info(f"  Auto-restarting search for {user_id}")
+            # Leaving the room and queueing again is one transition
+            if coordinator.finish_ending(user_id, requeue=True) != QUEUED:
+                return
             
-            # Call start_search again
-            on_start_search()
+            # Auto-restart search (the last few partners are filtered out)
+            emit("status", "🔍 Searching for a stranger...")
+            logger.debug("  Auto-restarting search for %s", user_id)
+            search_sockets[user_id] = request.sid
+            search_and_match(user_id, request.sid)
             
         except Exception as e:
             logger.error(f"❌ Skip error: {e}")
@@ -333,23 +355,11 @@ def init_match_events(socketio):
     def on_end_chat():
         """User clicks end - stop the match"""
         user_id = current_user.id
-        logger.info(f"\n🛑 END_CHAT: User {user_id}\n")
+        log_event(logger, "chat_ended", "🛑 END_CHAT: User %s", user_id, user_id=user_id)
         
         try:
-            if user_id in user_matches:
-                room_id = user_matches.pop(user_id)
-                
-                # Notify other user
-                other_id = get_other_user_id(room_id, user_id)
-                other_socket = get_other_socket(room_id, user_id)
-                
-                if other_socket:
-                    socketio.emit("stranger_disconnected",
-                                {"message": "Other user ended chat"},
-                                to=other_socket)
-                    user_matches.pop(other_id, None)
-                
-                end_active_match(room_id)
+            end_user_match(user_id, "stranger_disconnected", "Other user ended chat")
+            coordinator.finish_ending(user_id)
             
             # Clean queue
             clean_user_queue(user_id)
@@ -361,49 +371,40 @@ def init_match_events(socketio):
             db.session.rollback()
     
     # ===== WEBRTC RELAY =====
+    # Signals go straight to the peer's socket; the room and generation
+    # must be the sender's current match or the signal is dropped
     
     @socketio.on("webrtc_offer")
     def on_webrtc_offer(data):
         """Relay WebRTC offer from one user to another"""
-        room = data.get("room")
-        
         try:
-            if room and room in match_rooms:
-                logger.debug(f"📤 Relaying WebRTC offer in {room}")
-                socketio.emit("webrtc_offer",
-                            {"offer": data.get("offer")},
-                            to=room,
-                            skip_sid=request.sid)
+            if relay.relay("webrtc_offer", request.sid, current_user.id, data, "offer"):
+                logger.debug(f"📤 Relayed WebRTC offer in {data.get('room')}")
         except Exception as e:
             logger.error(f"Error relaying offer: {e}")
     
     @socketio.on("webrtc_answer")
     def on_webrtc_answer(data):
         """Relay WebRTC answer from one user to another"""
-        room = data.get("room")
-        
         try:
-            if room and room in match_rooms:
-                logger.debug(f"📥 Relaying WebRTC answer in {room}")
-                socketio.emit("webrtc_answer",
-                            {"answer": data.get("answer")},
-                            to=room,
-                            skip_sid=request.sid)
+            if relay.relay("webrtc_answer", request.sid, current_user.id, data, "answer"):
+                logger.debug(f"📥 Relayed WebRTC answer in {data.get('room')}")
         except Exception as e:
             logger.error(f"Error relaying answer: {e}")
     
     @socketio.on("webrtc_ice_candidate")
     def on_webrtc_ice_candidate(data):
-        """Relay ICE candidate from one user to another"""
-        room = data.get("room")
-        
+        """Relay ICE candidate(s) - batched into webrtc_ice_candidates frames"""
+        try:
+            relay.relay_ice(request.sid, current_user.id, data)
+        except Exception as e:
+            logger.error(f"Error relaying ICE: {e}")
+    
+    @socketio.on("webrtc_ice_candidates")
+    def on_webrtc_ice_candidates(data):
+        """Relay a client-side batch of ICE candidates"""
         try:
-            if room and room in match_rooms:
-                logger.debug(f"🧊 Relaying ICE candidate in {room}")
-                socketio.emit("webrtc_ice_candidate",
-                            {"candidate": data.get("candidate")},
-                            to=room,
-                            skip_sid=request.sid)
+            relay.relay_ice(request.sid, current_user.id, data)
         except Exception as e:
             logger.error(f"Error relaying ICE: {e}")
     
@@ -416,7 +417,7 @@ def init_match_events(socketio):
         room = data.get("room")
         stranger_id = data.get("stranger_id")
         
-        logger.info(f"❤️ ADD_FRIEND: {user_id} → {stranger_id}")
+        logger.debug("❤️ ADD_FRIEND: %s → %s", user_id, stranger_id)
         
         try:
             stranger = User.query.get(stranger_id)
@@ -428,15 +429,17 @@ def init_match_events(socketio):
             if not current_user.is_friend_with(stranger):
                 current_user.add_friend(stranger)
                 db.session.commit()
-                logger.info(f"✅ Friends: {user_id} ↔ {stranger_id}")
+                log_event(logger, "friends_added", "✅ Friends: %s ↔ %s", user_id, stranger_id,
+                          user_id=user_id, other_user_id=stranger_id)
                 
                 # Notify other user
-                if stranger_id in online_users:
+                stranger_socket = store.get_socket(stranger_id)
+                if stranger_socket:
                     socketio.emit("friend_added_notification", {
                         "from_name": current_user.full_name or current_user.username
-                    }, to=online_users[stranger_id])
+                    }, to=stranger_socket)
             else:
-                logger.info(f"Already friends: {user_id} ↔ {stranger_id}")
+                logger.debug("Already friends: %s ↔ %s", user_id, stranger_id)
             
             emit("status", f"✅ Added {stranger.full_name or stranger.username}!")
             
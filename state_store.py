@@ -0,0 +1,587 @@
+"""
+STATE STORE - Matchmaking and presence state shared between workers
+
+Socket handlers keep three maps: user -> socket, user -> room and
+room -> members, plus the queue of waiting users and every user's set of
+open sessions (one per tab / device). The in-process backend
+keeps them in dicts (one worker); the Redis backend keeps them in a
+Redis-protocol server so several workers or hosts can pair users and find
+each other's sockets. Both offer the two atomic operations pairing needs:
+pop a partner from the queue, and claim both users for a room.
+"""
+
+import itertools
+import json
+import logging
+import os
+import threading
+import uuid
+
+from matching_engine import MatchmakingQueue, QueueEntry
+
+try:
+    import redis
+except ImportError:  # only needed for the shared backend
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """Interface shared by all backends"""
+
+    # True when other processes read and write the same state
+    shared = False
+
+    # ===== PRESENCE =====
+
+    def set_socket(self, user_id, socket_id):
+        raise NotImplementedError
+
+    def get_socket(self, user_id):
+        raise NotImplementedError
+
+    def remove_socket(self, user_id, socket_id=None):
+        """Forget the user's socket (only if it is still socket_id, when given)"""
+        raise NotImplementedError
+
+    def add_session(self, user_id, socket_id):
+        """Register one more open socket, returns the user's session count"""
+        raise NotImplementedError
+
+    def remove_session(self, user_id, socket_id):
+        """Drop a socket, returns the user's remaining session count
+
+        If it was the user's current socket, another open one takes over.
+        """
+        raise NotImplementedError
+
+    def sessions(self, user_id):
+        """All open sockets of a user"""
+        raise NotImplementedError
+
+    def online_count(self):
+        """Users with at least one open socket"""
+        raise NotImplementedError
+
+    # ===== MATCHES =====
+
+    def get_room(self, user_id):
+        raise NotImplementedError
+
+    def room_members(self, room_id):
+        """Return (user1_id, user2_id) for an active room, or None"""
+        raise NotImplementedError
+
+    def claim_pair(self, user1_id, user2_id, room_id):
+        """Atomically put both users in room_id if neither is in a room"""
+        raise NotImplementedError
+
+    def release_room(self, room_id):
+        """Forget a room and its members' assignments, returns the members"""
+        raise NotImplementedError
+
+    def next_generation(self):
+        """Monotonic room generation number, unique across workers"""
+        raise NotImplementedError
+
+    def room_count(self):
+        """Number of active match rooms"""
+        raise NotImplementedError
+
+    def live_rooms(self, room_ids):
+        """The subset of room_ids that are still active"""
+        return {room_id for room_id in room_ids if self.room_members(room_id)}
+
+    def other_member(self, room_id, user_id):
+        members = self.room_members(room_id)
+        if not members or user_id not in members:
+            return None
+        return members[1] if members[0] == user_id else members[0]
+
+    # ===== QUEUE =====
+
+    def match_or_enqueue(self, entry, is_available=None):
+        """Atomically pop a partner for entry, or queue entry if none fits
+
+        is_available(partner) decides about each popped partner: True takes
+        them, False skips them for now (they go back to the front of the
+        queue once the search is over, e.g. a user between two sockets),
+        None drops them (they stopped searching or were matched elsewhere).
+        """
+        raise NotImplementedError
+
+    def requeue(self, entry):
+        raise NotImplementedError
+
+    def cancel(self, user_id):
+        """Remove a user from the queue, returns True if they were waiting"""
+        raise NotImplementedError
+
+    def queue_length(self):
+        raise NotImplementedError
+
+    # ===== IDS =====
+
+    def next_message_id(self):
+        """Chat message id, increasing and unique across workers"""
+        raise NotImplementedError
+
+    def seed_message_ids(self, floor):
+        """Make sure ids handed out from now on are above floor"""
+        raise NotImplementedError
+
+    def next_sequence(self, conversation):
+        """Next sequence number within one conversation"""
+        raise NotImplementedError
+
+    def seed_sequence(self, conversation, floor):
+        """Make sure the conversation's next sequence numbers are above floor"""
+        raise NotImplementedError
+
+    def seed_sequences(self, floors):
+        """seed_sequence for many conversations at once ({conversation: floor})"""
+        raise NotImplementedError
+
+
+class InMemoryStateStore(StateStore):
+    """Single-process backend: plain dicts and a MatchmakingQueue"""
+
+    def __init__(self):
+        self.sockets = {}      # {user_id: socket_id} (latest session)
+        self.user_sessions = {}  # {user_id: {socket_id, ...}}
+        self.user_rooms = {}   # {user_id: room_id}
+        self.rooms = {}        # {room_id: (user1_id, user2_id)}
+        self.queue = MatchmakingQueue()
+        self._generations = itertools.count(1)
+        self._message_id = 0
+        self._sequences = {}   # {conversation: last seq}
+        self._lock = threading.Lock()
+
+    def set_socket(self, user_id, socket_id):
+        self.sockets[user_id] = socket_id
+
+    def get_socket(self, user_id):
+        return self.sockets.get(user_id)
+
+    def remove_socket(self, user_id, socket_id=None):
+        with self._lock:
+            if socket_id is None or self.sockets.get(user_id) == socket_id:
+                self.sockets.pop(user_id, None)
+
+    def add_session(self, user_id, socket_id):
+        with self._lock:
+            sessions = self.user_sessions.setdefault(user_id, set())
+            sessions.add(socket_id)
+            self.sockets[user_id] = socket_id
+            return len(sessions)
+
+    def remove_session(self, user_id, socket_id):
+        with self._lock:
+            sessions = self.user_sessions.get(user_id, set())
+            sessions.discard(socket_id)
+            if not sessions:
+                self.user_sessions.pop(user_id, None)
+                if self.sockets.get(user_id) == socket_id:
+                    del self.sockets[user_id]
+            elif self.sockets.get(user_id) == socket_id:
+                self.sockets[user_id] = next(iter(sessions))
+            return len(sessions)
+
+    def sessions(self, user_id):
+        return set(self.user_sessions.get(user_id, ()))
+
+    def online_count(self):
+        return len(self.user_sessions)
+
+    def get_room(self, user_id):
+        return self.user_rooms.get(user_id)
+
+    def room_members(self, room_id):
+        return self.rooms.get(room_id)
+
+    def claim_pair(self, user1_id, user2_id, room_id):
+        with self._lock:
+            if user1_id in self.user_rooms or user2_id in self.user_rooms:
+                return False
+            self.user_rooms[user1_id] = room_id
+            self.user_rooms[user2_id] = room_id
+            self.rooms[room_id] = (user1_id, user2_id)
+            return True
+
+    def release_room(self, room_id):
+        with self._lock:
+            members = self.rooms.pop(room_id, None)
+            for user_id in members or ():
+                if self.user_rooms.get(user_id) == room_id:
+                    del self.user_rooms[user_id]
+            return members
+
+    def room_count(self):
+        return len(self.rooms)
+
+    def next_generation(self):
+        return next(self._generations)
+
+    def next_message_id(self):
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def seed_message_ids(self, floor):
+        with self._lock:
+            self._message_id = max(self._message_id, floor)
+
+    def next_sequence(self, conversation):
+        with self._lock:
+            seq = self._sequences.get(conversation, 0) + 1
+            self._sequences[conversation] = seq
+            return seq
+
+    def seed_sequence(self, conversation, floor):
+        with self._lock:
+            self._sequences[conversation] = max(self._sequences.get(conversation, 0), floor)
+
+    def seed_sequences(self, floors):
+        with self._lock:
+            for conversation, floor in floors.items():
+                self._sequences[conversation] = max(self._sequences.get(conversation, 0), floor)
+
+    def match_or_enqueue(self, entry, is_available=None):
+        return self.queue.match_or_enqueue(entry, is_available)
+
+    def requeue(self, entry):
+        self.queue.requeue(entry)
+
+    def cancel(self, user_id):
+        return self.queue.cancel(user_id) is not None
+
+    def queue_length(self):
+        return len(self.queue)
+
+
+class RedisStateStore(StateStore):
+    """Shared backend on any Redis-protocol server
+
+    client may be any redis-py compatible client (e.g. a local stand-in
+    in tests); otherwise one is created from url.
+
+    Keys (all under prefix):
+      sockets       hash  user_id -> socket_id (latest session)
+      sessions:<id> set   every open socket of one user
+      user_rooms    hash  user_id -> room_id
+      rooms         hash  room_id -> "user1_id,user2_id"
+      room_gen      int   last room generation handed out
+      message_id    int   last chat message id handed out
+      message_seq   hash  conversation -> last sequence number
+      queue         list  "user_id:token" in arrival order
+      queue:entries hash  user_id -> JSON entry (with its current token)
+
+    Cancelling only deletes the entry; list items whose token no longer
+    matches are dropped lazily by the next search that walks past them.
+    """
+
+    shared = True
+
+    # How far into the queue one search looks for a compatible partner
+    SCAN_LIMIT = 200
+
+    def __init__(self, url=None, client=None, prefix='openworld'):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for STATE_STORE_URL")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.k_sockets = f"{prefix}:sockets"
+        self.k_sessions = f"{prefix}:sessions"
+        self.k_user_rooms = f"{prefix}:user_rooms"
+        self.k_rooms = f"{prefix}:rooms"
+        self.k_room_gen = f"{prefix}:room_gen"
+        self.k_message_id = f"{prefix}:message_id"
+        self.k_message_seq = f"{prefix}:message_seq"
+        self.k_queue = f"{prefix}:queue"
+        self.k_entries = f"{prefix}:queue:entries"
+
+    # ===== PRESENCE =====
+
+    def set_socket(self, user_id, socket_id):
+        self.client.hset(self.k_sockets, user_id, socket_id)
+
+    def get_socket(self, user_id):
+        return _str(self.client.hget(self.k_sockets, user_id))
+
+    def remove_socket(self, user_id, socket_id=None):
+        if socket_id is None:
+            self.client.hdel(self.k_sockets, user_id)
+            return
+
+        def txn(pipe):
+            current = _str(pipe.hget(self.k_sockets, user_id))
+            pipe.multi()
+            if current == socket_id:
+                pipe.hdel(self.k_sockets, user_id)
+
+        self.client.transaction(txn, self.k_sockets)
+
+    def add_session(self, user_id, socket_id):
+        pipe = self.client.pipeline()
+        pipe.sadd(f"{self.k_sessions}:{user_id}", socket_id)
+        pipe.hset(self.k_sockets, user_id, socket_id)
+        pipe.scard(f"{self.k_sessions}:{user_id}")
+        return pipe.execute()[-1]
+
+    def remove_session(self, user_id, socket_id):
+        key = f"{self.k_sessions}:{user_id}"
+
+        def txn(pipe):
+            remaining = {_str(s) for s in pipe.smembers(key)} - {socket_id}
+            current = _str(pipe.hget(self.k_sockets, user_id))
+            pipe.multi()
+            pipe.srem(key, socket_id)
+            if current == socket_id:
+                if remaining:
+                    pipe.hset(self.k_sockets, user_id, next(iter(remaining)))
+                else:
+                    pipe.hdel(self.k_sockets, user_id)
+            return len(remaining)
+
+        return self.client.transaction(txn, key, self.k_sockets, value_from_callable=True)
+
+    def sessions(self, user_id):
+        return {_str(s) for s in self.client.smembers(f"{self.k_sessions}:{user_id}")}
+
+    def online_count(self):
+        return self.client.hlen(self.k_sockets)
+
+    # ===== MATCHES =====
+
+    def get_room(self, user_id):
+        return _str(self.client.hget(self.k_user_rooms, user_id))
+
+    def room_members(self, room_id):
+        return _members(self.client.hget(self.k_rooms, room_id))
+
+    def claim_pair(self, user1_id, user2_id, room_id):
+        def txn(pipe):
+            taken = pipe.hmget(self.k_user_rooms, [user1_id, user2_id])
+            if any(taken):
+                pipe.multi()
+                return False
+            pipe.multi()
+            pipe.hset(self.k_user_rooms, mapping={user1_id: room_id, user2_id: room_id})
+            pipe.hset(self.k_rooms, room_id, f"{user1_id},{user2_id}")
+            return True
+
+        return self.client.transaction(txn, self.k_user_rooms, value_from_callable=True)
+
+    def release_room(self, room_id):
+        def txn(pipe):
+            members = _members(pipe.hget(self.k_rooms, room_id))
+            current = pipe.hmget(self.k_user_rooms, list(members)) if members else []
+            pipe.multi()
+            pipe.hdel(self.k_rooms, room_id)
+            for user_id, room in zip(members or (), current):
+                if _str(room) == room_id:
+                    pipe.hdel(self.k_user_rooms, user_id)
+            return members
+
+        return self.client.transaction(
+            txn, self.k_rooms, self.k_user_rooms, value_from_callable=True
+        )
+
+    def room_count(self):
+        return self.client.hlen(self.k_rooms)
+
+    def next_generation(self):
+        return int(self.client.incr(self.k_room_gen))
+
+    def next_message_id(self):
+        return int(self.client.incr(self.k_message_id))
+
+    def seed_message_ids(self, floor):
+        def txn(pipe):
+            current = int(pipe.get(self.k_message_id) or 0)
+            pipe.multi()
+            if current < floor:
+                pipe.set(self.k_message_id, floor)
+
+        self.client.transaction(txn, self.k_message_id)
+
+    def next_sequence(self, conversation):
+        return int(self.client.hincrby(self.k_message_seq, conversation, 1))
+
+    def seed_sequence(self, conversation, floor):
+        def txn(pipe):
+            current = int(pipe.hget(self.k_message_seq, conversation) or 0)
+            pipe.multi()
+            if current < floor:
+                pipe.hset(self.k_message_seq, conversation, floor)
+
+        self.client.transaction(txn, self.k_message_seq)
+
+    def seed_sequences(self, floors):
+        conversations = list(floors)
+        if not conversations:
+            return
+
+        def txn(pipe):
+            current = pipe.hmget(self.k_message_seq, conversations)
+            raise_to = {
+                conversation: floors[conversation]
+                for conversation, value in zip(conversations, current)
+                if int(value or 0) < floors[conversation]
+            }
+            pipe.multi()
+            if raise_to:
+                pipe.hset(self.k_message_seq, mapping=raise_to)
+
+        self.client.transaction(txn, self.k_message_seq)
+
+    def live_rooms(self, room_ids):
+        room_ids = list(room_ids)
+        if not room_ids:
+            return set()
+        values = self.client.hmget(self.k_rooms, room_ids)
+        return {room_id for room_id, value in zip(room_ids, values) if value}
+
+    # ===== QUEUE =====
+
+    def match_or_enqueue(self, entry, is_available=None):
+        self.cancel(entry.user_id)
+        skipped = []
+        try:
+            while True:
+                partner = self.client.transaction(
+                    lambda pipe: self._pop_or_push(pipe, entry),
+                    self.k_queue, self.k_entries,
+                    value_from_callable=True
+                )
+                if partner is None:
+                    return None
+                available = True if is_available is None else is_available(partner)
+                if available:
+                    return partner
+                if available is False:
+                    skipped.append(partner)
+        finally:
+            # Back to the front, in their original order
+            for partner in reversed(skipped):
+                self.requeue(partner)
+
+    def requeue(self, entry):
+        token = uuid.uuid4().hex[:12]
+        pipe = self.client.pipeline()
+        pipe.hset(self.k_entries, entry.user_id, _dump_entry(entry, token))
+        pipe.lpush(self.k_queue, f"{entry.user_id}:{token}")
+        pipe.execute()
+
+    def cancel(self, user_id):
+        return bool(self.client.hdel(self.k_entries, user_id))
+
+    def queue_length(self):
+        return self.client.hlen(self.k_entries)
+
+    def _pop_or_push(self, pipe, entry):
+        """WATCHed transaction body: take a partner, or queue entry"""
+        items = [_str(i) for i in pipe.lrange(self.k_queue, 0, self.SCAN_LIMIT - 1)]
+        user_ids = [item.split(':', 1)[0] for item in items]
+        raw = pipe.hmget(self.k_entries, user_ids) if user_ids else []
+
+        stale = []
+        partner = None
+        partner_item = None
+        for item, data in zip(items, raw):
+            data = _str(data)
+            if data is None:
+                stale.append(item)
+                continue
+            candidate, token = _load_entry(data)
+            if item != f"{candidate.user_id}:{token}":
+                stale.append(item)
+                continue
+            if candidate.user_id == entry.user_id:
+                continue
+            if entry.accepts(candidate) and candidate.accepts(entry) and \
+                    not entry.excludes(candidate) and not entry.recently_met(candidate):
+                partner, partner_item = candidate, item
+                break
+
+        pipe.multi()
+        for item in stale:
+            pipe.lrem(self.k_queue, 1, item)
+        if partner is not None:
+            pipe.lrem(self.k_queue, 1, partner_item)
+            pipe.hdel(self.k_entries, partner.user_id)
+        else:
+            token = uuid.uuid4().hex[:12]
+            pipe.hset(self.k_entries, entry.user_id, _dump_entry(entry, token))
+            pipe.rpush(self.k_queue, f"{entry.user_id}:{token}")
+        return partner
+
+
+def _str(value):
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+def _members(value):
+    value = _str(value)
+    if not value:
+        return None
+    user1_id, user2_id = value.split(',')
+    return int(user1_id), int(user2_id)
+
+
+def _dump_entry(entry, token):
+    return json.dumps({
+        'token': token,
+        'user_id': entry.user_id,
+        'socket_id': entry.socket_id,
+        'enqueued_at': entry.enqueued_at,
+        'gender': entry.gender,
+        'age': entry.age,
+        'country': entry.country,
+        'interests': sorted(entry.interests),
+        'reputation': entry.reputation,
+        'preferred_gender': entry.preferred_gender,
+        'min_age': entry.min_age,
+        'max_age': entry.max_age,
+        'preferred_countries': sorted(entry.preferred_countries or ()),
+        'recent': sorted(entry.recent),
+        'blocked': sorted(entry.blocked),
+    })
+
+
+def _load_entry(data):
+    fields = json.loads(data)
+    token = fields.pop('token')
+    enqueued_at = fields.pop('enqueued_at')
+    user_id = fields.pop('user_id')
+    socket_id = fields.pop('socket_id')
+    entry = QueueEntry(user_id, socket_id, **fields)
+    entry.enqueued_at = enqueued_at
+    return entry, token
+
+
+# ===== GLOBAL INSTANCE =====
+
+_store = None
+
+
+def init_state_store(url=None):
+    """Create the process-wide store: Redis when url is set, else in-memory"""
+    global _store
+    if url:
+        _store = RedisStateStore(url=url)
+        logger.info("✅ Shared state store: Redis")
+    else:
+        _store = InMemoryStateStore()
+        logger.info("✅ State store: in-process")
+    return _store
+
+
+def get_state_store():
+    if _store is None:
+        init_state_store(os.getenv('STATE_STORE_URL'))
+    return _store
@@ -32,13 +32,14 @@ document.addEventListener("DOMContentLoaded", () => {
     socket.emit('join_chat', { room: room });
     console.log(`✅ Joined room: ${room}`);
 
-    // ================= RECEIVE MESSAGE =================
-    socket.on('receive_message', (data) => {
-        console.log("📥 Message received:", data);
-        
+    // ================= RENDER MESSAGE =================
+    function buildMessageElement(data) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${data.sender_id === currentUserId ? 'sent' : 'received'}`;
         messageDiv.dataset.messageId = data.id;
+        if (data.seq) {
+            messageDiv.dataset.seq = data.seq;
+        }
 
         let content = '<div class="message-content">';
 
@@ -58,31 +59,127 @@ document.addEventListener("DOMContentLoaded", () => {
         content += '</div>';
 
         messageDiv.innerHTML = content;
-        messagesContainer.appendChild(messageDiv);
-        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageDiv;
+    }
+
+    // ================= RECEIVE MESSAGE =================
+    // Highest per-conversation sequence number rendered so far
+    let lastSeq = 0;
+    messagesContainer.querySelectorAll('[data-seq]').forEach((el) => {
+        lastSeq = Math.max(lastSeq, parseInt(el.dataset.seq) || 0);
+    });
+
+    function appendMessage(data) {
+        if (messagesContainer.querySelector(`[data-message-id="${data.id}"]`)) {
+            return;  // already shown (live emit and sync can overlap)
+        }
+        messagesContainer.appendChild(buildMessageElement(data));
+        lastSeq = Math.max(lastSeq, data.seq || 0);
 
         // Mark as read if we're the receiver
         if (data.sender_id !== currentUserId && data.id) {
-            setTimeout(() => {
-                socket.emit('mark_as_read', { message_id: data.id });
-            }, 500);
+            scheduleReadAck(data.id);
+        }
+    }
+
+    socket.on('receive_message', (data) => {
+        console.log("📥 Message received:", data);
+        if (data.conversation_id && data.conversation_id !== room) return;
+
+        appendMessage(data);
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    });
+
+    // ================= RECONNECT CATCH-UP =================
+    // A new socket has to rejoin the room and fetch what it missed
+    socket.on('connect', () => {
+        socket.emit('join_chat', { room: room });
+        socket.emit('sync', { conversation_id: room, since_seq: lastSeq });
+    });
+
+    socket.on('sync_result', (data) => {
+        if (data.conversation_id !== room) return;
+        console.log(`🔁 Synced ${data.messages.length} missed messages`);
+        data.messages.forEach(appendMessage);
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        if (data.has_more) {
+            socket.emit('sync', { conversation_id: room, since_seq: lastSeq });
         }
     });
 
+    // ================= READ ACKS =================
+    // One mark_read per burst, acknowledging everything up to the newest id
+    let readUpTo = 0;
+    let readAckTimer = null;
+
+    function scheduleReadAck(messageId) {
+        readUpTo = Math.max(readUpTo, messageId);
+        if (readAckTimer) return;
+        readAckTimer = setTimeout(() => {
+            readAckTimer = null;
+            socket.emit('mark_read', { friend_id: friendId, up_to: readUpTo });
+        }, 500);
+    }
+
+    // ================= SCROLL-BACK HISTORY =================
+    // Only the latest page is rendered; older pages load near the top
+    let nextCursor = messagesContainer ? messagesContainer.dataset.nextCursor : '';
+    let loadingHistory = false;
+
+    async function loadOlderMessages() {
+        if (!nextCursor || loadingHistory) return;
+        loadingHistory = true;
+
+        try {
+            const response = await fetch(`/api/messages/${friendId}?before=${encodeURIComponent(nextCursor)}`);
+            const data = await response.json();
+            if (!response.ok) {
+                console.error("❌ History error:", data.error);
+                return;
+            }
+
+            // Prepend without moving what the user is looking at
+            const previousHeight = messagesContainer.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            data.messages.forEach((msg) => fragment.appendChild(buildMessageElement(msg)));
+            messagesContainer.insertBefore(fragment, messagesContainer.firstChild);
+            messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+
+            nextCursor = data.next_cursor || '';
+            console.log(`📜 Loaded ${data.messages.length} older messages`);
+        } catch (error) {
+            console.error('❌ History load error:', error);
+        } finally {
+            loadingHistory = false;
+        }
+    }
+
+    if (messagesContainer) {
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        messagesContainer.addEventListener('scroll', () => {
+            if (messagesContainer.scrollTop < 100) {
+                loadOlderMessages();
+            }
+        });
+    }
+
     // ================= CHAT LIST UPDATE =================
-    socket.on('chat_list_update', () => {
-        console.log("🔄 Chat list needs update");
-        // Reload the page to get updated friend list
-        // Or emit an event to update counts dynamically
+    socket.on('chat_list_update', (data) => {
+        // Friends list rows are updated in place by notification.js
+        console.log("🔄 Conversation update:", data.conversation_id);
     });
 
     // ================= MESSAGE READ STATUS =================
     socket.on('message_read', (data) => {
-        console.log("✓ Message read:", data.message_id);
-        const msgEl = document.querySelector(`[data-message-id="${data.message_id}"]`);
-        if (msgEl) {
-            msgEl.classList.add('message-read');
-        }
+        // Sent to user_<id>, so it covers every conversation: only this one's
+        if (data.conversation_id !== room) return;
+        const readUpTo = data.read_up_to || data.message_id;
+        console.log("✓ Messages read up to:", readUpTo);
+        document.querySelectorAll('.message.sent[data-message-id]').forEach((msgEl) => {
+            if (parseInt(msgEl.dataset.messageId) <= readUpTo) {
+                msgEl.classList.add('message-read');
+            }
+        });
     });
 
     // ================= SEND MESSAGE =================
@@ -10,6 +10,9 @@ let socket = null;
 let localStream = null;
 let peerConnection = null;
 let roomId = null;
+let roomGen = null;           // generation of the current room (from match_confirmed)
+let pendingIce = [];          // local ICE candidates waiting to go out as one frame
+let iceFlushTimer = null;
 let isSearching = false;
 let strangerName = null;
 let strangerId = null;
@@ -38,6 +41,9 @@ const servers = {
     ]
 };
 
+// Local ICE candidates gathered within this window are sent together
+const ICE_BATCH_MS = 30;
+
 // ===== INITIALIZATION =====
 
 function init() {
@@ -210,11 +216,10 @@ function createPeerConnection() {
     // Handle ICE candidates
     peerConnection.onicecandidate = (event) => {
         if (event.candidate && roomId) {
-            console.log("🧊 Sending ICE candidate");
-            socket.emit("webrtc_ice_candidate", {
-                room: roomId,
-                candidate: event.candidate
-            });
+            pendingIce.push(event.candidate);
+            if (!iceFlushTimer) {
+                iceFlushTimer = setTimeout(flushIceCandidates, ICE_BATCH_MS);
+            }
         }
     };
     
@@ -232,6 +237,26 @@ function createPeerConnection() {
     };
 }
 
+function flushIceCandidates() {
+    iceFlushTimer = null;
+    if (!roomId || pendingIce.length === 0) {
+        pendingIce = [];
+        return;
+    }
+    console.log(`🧊 Sending ${pendingIce.length} ICE candidate(s)`);
+    socket.emit("webrtc_ice_candidates", {
+        room: roomId,
+        gen: roomGen,
+        candidates: pendingIce
+    });
+    pendingIce = [];
+}
+
+// Signals from an earlier room (e.g. a skipped stranger) are ignored
+function isCurrentRoom(data) {
+    return data && data.room === roomId && (data.gen == null || data.gen === roomGen);
+}
+
 function cleanupPeerConnection() {
     console.log("Cleaning up peer connection...");
     
@@ -244,7 +269,13 @@ function cleanupPeerConnection() {
         remoteVideo.srcObject = null;
     }
     
+    if (iceFlushTimer) {
+        clearTimeout(iceFlushTimer);
+        iceFlushTimer = null;
+    }
+    pendingIce = [];
     roomId = null;
+    roomGen = null;
 }
 
 async function createAndSendOffer() {
@@ -258,6 +289,7 @@ async function createAndSendOffer() {
         
         socket.emit("webrtc_offer", {
             room: roomId,
+            gen: roomGen,
             offer: peerConnection.localDescription
         });
         
@@ -294,7 +326,8 @@ async function findMatch() {
         
         // Emit to backend
         console.log("📤 Emitting: start_search");
-        socket.emit("start_search");
+        // Optional filters: preferred_gender, min_age, max_age, preferred_countries
+        socket.emit("start_search", window.matchPreferences || {});
         
         console.log("✅ Search started\n");
         
@@ -358,6 +391,7 @@ function setupSocketListeners() {
         console.log("\n🎉 MATCH_CONFIRMED\n", data, "\n");
         
         roomId = data.room;
+        roomGen = data.gen;
         strangerName = data.stranger_name;
         strangerId = data.stranger_id;
         isSearching = false;
@@ -381,6 +415,7 @@ function setupSocketListeners() {
     // ===== WEBRTC OFFER =====
     socket.on("webrtc_offer", async (data) => {
         console.log("📥 Received WebRTC offer");
+        if (!isCurrentRoom(data)) return;
         
         try {
             if (!peerConnection) {
@@ -397,6 +432,7 @@ function setupSocketListeners() {
             console.log("✅ Sending WebRTC answer");
             socket.emit("webrtc_answer", {
                 room: roomId,
+                gen: roomGen,
                 answer: peerConnection.localDescription
             });
         } catch (error) {
@@ -407,6 +443,7 @@ function setupSocketListeners() {
     // ===== WEBRTC ANSWER =====
     socket.on("webrtc_answer", async (data) => {
         console.log("📥 Received WebRTC answer");
+        if (!isCurrentRoom(data)) return;
         
         try {
             await peerConnection.setRemoteDescription(
@@ -418,16 +455,19 @@ function setupSocketListeners() {
         }
     });
     
-    // ===== ICE CANDIDATE =====
-    socket.on("webrtc_ice_candidate", async (data) => {
-        try {
-            if (peerConnection && peerConnection.remoteDescription) {
-                await peerConnection.addIceCandidate(
-                    new RTCIceCandidate(data.candidate)
-                );
+    // ===== ICE CANDIDATES (batched by the server) =====
+    socket.on("webrtc_ice_candidates", async (data) => {
+        if (!isCurrentRoom(data)) return;
+        for (const candidate of data.candidates || []) {
+            try {
+                if (peerConnection && peerConnection.remoteDescription) {
+                    await peerConnection.addIceCandidate(
+                        new RTCIceCandidate(candidate)
+                    );
+                }
+            } catch (error) {
+                console.warn("⚠️ ICE candidate error:", error);
             }
-        } catch (error) {
-            console.warn("⚠️ ICE candidate error:", error);
         }
     });
     
@@ -480,6 +520,15 @@ function setupSocketListeners() {
     });
     
     // ===== ERRORS =====
+    // ===== SEARCH TIMED OUT =====
+    socket.on("search_timeout", (data) => {
+        console.log("\n⏱️ SEARCH_TIMEOUT\n");
+        
+        isSearching = false;
+        updateButtonVisibility("idle");
+        setStatus(data.message);
+    });
+    
     socket.on("error", (message) => {
         console.error("❌ Socket error:", message);
         setStatus("❌ " + message);
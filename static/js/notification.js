@@ -27,9 +27,9 @@ const NotificationSystem = {
             this.updateReadStatus(data);
         });
 
-        // Listen for chat list updates
-        socket.on('chat_list_update', () => {
-            this.refreshFriendsList();
+        // Listen for chat list updates (per-conversation deltas)
+        socket.on('chat_list_update', (data) => {
+            this.applyConversationDelta(data);
         });
     },
 
@@ -161,21 +161,48 @@ const NotificationSystem = {
     },
 
     updateReadStatus: function(data) {
-        // Update message read status in UI
-        const messageEl = document.querySelector(`[data-message-id="${data.message_id}"]`);
-        if (messageEl) {
-            // Mark as read visually
-            messageEl.classList.add('message-read');
-        }
+        // Update message read status in UI (everything up to the watermark)
+        // Message ids are global: only mark the open chat if it is this conversation
+        const chatData = document.getElementById('chatData');
+        if (!chatData || data.conversation_id !== chatData.dataset.room) return;
+        const readUpTo = data.read_up_to || data.message_id;
+        document.querySelectorAll('.message.sent[data-message-id]').forEach((messageEl) => {
+            if (parseInt(messageEl.dataset.messageId) <= readUpTo) {
+                // Mark as read visually
+                messageEl.classList.add('message-read');
+            }
+        });
 
-        // Remove unread badge from friends list
-        this.refreshFriendsList();
     },
 
-    refreshFriendsList: function() {
-        // Reload friends list to update unread counts
-        // This happens automatically when friends_list page is loaded
-        // For other pages, you might want to fetch and update dynamically
+    applyConversationDelta: function(data) {
+        // Update one row of the friends list in place (no reload)
+        const row = document.querySelector(`[data-conversation-id="${data.friend_id}"]`);
+        if (!row) return;
+
+        if (data.preview !== undefined) {
+            const preview = row.querySelector('[data-preview]');
+            if (preview) {
+                const text = data.preview.length > 35 ? data.preview.slice(0, 35) + '...' : data.preview;
+                preview.textContent = (data.from_me ? 'You: ' : '') + text;
+            }
+            // Most recent conversation first
+            if (row.parentNode && row.parentNode.querySelector('[data-conversation-id]') !== row) {
+                row.parentNode.insertBefore(row, row.parentNode.querySelector('[data-conversation-id]'));
+            }
+        }
+
+        if (data.unread !== undefined) {
+            const badge = row.querySelector('[data-unread]');
+            if (badge) {
+                badge.textContent = data.unread;
+                badge.style.display = data.unread > 0 ? 'flex' : 'none';
+            }
+            const preview = row.querySelector('[data-preview]');
+            if (preview) {
+                preview.classList.toggle('unread-text', data.unread > 0);
+            }
+        }
     }
 };
 
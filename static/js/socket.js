@@ -102,6 +102,24 @@ globalSocket.on('user_connected', function() {
     console.log("Received: user_connected");
 });
 
+// Friends' presence: coalesced {online: [ids], offline: [ids]} deltas
+globalSocket.on('presence_delta', function(delta) {
+    function mark(ids, online) {
+        (ids || []).forEach(function(userId) {
+            // Friend rows (friends.html) carry data-user-id / data-online;
+            // their [data-presence-dot] is coloured from data-online
+            document.querySelectorAll('[data-user-id="' + userId + '"][data-online]').forEach(function(el) {
+                el.setAttribute('data-online', online ? 'true' : 'false');
+                var dot = el.querySelector('[data-presence-dot]');
+                if (dot) dot.title = online ? 'Online' : 'Offline';
+            });
+        });
+    }
+    mark(delta.online, true);
+    mark(delta.offline, false);
+    document.dispatchEvent(new CustomEvent('presence_delta', { detail: delta }));
+});
+
 // Expose to window for other scripts
 window.Socket = globalSocket;
 window.io = io;
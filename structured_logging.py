@@ -0,0 +1,194 @@
+"""
+STRUCTURED LOGGING - JSON log lines written off the handler thread, sampled per event
+
+Handlers only build a record and put it on a bounded in-memory queue
+(QueueHandler); one QueueListener thread formats it and writes it to
+stdout, so no request or socket event waits on terminal / pipe I/O. If
+the queue is full the record is dropped and counted, never blocking.
+
+Under gevent / eventlet a threading.Thread is a greenlet on the one OS
+thread, and a blocking write would stall every connection. The writer
+is therefore always a real OS thread (the unpatched _thread), fed
+through the C SimpleQueue, which no green library replaces.
+
+Hot paths log through log_event(), which returns before doing any work
+when its level is disabled and keeps only a configured fraction of
+high-volume events (LOG_SAMPLE_RATES, e.g. "send_message=0.1"). Kept
+records carry their sample_rate so counts can be scaled back up.
+Warnings and errors are never sampled.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import random
+import sys
+from _queue import SimpleQueue   # the C queue: thread-safe across OS threads, never patched
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+TEXT_FORMAT = "[%(asctime)s] %(levelname)s: %(message)s"
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_handler = None
+_listener = None
+_sample_rates = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg plus any extra fields"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full"""
+
+    def __init__(self, log_queue, max_size):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Merge the arguments now; formatting is left to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+
+class NativeQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose writer is an OS thread even when threading is green"""
+
+    def start(self):
+        thread = _original_thread()
+        if thread is None:
+            return super().start()
+        self._thread = _NativeThread(self._monitor, thread)
+        self._thread.start()
+
+
+class _NativeThread:
+    """What QueueListener needs of a Thread (start / join) on an unpatched OS thread"""
+
+    def __init__(self, target, thread):
+        self._target = target
+        self._start_new_thread = thread.start_new_thread
+        self._done = thread.allocate_lock()
+
+    def start(self):
+        self._done.acquire()
+        self._start_new_thread(self._run, ())
+
+    def _run(self):
+        try:
+            self._target()
+        finally:
+            self._done.release()
+
+    def join(self):
+        with self._done:
+            pass
+
+
+def _original_thread():
+    """The unpatched _thread module if gevent / eventlet patched threading, else None"""
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey is not None and gevent_monkey.is_module_patched('threading'):
+        names = ('start_new_thread', 'allocate_lock', 'RLock')
+        return SimpleNamespace(**dict(zip(names, gevent_monkey.get_original('_thread', names))))
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    if eventlet_patcher is not None and eventlet_patcher.is_monkey_patched('thread'):
+        return eventlet_patcher.original('_thread')
+    return None
+
+
+def parse_sample_rates(value):
+    """{'event': rate} from a dict or "event=rate,event=rate" """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {event: float(rate) for event, rate in value.items()}
+    rates = {}
+    for item in value.split(','):
+        event, _, rate = item.partition('=')
+        if event.strip() and rate.strip():
+            rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def setup_logging(level='INFO', json_format=True, sample_rates=None, queue_size=10000, stream=None):
+    """Route all logging through a bounded queue to a background writer"""
+    global _handler, _listener, _sample_rates
+    _sample_rates = parse_sample_rates(sample_rates)
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+    thread = _original_thread()
+    if thread is not None:
+        # Only the writer thread takes it; a green lock is no lock there
+        output.lock = thread.RLock()
+
+    if _listener is not None:
+        _listener.stop()
+    else:
+        atexit.register(stop_logging)
+    root = logging.getLogger()
+    if _handler is not None:
+        # Only our own: others (metrics' ErrorCounter) stay attached
+        root.removeHandler(_handler)
+    _handler = DroppingQueueHandler(SimpleQueue(), queue_size)
+    _listener = NativeQueueListener(_handler.queue, output)
+    _listener.start()
+
+    root.addHandler(_handler)
+    root.setLevel(level)
+    return _handler
+
+
+def stop_logging():
+    """Write out whatever is still queued and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_event(logger, event, message, *args, level=logging.INFO, **fields):
+    """Log a named event with structured fields, subject to its sample rate"""
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = _sample_rates.get(event, 1.0)
+        if rate < 1.0:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+    fields['event'] = event
+    logger.log(level, message, *args, extra=fields)
+
+
+def logging_stats():
+    if _handler is None:
+        return {}
+    return {'queued': _handler.queue.qsize(), 'dropped': _handler.dropped}
@@ -0,0 +1,225 @@
+"""
+TIMERS - Hierarchical timing wheel for many short-lived timers
+
+One background thread drives every timer in the process: queue search
+timeouts, reconnect grace periods, periodic reaping. Scheduling and
+cancelling are O(1) no matter how many timers are pending, and a tick
+only touches the timers that are due (plus an occasional cascade of one
+slot from a coarser wheel).
+
+Timers can carry a key (e.g. ('queue', user_id)); scheduling a key again
+replaces the previous timer, and cancel(key) drops it.
+
+Callbacks run on the timer thread inside an app context, so they must
+be short; anything slow should hand off to its own worker.
+"""
+
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    __slots__ = ('tick', 'callback', 'args', 'key', 'id', 'bucket')
+
+    def __init__(self, tick, callback, args, key, timer_id):
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.id = timer_id
+        self.bucket = None   # dict the timer currently sits in
+
+
+class TimingWheel:
+    """Hierarchical timing wheel (not thread-safe; see TimerService)
+
+    `levels` wheels of `slots` slots each; wheel l covers slots**(l+1)
+    ticks. A timer sits in the finest wheel whose range still holds its
+    deadline and drops to finer wheels as the clock approaches it.
+    Deadlines beyond the coarsest wheel wait in an overflow bucket.
+    """
+
+    def __init__(self, tick=0.1, slots=64, levels=4, now=None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._overflow = {}
+        self._keys = {}
+        self._ids = itertools.count(1)
+        self._current = int((time.monotonic() if now is None else now) / tick)
+
+    def __len__(self):
+        return sum(len(b) for wheel in self._wheels for b in wheel) + len(self._overflow)
+
+    def schedule(self, delay, callback, *args, key=None, now=None):
+        """Run callback(*args) after delay seconds, returns the Timer"""
+        if key is not None:
+            self.cancel(key)
+        now = time.monotonic() if now is None else now
+        # Round up so a timer never fires early
+        tick = max(int(-(-(now + delay) // self.tick)), self._current + 1)
+        timer = Timer(tick, callback, args, key, next(self._ids))
+        if key is not None:
+            self._keys[key] = timer
+        self._place(timer)
+        return timer
+
+    def cancel(self, timer_or_key):
+        """Drop a pending timer (by Timer or key), returns True if it was pending"""
+        timer = timer_or_key if isinstance(timer_or_key, Timer) else self._keys.get(timer_or_key)
+        if timer is None or timer.bucket is None:
+            return False
+        del timer.bucket[timer.id]
+        timer.bucket = None
+        if timer.key is not None and self._keys.get(timer.key) is timer:
+            del self._keys[timer.key]
+        return True
+
+    def advance(self, now=None):
+        """Move the clock to now, returns the timers that came due (in order)"""
+        target = int((time.monotonic() if now is None else now) / self.tick)
+        due = []
+        while self._current < target:
+            self._current += 1
+            # Coarse wheels first, so their timers land in finer slots
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if self._current % span == 0:
+                    if level == self.levels - 1 and self._current % (span * self.slots) == 0:
+                        self._cascade(self._overflow, due)
+                    self._cascade(self._wheels[level][(self._current // span) % self.slots], due)
+            bucket = self._wheels[0][self._current % self.slots]
+            while bucket:
+                _, timer = bucket.popitem()
+                self._fire(timer, due)
+        return due
+
+    def _place(self, timer):
+        for level in range(self.levels):
+            span = self.slots ** (level + 1)
+            if timer.tick // span == self._current // span:
+                index = (timer.tick // self.slots ** level) % self.slots
+                bucket = self._wheels[level][index]
+                break
+        else:
+            bucket = self._overflow
+        bucket[timer.id] = timer
+        timer.bucket = bucket
+
+    def _cascade(self, bucket, due):
+        timers = list(bucket.values())
+        bucket.clear()
+        for timer in timers:
+            if timer.tick <= self._current:
+                self._fire(timer, due)
+            else:
+                self._place(timer)
+
+    def _fire(self, timer, due):
+        timer.bucket = None
+        if timer.key is not None and self._keys.get(timer.key) is timer:
+            del self._keys[timer.key]
+        due.append(timer)
+
+
+class TimerService:
+    """Thread-safe TimingWheel driven by one background thread"""
+
+    def __init__(self, app=None, tick=0.1, slots=64, levels=4):
+        self.app = app
+        self.wheel = TimingWheel(tick=tick, slots=slots, levels=levels)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.fired = 0
+        self.failed = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self.wheel)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timer-wheel", daemon=True)
+                self._thread.start()
+        return self
+
+    def schedule(self, delay, callback, *args, key=None):
+        with self._lock:
+            return self.wheel.schedule(delay, callback, *args, key=key)
+
+    def cancel(self, timer_or_key):
+        with self._lock:
+            return self.wheel.cancel(timer_or_key)
+
+    def every(self, interval, callback, key=None, background=False):
+        """Run callback() every interval seconds (first run after one interval)
+
+        background=True runs it on its own thread (for DB work), the next
+        run being scheduled only once it has finished.
+        """
+        key = key or ('every', callback)
+
+        def run():
+            try:
+                self._call_callback(callback)
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Periodic timer {key} failed")
+            finally:
+                self.schedule(interval, start, key=key)
+
+        def start():
+            if background:
+                threading.Thread(target=run, name=f"timer-{key}", daemon=True).start()
+            else:
+                run()
+
+        return self.schedule(interval, start, key=key)
+
+    def _run(self):
+        while True:
+            time.sleep(self.wheel.tick)
+            with self._lock:
+                due = self.wheel.advance()
+            for timer in due:
+                self._call(timer)
+
+    def _call(self, timer):
+        try:
+            self._call_callback(timer.callback, *timer.args)
+            self.fired += 1
+        except Exception:
+            self.failed += 1
+            logger.exception(f"Timer {timer.key or timer.callback} failed")
+
+    def _call_callback(self, callback, *args):
+        if self.app is not None:
+            with self.app.app_context():
+                return callback(*args)
+        return callback(*args)
+
+
+# ===== GLOBAL INSTANCE =====
+
+_timers = None
+
+
+def init_timers(app=None):
+    """Create and start the process-wide timer service"""
+    global _timers
+    _timers = TimerService(app).start()
+    logger.info("✅ Timer wheel started")
+    return _timers
+
+
+def get_timers():
+    if _timers is None:
+        init_timers()
+    return _timers
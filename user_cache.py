@@ -0,0 +1,161 @@
+"""
+USER CACHE - Bounded LRU / TTL cache behind the Flask-Login user loader
+
+Flask-Login loads current_user on every HTTP request and every Socket.IO
+event (ICE candidates included), which used to be a users-table lookup
+per frame. The cache keeps a detached snapshot of each recently active
+user (column values only) and hands each request its own copy merged
+into the session without a query, so handlers can still modify and
+commit current_user as before.
+
+Any ORM update or delete of a User (profile edits, deactivation, ...)
+drops its snapshot, and a miss that was already loading the user from the
+database when it was dropped does not store what it read; bulk UPDATEs that bypass the ORM (presence's
+is_online flush) are picked up when the entry expires.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from models.models import db, User
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """{user_id: detached User snapshot}, least recently used evicted first"""
+
+    def __init__(self, max_size=10000, ttl=30, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()   # {user_id: (snapshot, loaded_at)}
+        self._lock = threading.Lock()
+
+        # A miss remembers the epoch it started at; an invalidate bumps the
+        # epoch and stamps the user with it, so a load that raced it is not
+        # stored. Stamps are dropped once no older load is in flight.
+        self._epoch = 0
+        self._invalidated = OrderedDict()   # {user_id: epoch of last invalidate}, oldest first
+        self._loading = Counter()           # {epoch: misses still loading}
+        self._cleared = 0                   # epoch of the last clear()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, user_id):
+        """A session-attached User for user_id (None if there is no such user)"""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                snapshot = entry[0]
+            else:
+                self.misses += 1
+                snapshot = None
+                epoch = self._epoch
+                self._loading[epoch] += 1
+        if snapshot is not None:
+            return db.session.merge(snapshot, load=False)
+
+        user = None
+        try:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                snapshot = _snapshot(user)
+        finally:
+            self._store(user_id, snapshot, now, epoch)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            # Stamped even when nothing is cached: a miss may be loading it
+            self._epoch += 1
+            if self._loading:
+                self._invalidated[user_id] = self._epoch
+                self._invalidated.move_to_end(user_id)
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidated.clear()
+            # Loads in flight started before this epoch; none of them store
+            self._epoch += 1
+            self._cleared = self._epoch
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def _store(self, user_id, snapshot, now, epoch):
+        """Finish a miss that started at epoch, caching snapshot unless an
+        invalidate (or clear) happened since"""
+        with self._lock:
+            self._loading[epoch] -= 1
+            if not self._loading[epoch]:
+                del self._loading[epoch]
+            stale = self._cleared > epoch or self._invalidated.get(user_id, 0) > epoch
+            if snapshot is not None and not stale:
+                self._entries[user_id] = (snapshot, now)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+            oldest = min(self._loading) if self._loading else self._epoch
+            while self._invalidated and next(iter(self._invalidated.values())) <= oldest:
+                self._invalidated.popitem(last=False)
+
+
+def _snapshot(user):
+    """Detached copy of a loaded User's columns, never attached to a session"""
+    copy = User(**{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+# ===== GLOBAL INSTANCE =====
+
+_cache = None
+
+
+def init_user_cache(max_size=10000, ttl=30):
+    """Create the process-wide user cache"""
+    global _cache
+    _cache = UserCache(max_size=max_size, ttl=ttl)
+    logger.info(f"✅ User cache ({max_size} users, ttl {ttl}s)")
+    return _cache
+
+
+def get_user_cache():
+    if _cache is None:
+        init_user_cache()
+    return _cache
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    if _cache is not None:
+        _cache.invalidate(target.id)
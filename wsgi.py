@@ -1,19 +1,23 @@
-import logging
-
-logging.basicConfig(level=logging.INFO)
+# Patch for gevent/eventlet before logging pulls in threading
+from async_runtime import setup_async_runtime
 
-logging.info("============================================================")
-logging.info("OPENWORLD WSGI - Production Mode Startup")
-logging.info("============================================================")
+setup_async_runtime()
 
-logging.info("Importing Flask app and SocketIO...")
+import logging
 
+# Importing the app sets up logging (structured_logging owns the root handlers)
 from app import app, socketio
 
-logging.info("✅ Flask app and SocketIO imported successfully")
+logger = logging.getLogger(__name__)
+
+logger.info("============================================================")
+logger.info("OPENWORLD WSGI - Production Mode Startup")
+logger.info("============================================================")
+
+logger.info("✅ Flask app and SocketIO imported successfully")
 
 # Gunicorn entrypoint
 application = app
 
-logging.info("✅ WSGI app ready for gunicorn")
-logging.info("============================================================")
\ No newline at end of file
+logger.info("✅ WSGI app ready for gunicorn")
+logger.info("============================================================")